@@ -341,7 +341,8 @@ class ConnectedGlobalMapMap
         this.client.onmessage = (message) => {
             try {
                 let data = JSON.parse(message.data);
-                this.handlePositions([data])
+                // Positions are sent in frames holding the latest positions of several aircraft
+                this.handlePositions(Array.isArray(data) ? data : [data])
             } catch (e) {
                 console.log(e)
                 console.log(message.data)
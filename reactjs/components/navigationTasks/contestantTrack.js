@@ -159,7 +159,7 @@ class ConnectedContestantTrack extends Component {
                 })
                 this.renderPositions(positions)
             }
-            if (this.props.annotations&&this.props.annotations.length>0) {
+            if (this.props.annotations) {
                 this.renderAnnotations(this.props.annotations)
             }
             if (!this.props.isInitialLoading) {
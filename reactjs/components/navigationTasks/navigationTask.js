@@ -94,6 +94,20 @@ export class ConnectedNavigationTask extends Component {
 
     }
 
+    handleTrackData(trackData) {
+        if (this.props.initialLoading[trackData.contestant_id]) {
+            this.cacheDataWhileLoading(trackData.contestant_id, trackData)
+        } else {
+            if (trackData.contestant_id in this.waitingInitialLoading[trackData.contestant_id]) {
+                for (let p of this.waitingInitialLoading[trackData.contestant_id]) {
+                    this.props.dispatchContestantData(p)
+                }
+                delete this.waitingInitialLoading[trackData.contestant_id]
+            }
+            this.props.dispatchContestantData(trackData)
+        }
+    }
+
     initiateSession() {
         clearInterval(this.checkReceivedTimeInterval)
         let getUrl = window.location;
@@ -115,22 +129,16 @@ export class ConnectedNavigationTask extends Component {
                 this.props.dispatchCurrentTime(data.data)
                 this.lastTimeReceived = new Date()
             } else if (data.type === "contestant" && this.props.contestantIds.length === 0) {
-                this.props.dispatchNewContestant(JSON.parse(data.data))
+                this.props.dispatchNewContestant(data.data)
             } else if (data.type === "contestant_delete") {
-                this.props.dispatchDeleteContestant(JSON.parse(data.data))
-            } else {
-                const trackData = JSON.parse(data.data)
-                if (this.props.initialLoading[trackData.contestant_id]) {
-                    this.cacheDataWhileLoading(trackData.contestant_id, trackData)
-                } else {
-                    if (trackData.contestant_id in this.waitingInitialLoading[trackData.contestant_id]) {
-                        for (let p of this.waitingInitialLoading[trackData.contestant_id]) {
-                            this.props.dispatchContestantData(p)
-                        }
-                        delete this.waitingInitialLoading[trackData.contestant_id]
-                    }
-                    this.props.dispatchContestantData(trackData)
+                this.props.dispatchDeleteContestant(data.data)
+            } else if (data.type === "position_data_batch") {
+                // The positions of all contestants received during the last second
+                for (let trackData of data.data) {
+                    this.handleTrackData(trackData)
                 }
+            } else {
+                this.handleTrackData(data.data)
             }
         };
         this.client.onclose = (e) => {
@@ -124,6 +124,19 @@ function emptyContestantData(contestantId) {
     })
 }
 
+// Apply a score delta (append, update or delete by id) from the tracking websocket to a list of score items
+function applyScoreDelta(items, delta) {
+    const ids = delta.items.map((item) => item.id)
+    if (delta.operation === "delete") {
+        return items.filter((item) => !ids.includes(item.id))
+    }
+    const updated = items.map((item) => {
+        const index = ids.indexOf(item.id)
+        return index >= 0 ? delta.items[index] : item
+    })
+    return updated.concat(delta.items.filter((item) => !items.some((existing) => existing.id === item.id)))
+}
+
 function rootReducer(state = initialState, action) {
     if (action.type === SET_DISPLAY) {
         return Object.assign({}, state, {
@@ -247,6 +260,22 @@ function rootReducer(state = initialState, action) {
         if (state.contestants[action.payload.contestant_id] === undefined) {
             return state
         }
+        const existingData = state.contestantData[action.payload.contestant_id]
+        let annotations = action.payload.annotations
+        let allAnnotations = annotations !== undefined ? annotations : existingData.all_annotations || []
+        let logEntries = action.payload.score_log_entries !== undefined ? action.payload.score_log_entries : existingData.log_entries
+        let gateScores = action.payload.gate_scores !== undefined ? action.payload.gate_scores : existingData.gate_scores
+        const delta = action.payload.score_delta
+        if (delta !== undefined) {
+            if (delta.collection === "annotations") {
+                allAnnotations = applyScoreDelta(allAnnotations, delta)
+                annotations = allAnnotations
+            } else if (delta.collection === "score_log_entries") {
+                logEntries = applyScoreDelta(logEntries || [], delta)
+            } else if (delta.collection === "gate_scores") {
+                gateScores = applyScoreDelta(gateScores || [], delta)
+            }
+        }
         return Object.assign({}, state, {
             contestantPositions: {
                 ...state.contestantPositions,
@@ -259,9 +288,11 @@ function rootReducer(state = initialState, action) {
             contestantData: {
                 ...state.contestantData,
                 [action.payload.contestant_id]: {
-                    annotations: action.payload.annotations,
-                    log_entries: action.payload.score_log_entries !== undefined ? action.payload.score_log_entries : state.contestantData[action.payload.contestant_id].log_entries,
-                    gate_scores: action.payload.gate_scores !== undefined ? action.payload.gate_scores : state.contestantData[action.payload.contestant_id].gate_scores,
+                    // Only set when the message changes the annotations, so that they are not redrawn for every position
+                    annotations: annotations,
+                    all_annotations: allAnnotations,
+                    log_entries: logEntries,
+                    gate_scores: gateScores,
                     playing_cards: action.payload.playing_cards !== undefined ? action.payload.playing_cards : state.contestantData[action.payload.contestant_id].playing_cards,
                     latest_position_time: action.payload.positions !== undefined && action.payload.positions.length > 0 ? new Date(action.payload.positions.slice(-1)[0].time) : null,
                     contestant_track: action.payload.contestant_track ? action.payload.contestant_track : state.contestantData[action.payload.contestant_id].contestant_track,
@@ -5,14 +5,15 @@ import matplotlib.pyplot as plt
 import logging
 from typing import List, Optional, Tuple
 import numpy as np
-from shapely.geometry import Polygon
 
 from display.calculators.calculator import Calculator
-from display.calculators.calculator_utilities import PolygonHelper, get_shortest_intersection_time
+from display.calculators.calculator_utilities import get_shortest_intersection_time
 from display.calculators.positions_and_gates import Gate
 from display.calculators.update_score_message import UpdateScoreMessage
 from display.models import Contestant, Scorecard, Route, INFORMATION, ANOMALY
 from display.models.contestant_utility_models import ContestantReceivedPosition
+from display.utilities.coordinate_utilities import utm_from_lat_lon
+from display.utilities.zone_engine import ZoneEngine
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +39,7 @@ class AnrCorridorCalculator(Calculator):
     INSIDE_CORRIDOR = 0
     OUTSIDE_CORRIDOR = 1
     OUTSIDE_CORRIDOR_PENALTY_TYPE = "outside_corridor"
+    CORRIDOR_ZONE = "corridor"
 
     def __init__(
         self,
@@ -60,8 +62,11 @@ class AnrCorridorCalculator(Calculator):
         self.enroute = False
         self.corridor_grace_time = self.scorecard.corridor_grace_time
         waypoint = self.contestant.navigation_task.route.waypoints[0]
-        self.polygon_helper = PolygonHelper(waypoint.latitude, waypoint.longitude)
-        self.track_polygon = self.build_polygon()
+        self.utm = utm_from_lat_lon(waypoint.latitude, waypoint.longitude)
+        self.zone_engine = ZoneEngine.from_paths(
+            waypoint.latitude, waypoint.longitude, [(self.CORRIDOR_ZONE, self.build_corridor_path())]
+        )
+        self.track_polygon = self.zone_engine.polygons[0]
         self.existing_reference = None
         self.accumulated_score = 0
         self.plot_polygon()
@@ -78,7 +83,7 @@ class AnrCorridorCalculator(Calculator):
             return 100, self.accumulated_score
         distance_danger = 0
         shortest_time = get_shortest_intersection_time(
-            track, self.polygon_helper, [("test", self.track_polygon)], LOOKAHEAD_SECONDS, from_inside=True
+            track, self.zone_engine, LOOKAHEAD_SECONDS, from_inside=True
         )
         lookahead_danger = 99 * (LOOKAHEAD_SECONDS - shortest_time) / LOOKAHEAD_SECONDS
         if len(track) > 0:
@@ -90,7 +95,10 @@ class AnrCorridorCalculator(Calculator):
             distance_danger = 30 * (MAXIMUM_DISTANCE - polygon_distance) / MAXIMUM_DISTANCE
         return max([lookahead_danger, distance_danger]), self.accumulated_score
 
-    def build_polygon(self):
+    def build_corridor_path(self) -> List[Tuple[float, float]]:
+        """
+        The corridor outline as a list of (latitude, longitude)
+        """
         points = []
         for waypoint in self.contestant.navigation_task.route.waypoints:
             if waypoint.left_corridor_line is not None:
@@ -104,34 +112,28 @@ class AnrCorridorCalculator(Calculator):
                 points.extend(list(reversed(waypoint.right_corridor_line)))
             else:
                 points.append(waypoint.gate_line[1])
-        points = np.array(points)
-        transformed_points = self.polygon_helper.utm.transform_points(
-            self.polygon_helper.pc, points[:, 1], points[:, 0]
-        )
-        return Polygon(transformed_points)
+        return points
 
     def plot_polygon(self):
         # imagery = OSM()
-        ax = plt.axes(projection=self.polygon_helper.utm)
+        ax = plt.axes(projection=self.utm)
         # ax.add_image(imagery, 8)
         ax.set_aspect("auto")
         ax.plot(self.track_polygon.boundary.xy[0], self.track_polygon.boundary.xy[1])
-        ax.add_geometries([self.track_polygon], crs=self.polygon_helper.utm, facecolor="blue", alpha=0.4)
+        ax.add_geometries([self.track_polygon], crs=self.utm, facecolor="blue", alpha=0.4)
         plt.savefig("polygon.png", dpi=100)
 
     def _check_inside_polygon(self, latitude: float, longitude: float) -> bool:
         """
         Returns true if the point lies inside the corridor
         """
-        return "test" in self.polygon_helper.check_inside_polygons([("test", self.track_polygon)], latitude, longitude)
+        return self.zone_engine.contains(self.CORRIDOR_ZONE, latitude, longitude)
 
     def _distance_from_point_to_polygons(self, latitude: float, longitude: float) -> float:
         """
         :return: Distance to inside or outside the polygon (metres)
         """
-        return self.polygon_helper.distance_from_point_to_polygons([("test", self.track_polygon)], latitude, longitude)[
-            "test"
-        ]
+        return self.zone_engine.boundary_distance(self.CORRIDOR_ZONE, latitude, longitude)
 
     def calculate_enroute(
         self,
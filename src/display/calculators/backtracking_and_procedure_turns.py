@@ -5,9 +5,10 @@ from typing import TYPE_CHECKING, List, Optional
 
 from display.calculators.calculator import Calculator
 from display.calculators.calculator_utilities import bearing_between
+from display.calculators.circling_window import CirclingWindow
 from display.calculators.update_score_message import UpdateScoreMessage
 from display.models.contestant_utility_models import ContestantReceivedPosition
-from display.utilities.coordinate_utilities import get_heading_difference, bearing_difference
+from display.utilities.coordinate_utilities import get_heading_difference
 from display.models import Contestant, Scorecard, Route, ANOMALY, INFORMATION
 
 if TYPE_CHECKING:
@@ -80,7 +81,7 @@ class BacktrackingAndProcedureTurnsCalculator(Calculator):
         self.circling_start_time = None
         self.previous_last_gate = None
         self.current_last_gate = None
-        self.gate_bearings = []  # type: list[tuple[int,float]]
+        self.circling_window = CirclingWindow(self.circling_lookback)
         # Put into separate parameter so that we can change this when finalising in order to terminate any ongoing
         # backtracking
         self.backtracking_limit = self.scorecard.backtracking_bearing_difference
@@ -117,10 +118,7 @@ class BacktrackingAndProcedureTurnsCalculator(Calculator):
     TIME_FORMAT = "%H:%M:%S"
 
     def get_bearing_for_index(self, index: int) -> Optional[float]:
-        for bearing_index, bearing in reversed(self.gate_bearings):
-            if bearing_index <= index:
-                return bearing
-        return None
+        return self.circling_window.get_bearing_for_index(index)
 
     def detect_circling(
         self, track: List[ContestantReceivedPosition], last_gate: "Gate", in_range_of_gate: Optional["Gate"]
@@ -136,7 +134,8 @@ class BacktrackingAndProcedureTurnsCalculator(Calculator):
         if last_gate != self.current_last_gate:
             self.previous_last_gate = self.current_last_gate
             self.current_last_gate = last_gate
-            self.gate_bearings.append((len(track) - 1, last_gate.bearing))
+            self.circling_window.add_gate_bearing(len(track) - 1, last_gate.bearing)
+        self.circling_window.update(track)
         next_position = track[-1]
         now = next_position.time
         if (
@@ -148,83 +147,40 @@ class BacktrackingAndProcedureTurnsCalculator(Calculator):
             self.mark_circling_finished_if_ongoing(last_gate, now, next_position)
             self.earliest_circle_check = now
             return
-        found_circling = False
-        current_position_index = len(track) - 2
-        current_position = track[current_position_index]
-        difference = 0
-        next_bearing = None
-        bearings = []
-        bearing_differences = []
-        accumulated_differences = []
-        next_track_bearing = self.get_bearing_for_index(len(track) - 1)
-
-        track_turn = 0
-        while (
-            current_position_index > 0
-            and current_position.time > now - self.circling_lookback
-            and current_position.time > self.earliest_circle_check
-        ):
-            current_position_index -= 1
-            current_bearing = bearing_between(current_position, next_position)
-            bearings.append(current_bearing)
-            if next_bearing is not None:
-                current_difference = bearing_difference(current_bearing, next_bearing)
-                bearing_differences.append(current_difference)
-                difference += current_difference
-            accumulated_differences.append(difference)
-            next_bearing = current_bearing
-            next_position = current_position
-            current_position = track[current_position_index]
-            current_track_bearing = self.get_bearing_for_index(current_position_index)
-            if (
-                current_track_bearing != next_track_bearing
-                and current_track_bearing is not None
-                and next_track_bearing is not None
-            ):
-                track_turn += bearing_difference(current_track_bearing, next_track_bearing)
-            next_track_bearing = current_track_bearing
-
-            if track_turn > 0 and difference > 0 or track_turn < 0 and difference < 0:
-                # If we are turning in the same direction of the turn, add the size of the turn to the turn limit
-                turn_limit = 180 + abs(track_turn)  # TODO: Increase turn limit?
-            else:
-                # Otherwise we set the limit to 180 in order to catch procedure turns where they should not be
-                turn_limit = 180
-
-            if abs(difference) > turn_limit:
-                found_circling = True
-                if self.circling_start_time is None:
-                    self.circling_start_time = now
-                if (now - self.circling_start_time).total_seconds() > 5 and not self.circling:
-                    self.circling = True
-                    logger.info(
-                        "{} {}: Detected circling more than 180° the past {} + 5 seconds".format(
-                            self.contestant, now, (now - current_position.time).total_seconds()
-                        )
+        circling = self.circling_window.find_circling(self.earliest_circle_check)
+        if circling is not None:
+            if self.circling_start_time is None:
+                self.circling_start_time = now
+            if (now - self.circling_start_time).total_seconds() > 5 and not self.circling:
+                self.circling = True
+                next_position = track[circling.index]
+                current_position_index = circling.index - 1
+                current_position = track[current_position_index]
+                logger.info(
+                    "{} {}: Detected circling more than 180° the past {} + 5 seconds".format(
+                        self.contestant, now, (now - current_position.time).total_seconds()
                     )
-                    logger.info(
-                        f"Positions: {[(item.time, item.latitude, item.longitude, item.course) for item in track[current_position_index:]]}"
-                    )
-                    logger.info(f"Bearings: {bearings}")
-                    logger.info(f"Bearing differences: {bearing_differences}")
-                    logger.info(f"Accumulated bearing differences: {accumulated_differences}")
-                    self.update_score(
-                        UpdateScoreMessage(
-                            next_position.time,
-                            self.get_last_non_secret_gate(last_gate or self.gates[0]),
-                            self.scorecard.backtracking_penalty,
-                            "circling start",
-                            next_position.latitude,
-                            next_position.longitude,
-                            ANOMALY,
-                            self.BACKTRACKING_SCORE_TYPE,
-                            self.scorecard.backtracking_maximum_penalty,
-                        )
+                )
+                logger.info(
+                    f"Positions: {[(item.time, item.latitude, item.longitude, item.course) for item in track[current_position_index:]]}"
+                )
+                logger.info(f"Bearings: {circling.bearings}")
+                logger.info(f"Bearing differences: {circling.bearing_differences}")
+                logger.info(f"Accumulated bearing differences: {circling.accumulated_differences}")
+                self.update_score(
+                    UpdateScoreMessage(
+                        next_position.time,
+                        self.get_last_non_secret_gate(last_gate or self.gates[0]),
+                        self.scorecard.backtracking_penalty,
+                        "circling start",
+                        next_position.latitude,
+                        next_position.longitude,
+                        ANOMALY,
+                        self.BACKTRACKING_SCORE_TYPE,
+                        self.scorecard.backtracking_maximum_penalty,
                     )
-
-                break
-        # logger.info(f"{now}: {difference}")
-        if not found_circling:
+                )
+        else:
             # No longer circling, market reset if we were circling
             self.mark_circling_finished_if_ongoing(last_gate, now, track[-1])
 
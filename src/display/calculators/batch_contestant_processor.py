@@ -0,0 +1,175 @@
+"""
+Scoring of a complete track at once, used when a track is uploaded or recalculated after the flight.
+
+The live ContestantProcessor receives positions through the position queue and a timed queue, and pushes every position,
+score and state change to the database and the tracking map as it happens. When the complete track is known in advance
+none of that is needed. The BatchContestantProcessor feeds the positions directly to the same Gatekeeper and
+calculators, keeps the score updates and the contestant track state in memory, and writes the result to the database
+and the tracking map once when the whole track has been scored.
+"""
+import logging
+from queue import Empty, Queue
+from typing import Dict, List, Optional
+
+from django.db import transaction
+
+from display.calculators.calculator_factory import calculator_factory
+from display.calculators.contestant_processor import ScoreAccumulator, score_log_entry_fields, track_annotation_fields
+from display.models import (
+    CompressedContestantTrack,
+    Contestant,
+    ContestantReceivedPosition,
+    GateCumulativeScore,
+    ScoreLogEntry,
+    TrackAnnotation,
+)
+from display.models.contestant_track import ContestantTrack
+from display.utilities.calculator_running_utilities import calculator_is_alive, calculator_is_terminated
+from display.utilities.track_compression import TRACK_FIELDS
+from slack_facade import post_slack_competition_message
+from websocket_channels import WebsocketFacade
+
+# Number of positions between each renewal of the calculator alive flag
+ALIVE_INTERVAL = 1000
+logger = logging.getLogger(__name__)
+
+
+class BatchContestantProcessor:
+    """
+    Scores a complete track for a contestant with the same Gatekeeper and calculators as the ContestantProcessor,
+    without the position queue, the timed queue and the score updater thread.
+    """
+
+    def __init__(self, contestant: "Contestant"):
+        calculator_is_alive(contestant.pk, 30)
+        logger.info(f"{contestant}: Created batch contestant processor")
+        self.contestant = contestant
+        self.contestant_track: ContestantTrack = contestant.contestanttrack
+        self.contestant.reset_track_and_score()
+        self.contestant.delete_track()
+        self.contestant.track_version += 1
+        self.contestant.save(update_fields=["track_version"])
+        self.contestant_track.set_calculator_started()
+        self.scorecard = self.contestant.navigation_task.scorecard
+        self.scorecard.refresh_from_db()
+        self.websocket_facade = WebsocketFacade()
+        post_slack_competition_message(
+            str(self.contestant.navigation_task),
+            f"Batch calculator started for {self.contestant} in navigation task <https://airsports.no{self.contestant.navigation_task.tracking_link}|{self.contestant.navigation_task}>",
+        )
+        self.websocket_facade.transmit_delete_contestant(self.contestant)
+        self.websocket_facade.transmit_contestant(self.contestant)
+        # The calculators put score updates on the queue, they are read when the whole track has been scored
+        self.score_processing_queue = Queue()
+        self.gatekeeper = calculator_factory(self.contestant, self.score_processing_queue)
+        self.gatekeeper.transmit_live_estimates = False
+
+    def run(self, positions: List[Dict]):
+        """
+        Score the track and store the result. The positions are dictionaries in the same format as the position queue
+        of the ContestantProcessor. The contestant is always marked as finished, also if storing the result fails.
+        """
+        logger.info(f"{self.contestant}: Started batch processing of {len(positions)} positions")
+        try:
+            track = self.score_track(positions)
+            self.store_scores()
+            self.store_track(track)
+            logger.info(f"{self.contestant}: Finished batch processing of {len(track)} positions")
+        except Exception:
+            logger.exception(f"{self.contestant}: Failed storing the result of the batch processing")
+            raise
+        finally:
+            self.contestant_track.set_calculator_finished()
+            # The score log, annotations and gate scores have been replaced without pushing the deltas
+            self.websocket_facade.transmit_score_state_changed(self.contestant)
+            self.websocket_facade.transmit_delete_contestant(self.contestant)
+            self.websocket_facade.transmit_contestant(self.contestant)
+            calculator_is_terminated(self.contestant.pk)
+
+    def score_track(self, positions: List[Dict]) -> List[ContestantReceivedPosition]:
+        """
+        Run the gatekeeper over the positions and return the track. If a calculator fails, the track and the scores up
+        to the failing position are kept, in the same way as when the live processor fails.
+        """
+        track = []
+        previous_position: Optional[ContestantReceivedPosition] = None
+        self.contestant_track.defer_changes()
+        try:
+            # The live processor receives the positions through a timed queue, which orders them by device time
+            for position_data in sorted(positions, key=lambda item: item["device_time"]):
+                position = self.contestant.generate_position_block_for_contestant(
+                    position_data, position_data["device_time"]
+                )
+                if previous_position and (
+                    (
+                        position.latitude == previous_position.latitude
+                        and position.longitude == previous_position.longitude
+                    )
+                    or previous_position.time >= position.time
+                ):
+                    # Old or duplicate position, ignoring
+                    if previous_position.time < position.time:
+                        previous_position = position
+                    continue
+                previous_position = position
+                track.append(position)
+                self.gatekeeper.calculate_score(position)
+                if len(track) % ALIVE_INTERVAL == 0:
+                    calculator_is_alive(self.contestant.pk, 30)
+            self.gatekeeper.finished_processing()
+        except Exception:
+            logger.exception(f"{self.contestant}: Batch processing failed after {len(track)} positions")
+        finally:
+            self.contestant_track.save_deferred_changes()
+        return track
+
+    def store_scores(self):
+        """
+        Create the score log entries, annotations and gate scores for all the score updates from the calculators, and
+        update the score of the contestant
+        """
+        accumulated_scores = ScoreAccumulator()
+        time_zone = self.contestant.navigation_task.contest.time_zone
+        score = self.contestant_track.score
+        gate_scores = {}
+        annotations = []
+        with transaction.atomic():
+            while True:
+                try:
+                    update_score_message = self.score_processing_queue.get_nowait()
+                except Empty:
+                    break
+                points, capped = accumulated_scores.set_and_update_score(
+                    update_score_message.score, update_score_message.score_type, update_score_message.maximum_score
+                )
+                entry_fields = score_log_entry_fields(update_score_message, points, capped, time_zone)
+                logger.info("UPDATE_SCORE {}: {}".format(self.contestant, entry_fields["string"]))
+                gate_name = update_score_message.gate.name
+                gate_scores[gate_name] = gate_scores.get(gate_name, 0) + points
+                score += points
+                # The annotations refer to the entries, and bulk_create does not return the primary keys on all
+                # database backends
+                entry = ScoreLogEntry.objects.create(contestant=self.contestant, **entry_fields)
+                annotations.append(
+                    TrackAnnotation(
+                        contestant=self.contestant,
+                        score_log_entry=entry,
+                        **track_annotation_fields(update_score_message, entry),
+                    )
+                )
+            TrackAnnotation.objects.bulk_create(annotations)
+            GateCumulativeScore.objects.bulk_create(
+                [
+                    GateCumulativeScore(contestant=self.contestant, gate=gate, points=gate_points)
+                    for gate, gate_points in gate_scores.items()
+                ]
+            )
+        self.contestant_track.update_score(score)
+
+    def store_track(self, track: List[ContestantReceivedPosition]):
+        """
+        Store the track directly as a compressed track, it is never stored as individual positions
+        """
+        CompressedContestantTrack.store(
+            self.contestant, [{field: getattr(position, field) for field in TRACK_FIELDS} for position in track]
+        )
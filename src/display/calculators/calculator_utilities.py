@@ -1,5 +1,5 @@
 import numpy as np
-from shapely.geometry import Polygon, Point, LineString
+from shapely.geometry import Polygon, Point
 
 import cartopy.crs as ccrs
 import datetime
@@ -14,6 +14,7 @@ from display.utilities.coordinate_utilities import (
     project_position_lat_lon,
     bearing_difference,
 )
+from display.utilities.zone_engine import ZoneEngine, local_utm_transformer, project_polygon
 
 
 def cross_track_gate(gate1, gate2, position) -> float:
@@ -82,20 +83,21 @@ def round_time_second(obj: datetime.datetime) -> datetime.datetime:
 class PolygonHelper:
     def __init__(self, latitude, longitude):
         self.pc = ccrs.PlateCarree()
+        # The cartopy projection is only used for plotting, all transformations use the cached pyproj transformer
         self.utm = utm_from_lat_lon(latitude, longitude)
+        self.transformer = local_utm_transformer(latitude, longitude)
 
     def build_polygon(self, path):
-        line = []
-        for element in path:
-            line.append(self.utm.transform_point(*list(reversed(element)), self.pc))
-        return Polygon(line)
+        return project_polygon(self.transformer, path)
+
+    def zone_engine(self, polygons: list[tuple[str, Polygon]]) -> ZoneEngine:
+        return ZoneEngine(self.transformer, polygons)
 
     def check_inside_polygons(self, polygons: list[tuple[int, Polygon]], latitude, longitude) -> list[int]:
         """
         Returns a list of names of the prohibited zone is the position is inside
         """
-        x, y = self.utm.transform_point(longitude, latitude, self.pc)
-        p = Point(x, y)
+        p = Point(self.transformer.transform(longitude, latitude))
         incursions = []
         for zone_pk, zone in polygons:
             if zone.contains(p):
@@ -112,8 +114,7 @@ class PolygonHelper:
         :param longitude:
         :return:  distance in metres
         """
-        x, y = self.utm.transform_point(longitude, latitude, self.pc)
-        p = Point(x, y)
+        p = Point(self.transformer.transform(longitude, latitude))
         distances = {}
         for name, polygon in polygons:
             distances[name] = polygon.exterior.distance(p)
@@ -132,53 +133,20 @@ class PolygonHelper:
         from_inside: bool = False,
     ) -> dict[str, float]:
         """
-        Returns the number of seconds until a possible intersect of any polygon from the current position with projected speed and turning rate
-
-        :param reverse: If true, the searches performed backwards. This finds the last item that is within the polygon and can be used to find the intersection from inside a polygon looking out
-        :param polygons:
-        :param latitude:
-        :param longitude:
-        :param bearing: degrees
-        :param speed: knots
-        :param turning_rate: degrees per second
-        :param lookahead_seconds: How far ahead to extrapolate the trajectory
+        Returns the number of seconds until a possible intersect of any polygon from the current position with projected
+        speed and turning rate. See ZoneEngine.time_to_intersection, calculators that query the same polygons for every
+        position should keep a ZoneEngine instead.
         """
-        previous_longitude = longitude
-        previous_latitude = latitude
-        speed_per_second = 1852 * speed / 3600  # m/s
-        intersection_times = {}
-        maximum_distance = speed_per_second * lookahead_seconds
-        distances = self.distance_from_point_to_polygons(polygons, latitude, longitude)
-        for name, distance in distances.items():
-            if distance > maximum_distance:
-                intersection_times[name] = None
-        for second in range(lookahead_step, lookahead_seconds, lookahead_step):
-            if len(intersection_times) == len(polygons):
-                break
-            projected_latitude, projected_longitude = project_position_lat_lon(
-                (previous_latitude, previous_longitude),
-                (bearing + second * turning_rate) % 360,
-                speed_per_second * lookahead_step,
-            )
-            line_string = LineString(
-                self.utm.transform_points(
-                    self.pc,
-                    np.array([previous_longitude, projected_longitude]),
-                    np.array([previous_latitude, projected_latitude]),
-                )
-            )
-            previous_latitude = projected_latitude
-            previous_longitude = projected_longitude
-            for name, polygon in polygons:
-                if name not in intersection_times:
-                    if (not from_inside and line_string.intersects(polygon)) or (
-                        from_inside and not line_string.intersects(polygon)
-                    ):
-                        intersection_times[name] = second
-        for key in list(intersection_times.keys()):
-            if not intersection_times[key]:
-                del intersection_times[key]
-        return intersection_times
+        return self.zone_engine(polygons).time_to_intersection(
+            latitude,
+            longitude,
+            bearing,
+            speed,
+            turning_rate,
+            lookahead_seconds,
+            lookahead_step=lookahead_step,
+            from_inside=from_inside,
+        )
 
 
 def project_position(
@@ -209,8 +177,7 @@ def project_position(
 
 def get_shortest_intersection_time(
     track: list[ContestantReceivedPosition],
-    polygon_helper: PolygonHelper,
-    zone_polygons: list[tuple[str, Polygon]],
+    zone_engine: ZoneEngine,
     lookahead_seconds: int,
     from_inside: bool = False,
 ) -> float:
@@ -218,8 +185,7 @@ def get_shortest_intersection_time(
         turning_rate = (
             bearing_difference(track[-3].course, track[-1].course) / (track[-1].time - track[-3].time).total_seconds()
         )
-        intersection_times = polygon_helper.time_to_intersection(
-            zone_polygons,
+        intersection_times = zone_engine.time_to_intersection(
             track[-1].latitude,
             track[-1].longitude,
             track[-1].course,
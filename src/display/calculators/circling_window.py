@@ -0,0 +1,171 @@
+"""
+Incremental circling detection for BacktrackingAndProcedureTurnsCalculator.
+
+Circling is detected by walking the track backwards from the latest position, accumulating the heading change between
+consecutive track segments, until the accumulated change is larger than the turn limit or the walk reaches the
+lookback limit. Instead of recomputing the bearings of all the segments for every position, CirclingWindow keeps the
+segments within the lookback in a deque together with the cumulative heading change up to each segment, and keeps the
+minimum and maximum cumulative heading change of the window in monotonic deques. The accumulated change of the walk
+back to a segment is the difference between the cumulative change at the latest segment and at that segment, so the
+largest accumulated change of the whole window is known without walking it. The turn limit is never less than 180°,
+so the walk is only performed when the window contains more than 180° of heading change, and then it is performed
+exactly as before, so the result is identical.
+"""
+import bisect
+import datetime
+from collections import deque
+from typing import List, NamedTuple, Optional
+
+from display.utilities.coordinate_utilities import bearing_difference, calculate_bearing
+
+MINIMUM_TURN_LIMIT = 180
+# The cumulative heading change is summed in a different order than the walk, so allow for rounding errors when
+# deciding whether the walk is necessary
+ROUNDING_TOLERANCE = 1e-6
+
+
+class WindowSegment(NamedTuple):
+    index: int  # Track index of the first position of the segment
+    time: datetime.datetime  # Time of the first position of the segment
+    bearing: float  # Bearing from the first to the second position of the segment
+    cumulative_difference: float  # Sum of the heading changes between all previous segments up to this segment
+
+
+class CirclingDetection(NamedTuple):
+    index: int  # Track index of the position where the turn limit was exceeded
+    difference: float
+    track_turn: float
+    bearings: List[float]
+    bearing_differences: List[float]
+    accumulated_differences: List[float]
+
+
+class CirclingWindow:
+    def __init__(self, lookback: datetime.timedelta):
+        self.lookback = lookback
+        self.gate_bearings = []  # type: list[tuple[int,float]]
+        self.gate_bearing_indices = []  # type: list[int]
+        self.number_of_positions = 0
+        self.last_position = None
+        self.last_bearing = None
+        self.cumulative_difference = 0
+        self.segments = deque()  # type: deque[WindowSegment]
+        # Segments with increasing (minimum) and decreasing (maximum) cumulative difference
+        self.minimum_segments = deque()  # type: deque[WindowSegment]
+        self.maximum_segments = deque()  # type: deque[WindowSegment]
+
+    def add_gate_bearing(self, index: int, bearing: float):
+        """
+        The bearing of the track from the position with the given index onwards
+        """
+        self.gate_bearings.append((index, bearing))
+        self.gate_bearing_indices.append(index)
+
+    def get_bearing_for_index(self, index: int) -> Optional[float]:
+        position = bisect.bisect_right(self.gate_bearing_indices, index)
+        if position == 0:
+            return None
+        return self.gate_bearings[position - 1][1]
+
+    def update(self, track):
+        """
+        Add the positions of the track that have not been seen yet
+        """
+        for index in range(self.number_of_positions, len(track)):
+            position = track[index]
+            if self.last_position is not None:
+                bearing = calculate_bearing(
+                    (self.last_position.latitude, self.last_position.longitude), (position.latitude, position.longitude)
+                )
+                # The segment from the previous position. The first segment is never part of the walk.
+                if self.last_bearing is not None:
+                    self.cumulative_difference += bearing_difference(self.last_bearing, bearing)
+                    self._append(WindowSegment(index - 1, self.last_position.time, bearing, self.cumulative_difference))
+                self.last_bearing = bearing
+            self.last_position = position
+        self.number_of_positions = len(track)
+        if self.last_position is not None:
+            self._drop_segments(self.last_position.time - self.lookback)
+
+    def _append(self, segment: WindowSegment):
+        self.segments.append(segment)
+        difference = segment.cumulative_difference
+        while self.minimum_segments and self.minimum_segments[-1].cumulative_difference >= difference:
+            self.minimum_segments.pop()
+        self.minimum_segments.append(segment)
+        while self.maximum_segments and self.maximum_segments[-1].cumulative_difference <= difference:
+            self.maximum_segments.pop()
+        self.maximum_segments.append(segment)
+
+    def _drop_segments(self, earliest_time: datetime.datetime):
+        """
+        Drop the segments that start at or before earliest_time
+        """
+        while self.segments and self.segments[0].time <= earliest_time:
+            index = self.segments.popleft().index
+            if self.minimum_segments[0].index == index:
+                self.minimum_segments.popleft()
+            if self.maximum_segments[0].index == index:
+                self.maximum_segments.popleft()
+
+    def largest_accumulated_difference(self) -> float:
+        """
+        The largest absolute accumulated heading change from the latest segment back to any segment in the window
+        """
+        if not self.segments:
+            return 0
+        latest = self.segments[-1].cumulative_difference
+        return max(
+            latest - self.minimum_segments[0].cumulative_difference,
+            self.maximum_segments[0].cumulative_difference - latest,
+        )
+
+    def find_circling(self, earliest_circle_check: datetime.datetime) -> Optional[CirclingDetection]:
+        """
+        Walk back from the latest position to the lookback limit or earliest_circle_check, whichever is latest, and
+        return the first position where the accumulated heading change exceeds the turn limit. If the change exceeds
+        the turn limit in the same direction as the track turns at the gates, the turn limit is increased by the turn
+        of the track.
+        """
+        if self.last_position is None:
+            return None
+        self._drop_segments(max(self.last_position.time - self.lookback, earliest_circle_check))
+        if self.largest_accumulated_difference() <= MINIMUM_TURN_LIMIT - ROUNDING_TOLERANCE:
+            return None
+        difference = 0
+        track_turn = 0
+        next_bearing = None
+        bearings = []
+        bearing_differences = []
+        accumulated_differences = []
+        next_track_bearing = self.get_bearing_for_index(self.number_of_positions - 1)
+        for segment in reversed(self.segments):
+            current_bearing = segment.bearing
+            bearings.append(current_bearing)
+            if next_bearing is not None:
+                current_difference = bearing_difference(current_bearing, next_bearing)
+                bearing_differences.append(current_difference)
+                difference += current_difference
+            accumulated_differences.append(difference)
+            next_bearing = current_bearing
+            current_track_bearing = self.get_bearing_for_index(segment.index - 1)
+            if (
+                current_track_bearing != next_track_bearing
+                and current_track_bearing is not None
+                and next_track_bearing is not None
+            ):
+                track_turn += bearing_difference(current_track_bearing, next_track_bearing)
+            next_track_bearing = current_track_bearing
+
+            if track_turn > 0 and difference > 0 or track_turn < 0 and difference < 0:
+                # If we are turning in the same direction of the turn, add the size of the turn to the turn limit
+                turn_limit = MINIMUM_TURN_LIMIT + abs(track_turn)
+            else:
+                # Otherwise we set the limit to 180 in order to catch procedure turns where they should not be
+                turn_limit = MINIMUM_TURN_LIMIT
+
+            if abs(difference) > turn_limit:
+                return CirclingDetection(
+                    segment.index, difference, track_turn, bearings, bearing_differences, accumulated_differences
+                )
+        return None
@@ -7,12 +7,13 @@ from typing import List, Optional, Tuple, Dict
 from django.core.exceptions import ObjectDoesNotExist
 
 from display.calculators.calculator_factory import calculator_factory
+from display.calculators.received_position_writer import ReceivedPositionWriter
 from display.calculators.update_score_message import UpdateScoreMessage
 from display.models.contestant_track import ContestantTrack
 from display.utilities.calculator_running_utilities import calculator_is_alive, calculator_is_terminated
 from display.utilities.calculator_termination_utilities import is_termination_requested
 from display.utilities.tracking_definitions import TrackingService
-from redis_queue import RedisQueue, RedisEmpty
+from redis_queue import create_position_queue, RedisEmpty
 from slack_facade import post_slack_competition_message
 from traccar_facade import augment_positions_from_traccar
 from utilities.timed_queue import TimedQueue, TimedOut
@@ -28,6 +29,8 @@ from display.models import Contestant, TrackAnnotation, ScoreLogEntry, Contestan
 
 DANGER_LEVEL_REPORT_INTERVAL = 5
 CHECK_BUFFERED_DATA_TIME_LIMIT = 6
+# Maximum number of positions fetched from the position queue at a time
+POSITION_BATCH_SIZE = 100
 logger = logging.getLogger(__name__)
 
 
@@ -56,6 +59,70 @@ class ScoreAccumulator:
         return score, capped
 
 
+def score_log_entry_fields(
+    update_score_message: UpdateScoreMessage, score: float, capped: bool, time_zone: datetime.tzinfo
+) -> Dict:
+    """
+    The fields of the ScoreLogEntry (except the contestant) for a score update, where score is the score after
+    ScoreAccumulator capping, and capped is true if it has been capped. The times are formatted in time_zone.
+    """
+    if update_score_message.planned is not None and update_score_message.actual is not None:
+        offset = (update_score_message.actual - update_score_message.planned).total_seconds()
+        # Must use round, this is the same as used in the score calculation
+        offset_string = "{} s".format("+{}".format(round(offset)) if offset > 0 else round(offset))
+    else:
+        offset_string = ""
+    if capped:
+        update_score_message.message += " (capped)"
+    planned_time = (
+        update_score_message.planned.astimezone(time_zone).strftime("%H:%M:%S")
+        if update_score_message.planned
+        else None
+    )
+    actual_time = (
+        update_score_message.actual.astimezone(time_zone).strftime("%H:%M:%S")
+        if update_score_message.actual
+        else None
+    )
+    string = "{}: {} points {}".format(update_score_message.gate.name, score, update_score_message.message)
+    if offset_string:
+        string += " ({})".format(offset_string)
+    times_string = ""
+    if update_score_message.planned and update_score_message.actual:
+        times_string = "planned: {}\nactual: {}".format(planned_time, actual_time)
+    elif update_score_message.planned:
+        times_string = "planned: {}\nactual: --".format(planned_time)
+    if len(times_string) > 0:
+        string += f"\n{times_string}"
+    return {
+        "time": update_score_message.time,
+        "gate": update_score_message.gate.name,
+        "type": update_score_message.annotation_type,
+        "message": update_score_message.message,
+        "points": score,
+        "planned": update_score_message.planned,
+        "actual": update_score_message.actual,
+        "offset_string": offset_string,
+        "string": string,
+        "times_string": times_string,
+    }
+
+
+def track_annotation_fields(update_score_message: UpdateScoreMessage, entry: ScoreLogEntry) -> Dict:
+    """
+    The fields of the TrackAnnotation (except the contestant and the score log entry) for a score update
+    """
+    return {
+        "latitude": update_score_message.latitude,
+        "longitude": update_score_message.longitude,
+        "message": entry.string,
+        "type": update_score_message.annotation_type,
+        "gate": update_score_message.gate.name,
+        "gate_type": update_score_message.gate.type,
+        "time": update_score_message.time,
+    }
+
+
 LOOP_TIME = 60
 CONTESTANT_REFRESH_INTERVAL = datetime.timedelta(seconds=15)
 
@@ -72,7 +139,6 @@ class ContestantProcessor:
         self,
         contestant: "Contestant",
         live_processing: bool = True,
-        queue_name_override: str = None,
     ):
         calculator_is_alive(contestant.pk, 30)
         super().__init__()
@@ -80,7 +146,7 @@ class ContestantProcessor:
         self.contestant = contestant
         self.live_processing = live_processing
 
-        self.position_queue = RedisQueue(queue_name_override or str(contestant.pk))
+        self.position_queue = create_position_queue(str(contestant.pk))
         self.traccar = get_traccar_instance()
         self.previous_position = None
         self.track_terminated = False
@@ -92,7 +158,7 @@ class ContestantProcessor:
         self.score = self.contestant_track.score
         self.process_event = threading.Event()
         self.contestant.reset_track_and_score()
-        self.contestant.contestantreceivedposition_set.all().delete()
+        self.contestant.delete_track()
         self.contestant.track_version += 1
         self.contestant.save(update_fields=["track_version"])
         self.contestant_track.set_calculator_started()
@@ -113,6 +179,7 @@ class ContestantProcessor:
         self.websocket_facade.transmit_delete_contestant(self.contestant)
         self.websocket_facade.transmit_contestant(self.contestant)
         threading.Thread(target=self.score_updater_thread, daemon=True).start()
+        self.received_position_writer = ReceivedPositionWriter()
         self.gatekeeper = calculator_factory(self.contestant, self.score_processing_queue)
 
     def score_updater_thread(self):
@@ -194,6 +261,8 @@ class ContestantProcessor:
             augment_positions_from_traccar(positions)
 
             if len(positions) > 0:
+                # Record the gap so that a restarted calculator can replay it
+                self.position_queue.append_history(positions)
                 logger.debug(
                     f"{self.contestant}:  Retrieved {len(positions)} additional positions for the interval {positions[0]['device_time'].strftime('%H:%M:%S')} - {positions[-1]['device_time'].strftime('%H:%M:%S')}"
                 )
@@ -202,12 +271,13 @@ class ContestantProcessor:
 
     def refresh_scores(self):
         """
-        Push all score information to the front end. This needs to be done at regular intervals in case the front end
-        loses connectivity with the Web server.
+        Push the score sequence number and basic information to the front end. This needs to be done at regular
+        intervals in case the front end loses connectivity with the Web server. Score log entries and annotations are
+        pushed as deltas, and the sequence number allows the tracking consumer to detect that deltas are missing and
+        resend the complete score state.
         """
         self.contestant.refresh_from_db()
-        self.websocket_facade.transmit_score_log_entry(self.contestant)
-        self.websocket_facade.transmit_annotations(self.contestant)
+        self.websocket_facade.transmit_score_sequence(self.contestant)
         self.websocket_facade.transmit_basic_information(self.contestant)
 
     def run(self):
@@ -227,78 +297,86 @@ class ContestantProcessor:
         number_of_positions = 0
         # Wait while the thread loads outstanding positions.
         self.finished_loading_initial_positions.wait()
-        while not self.track_terminated:
-            calculator_is_alive(self.contestant.pk, 30)
-            now = datetime.datetime.now(datetime.timezone.utc)
-            if self.live_processing and now > self.contestant.finished_by_time + self.delay:
-                data = self.timed_queue.peek()
-                if data is None or data["device_time"] > now:
-                    self.notify_termination()
-                    break
-            if now - self.last_contestant_refresh > CONTESTANT_REFRESH_INTERVAL:
-                self.refresh_scores()
+        try:
+            while not self.track_terminated:
+                calculator_is_alive(self.contestant.pk, 30)
+                now = datetime.datetime.now(datetime.timezone.utc)
+                if self.live_processing and now > self.contestant.finished_by_time + self.delay:
+                    data = self.timed_queue.peek()
+                    if data is None or data["device_time"] > now:
+                        self.notify_termination()
+                        break
+                if now - self.last_contestant_refresh > CONTESTANT_REFRESH_INTERVAL:
+                    self.refresh_scores()
+                    try:
+                        self.contestant.refresh_from_db()
+                    except ObjectDoesNotExist:
+                        # Contestants has been deleted, terminate the calculator
+                        logger.info(f"{self.contestant} has been deleted, terminating")
+                        self.track_terminated = True
+                        break
+                    self.last_contestant_refresh = now
                 try:
-                    self.contestant.refresh_from_db()
-                except ObjectDoesNotExist:
-                    # Contestants has been deleted, terminate the calculator
-                    logger.info(f"{self.contestant} has been deleted, terminating")
-                    self.track_terminated = True
-                    break
-                self.last_contestant_refresh = now
-            try:
-                position_data = self.timed_queue.get(timeout=15)
-            except TimedOut:
-                # We have not received anything for 60 seconds, check if we should terminate
-                self.check_termination_is_commanded(self.previous_position)
-                continue
-            if position_data is None:
-                # Signal the track processor that this is the end, and perform the track calculation
-                logger.debug(f"End of position list after {number_of_positions} positions")
-                self.notify_termination()
-                continue
-            if not receiving:
-                logger.info(f"{self.contestant}: Started processing data")
-                receiving = True
-            # logger.debug(f"Processing position ID {position_data['id']} for device ID {position_data['deviceId']}")
-            position_data["calculator_received_time"] = datetime.datetime.now(datetime.timezone.utc)
-            number_of_positions += 1
-            if self.live_processing:
-                positions_to_process = self.check_for_buffered_data_if_necessary(position_data)
-            else:
-                positions_to_process = [position_data]
-            all_positions = []
-            generated_positions = []
-            for position_to_process in positions_to_process:
-                p = self.contestant.generate_position_block_for_contestant(
-                    position_to_process, position_to_process["device_time"]
-                )
-
-                if self.previous_position and (
-                    (p.latitude == self.previous_position.latitude and p.longitude == self.previous_position.longitude)
-                    or self.previous_position.time >= p.time
-                ):
-                    # Old or duplicate position, ignoring
-                    # We still need to update the previous position to avoid fetching unnecessary data from traccar
-                    if self.previous_position.time < p.time:
-                        self.previous_position = p
+                    position_data = self.timed_queue.get(timeout=15)
+                except TimedOut:
+                    # We have not received anything for 60 seconds, check if we should terminate
+                    self.check_termination_is_commanded(self.previous_position)
                     continue
-                all_positions.append(p)
-                for position in self.interpolate_track(self.previous_position, p):
-                    position.websocket_transmitted_time = datetime.datetime.now(datetime.timezone.utc)
-                    generated_positions.append(position)
-                self.previous_position = p
-            ContestantReceivedPosition.objects.bulk_create(generated_positions)
-            for position in all_positions:
-                calculator_is_alive(self.contestant.pk, 30)
-                self.gatekeeper.calculate_score(position)
+                if position_data is None:
+                    # Signal the track processor that this is the end, and perform the track calculation
+                    logger.debug(f"End of position list after {number_of_positions} positions")
+                    self.notify_termination()
+                    continue
+                if not receiving:
+                    logger.info(f"{self.contestant}: Started processing data")
+                    receiving = True
+                # logger.debug(f"Processing position ID {position_data['id']} for device ID {position_data['deviceId']}")
+                position_data["calculator_received_time"] = datetime.datetime.now(datetime.timezone.utc)
+                number_of_positions += 1
+                if self.live_processing:
+                    positions_to_process = self.check_for_buffered_data_if_necessary(position_data)
+                else:
+                    positions_to_process = [position_data]
+                all_positions = []
+                generated_positions = []
+                for position_to_process in positions_to_process:
+                    p = self.contestant.generate_position_block_for_contestant(
+                        position_to_process, position_to_process["device_time"]
+                    )
+
+                    if self.previous_position and (
+                        (p.latitude == self.previous_position.latitude and p.longitude == self.previous_position.longitude)
+                        or self.previous_position.time >= p.time
+                    ):
+                        # Old or duplicate position, ignoring
+                        # We still need to update the previous position to avoid fetching unnecessary data from traccar
+                        if self.previous_position.time < p.time:
+                            self.previous_position = p
+                        continue
+                    all_positions.append(p)
+                    for position in self.interpolate_track(self.previous_position, p):
+                        position.websocket_transmitted_time = datetime.datetime.now(datetime.timezone.utc)
+                        generated_positions.append(position)
+                    self.previous_position = p
+                self.received_position_writer.add(generated_positions)
+                for position in all_positions:
+                    calculator_is_alive(self.contestant.pk, 30)
+                    self.gatekeeper.calculate_score(position)
+                self.position_queue.acknowledge([position_data])
 
-            self.websocket_facade.transmit_navigation_task_position_data(self.contestant, all_positions)
-            self.should_i_terminate()
-            self.check_termination_is_commanded(self.previous_position)
+                self.websocket_facade.transmit_navigation_task_position_data(self.contestant, all_positions)
+                self.should_i_terminate()
+                self.check_termination_is_commanded(self.previous_position)
+        finally:
+            # Make sure that all buffered positions are stored, also if the calculator crashes
+            self.received_position_writer.close()
         self.gatekeeper.finished_processing()
         self.contestant_track.set_calculator_finished()
-        while not self.position_queue.empty():
-            self.position_queue.pop()
+        try:
+            self.contestant.compress_track()
+        except Exception:
+            logger.exception(f"{self.contestant}: Failed compressing track")
+        self.position_queue.clear()
         self.score_processing_queue.join()
         logger.info("Terminating calculator for {}".format(self.contestant))
         calculator_is_terminated(self.contestant.pk)
@@ -366,53 +444,58 @@ class ContestantProcessor:
         logger.info(
             f"{self.contestant}: Starting delayed position queuer with {self.position_queue.size} waiting messages. Track terminated is {self.track_terminated}"
         )
-        if self.live_processing and self.contestant.tracking_service == TrackingService.TRACCAR:
+        history = self.position_queue.replay_history()
+        if len(history) > 0:
+            # The calculator has been restarted, and the position stream holds everything that was received or fetched
+            # from traccar by the previous instance, so the track is not fetched again. The timed queue orders the
+            # positions by time.
+            logger.info(f"{self.contestant}: Replaying {len(history)} positions from the position stream")
+            self.timed_queue.put_many((position, position["device_time"] + self.delay) for position in history)
+        elif self.live_processing and self.contestant.tracking_service == TrackingService.TRACCAR:
             device_ids = self.traccar.get_device_ids_for_contestant(self.contestant)
             current_time = datetime.datetime.now(datetime.timezone.utc)
-            device_positions = {}
             # Fetch any earlier positions for the contestant to ensure that we start from the beginning.
-            for device_id in device_ids:
-                positions = self.traccar.get_positions_for_device_id(
-                    device_id, self.contestant.tracker_start_time, current_time
-                )
+            device_positions = self.traccar.get_positions_for_devices(
+                device_ids, self.contestant.tracker_start_time, current_time
+            )
+            for positions in device_positions.values():
                 augment_positions_from_traccar(positions)
-                device_positions[device_id] = positions
             try:
                 # Select the longest track
                 positions_to_use = sorted(device_positions.values(), key=lambda k: len(k), reverse=True)[0]
                 logger.info(
                     f"{self.contestant}: Fetched {len(positions_to_use)} historic positions at start of calculator"
                 )
-                now = datetime.datetime.now(datetime.timezone.utc)
-                for position in positions_to_use:
-                    self.timed_queue.put(position, position["device_time"] + self.delay)
+                self.position_queue.append_history(positions_to_use)
+                self.timed_queue.put_many(
+                    (position, position["device_time"] + self.delay) for position in positions_to_use
+                )
             except IndexError:
                 pass
         elif self.live_processing and self.contestant.tracking_service == TrackingService.FLY_MASTER:
             existing_data = self.contestant.get_flymaster_track()
-            now = datetime.datetime.now(datetime.timezone.utc)
-            for position in existing_data:
-                self.timed_queue.put(position, position["device_time"] + self.delay)
+            self.position_queue.append_history(existing_data)
+            self.timed_queue.put_many((position, position["device_time"] + self.delay) for position in existing_data)
 
         receiving = False
 
         while not self.track_terminated:
             try:
-                position_data = self.position_queue.pop(True, timeout=30)
-                if position_data is not None:
-                    release_time = position_data["device_time"] + self.delay
-                    if not receiving:
-                        logger.info(f"{self.contestant}: Started receiving data")
-                else:
-                    logger.info(f"{self.contestant}: Delayed position queuer received None")
-                    if len(self.timed_queue._queue):
-                        release_time = self.timed_queue._queue[-1][1] + datetime.timedelta(seconds=1)
+                for position_data in self.position_queue.pop_many(POSITION_BATCH_SIZE, True, timeout=30):
+                    if position_data is not None:
+                        release_time = position_data["device_time"] + self.delay
+                        if not receiving:
+                            logger.info(f"{self.contestant}: Started receiving data")
                     else:
-                        release_time = datetime.datetime.now(datetime.timezone.utc)
-                self.timed_queue.put(position_data, release_time)
-                if not receiving:
-                    self.finished_loading_initial_positions.set()
-                    receiving = True
+                        logger.info(f"{self.contestant}: Delayed position queuer received None")
+                        if (last_release_time := self.timed_queue.last_release_time()) is not None:
+                            release_time = last_release_time + datetime.timedelta(seconds=1)
+                        else:
+                            release_time = datetime.datetime.now(datetime.timezone.utc)
+                    self.timed_queue.put(position_data, release_time)
+                    if not receiving:
+                        self.finished_loading_initial_positions.set()
+                        receiving = True
             except RedisEmpty:
                 self.check_termination_is_commanded(self.previous_position)
 
@@ -424,68 +507,20 @@ class ContestantProcessor:
         score, capped = self.accumulated_scores.set_and_update_score(
             update_score_message.score, update_score_message.score_type, update_score_message.maximum_score
         )
-        if update_score_message.planned is not None and update_score_message.actual is not None:
-            offset = (update_score_message.actual - update_score_message.planned).total_seconds()
-            # Must use round, this is the same as used in the score calculation
-            offset_string = "{} s".format("+{}".format(round(offset)) if offset > 0 else round(offset))
-        else:
-            offset_string = ""
-        if capped:
-            update_score_message.message += " (capped)"
-        planned_time = (
-            update_score_message.planned.astimezone(self.contestant.navigation_task.contest.time_zone).strftime(
-                "%H:%M:%S"
-            )
-            if update_score_message.planned
-            else None
+        entry_fields = score_log_entry_fields(
+            update_score_message, score, capped, self.contestant.navigation_task.contest.time_zone
         )
-        actual_time = (
-            update_score_message.actual.astimezone(self.contestant.navigation_task.contest.time_zone).strftime(
-                "%H:%M:%S"
-            )
-            if update_score_message.actual
-            else None
-        )
-        string = "{}: {} points {}".format(update_score_message.gate.name, score, update_score_message.message)
-        if offset_string:
-            string += " ({})".format(offset_string)
-        times_string = ""
-        if update_score_message.planned and update_score_message.actual:
-            times_string = "planned: {}\nactual: {}".format(planned_time, actual_time)
-        elif update_score_message.planned:
-            times_string = "planned: {}\nactual: --".format(planned_time)
-        if len(times_string) > 0:
-            string += f"\n{times_string}"
-        logger.info("UPDATE_SCORE {}: {}{}".format(self.contestant, "", string))
+        logger.info("UPDATE_SCORE {}: {}{}".format(self.contestant, "", entry_fields["string"]))
         # Take into account that external events may have changed the score
         self.contestant_track.refresh_from_db()
-        self.contestant.record_score_by_gate(update_score_message.gate.name, score)
+        gate_score = self.contestant.record_score_by_gate(update_score_message.gate.name, score)
+        self.websocket_facade.transmit_gate_score_change(gate_score)
         self.score = self.contestant_track.score
         logger.debug(f"Setting existing scores from contestant track: {self.score}")
         self.score += score
-        entry = ScoreLogEntry.create_and_push(
-            contestant=self.contestant,
-            time=update_score_message.time,
-            gate=update_score_message.gate.name,
-            type=update_score_message.annotation_type,
-            message=update_score_message.message,
-            points=score,
-            planned=update_score_message.planned,
-            actual=update_score_message.actual,
-            offset_string=offset_string,
-            string=string,
-            times_string=times_string,
-        )
+        entry = ScoreLogEntry.create_and_push(contestant=self.contestant, **entry_fields)
         TrackAnnotation.create_and_push(
-            contestant=self.contestant,
-            latitude=update_score_message.latitude,
-            longitude=update_score_message.longitude,
-            message=string,
-            type=update_score_message.annotation_type,
-            gate=update_score_message.gate.name,
-            gate_type=update_score_message.gate.type,
-            time=update_score_message.time,
-            score_log_entry=entry,
+            contestant=self.contestant, score_log_entry=entry, **track_annotation_fields(update_score_message, entry)
         )
         if score != 0:
             self.contestant_track.update_score(self.score)
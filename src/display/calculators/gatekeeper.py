@@ -11,6 +11,7 @@ from display.models.contestant_utility_models import ContestantReceivedPosition
 from websocket_channels import WebsocketFacade
 
 from display.calculators.positions_and_gates import Gate, MultiGate
+from display.calculators.track_buffer import TrackBuffer
 from display.utilities.route_building_utilities import calculate_extended_gate
 from display.utilities.coordinate_utilities import Projector
 
@@ -49,10 +50,12 @@ class Gatekeeper(ABC):
         self.contestant = contestant
         self.score_processing_queue = score_processing_queue
 
-        self.track: list[ContestantReceivedPosition] = []
         self.has_passed_finishpoint = False
         self.last_gate_index = 0
         self.last_danger_level_report = 0
+        # Periodic estimates (danger level, time to the next gate) that are only useful while the contestant is
+        # flying. Disabled when a complete track is scored at once.
+        self.transmit_live_estimates = True
         self.enroute = False
 
         self.gates = self.create_gates()
@@ -65,6 +68,7 @@ class Gatekeeper(ABC):
         self.last_gate = None  # type: Optional[Gate]
         self.previous_last_gate = None  # type: Optional[Gate]
         self.projector = Projector(self.gates[0].latitude, self.gates[0].longitude)
+        self.track = TrackBuffer(self.projector)
         self.in_range_of_gate = None
         self.websocket_facade = WebsocketFacade()
         logger.debug(f"{self.contestant}: Starting calculators")
@@ -231,7 +235,10 @@ class Gatekeeper(ABC):
                 )
             else:
                 calculator.calculate_outside_route(self.track, self.last_gate)
-        if self.last_danger_level_report + DANGER_LEVEL_REPORT_INTERVAL < time.time():
+        if (
+            self.transmit_live_estimates
+            and self.last_danger_level_report + DANGER_LEVEL_REPORT_INTERVAL < time.time()
+        ):
             self.last_danger_level_report = time.time()
             self.report_calculator_danger_level()
 
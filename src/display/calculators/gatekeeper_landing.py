@@ -40,6 +40,8 @@ class GatekeeperLanding(Gatekeeper):
             ]
         )
         self.projector = Projector(self.landing_gate.gates[0].latitude, self.landing_gate.gates[0].longitude)
+        # The gate intersections use the local coordinates of the track, which must use the same projection
+        self.track.projector = self.projector
         for calculator in calculators:
             self.calculators.append(
                 calculator(
@@ -100,11 +100,11 @@ class GatekeeperRoute(Gatekeeper):
         if not self.any_gate_passed():
             return False
         if len(self.track):
-            last_time = self.track[-1].time
-            index = len(self.track) - 1
+            speeds = self.track.column("speed")
+            times = self.track.column("time")
             for index in range(len(self.track) - 1, -1, -1):
-                if self.track[index].speed < 5 and len(self.track) - index > 60:
-                    if (last_time - self.track[index].time).total_seconds() >= 60:
+                if speeds[index] < 5 and len(self.track) - index > 60:
+                    if times[-1] - times[index] >= 60 * 1e6:
                         return True
                 else:
                     return False
@@ -420,12 +420,7 @@ class GatekeeperRoute(Gatekeeper):
         :return: Distance in NM
         """
         if len(self.track) > 1:
-            index = len(self.track) - 2
-            initial_time = self.track[-1].time
-            while index >= 0:
-                if (initial_time - self.track[index].time).total_seconds() > average_duration_seconds:
-                    break
-                index -= 1
+            index = self.track.last_index_older_than(datetime.timedelta(seconds=average_duration_seconds))
             starting_point = (self.track[index].latitude, self.track[index].longitude)
             finish_point = (self.track[-1].latitude, self.track[-1].longitude)
             intersection = nv_intersect(starting_point, finish_point, *gate.gate_line)
@@ -475,17 +470,9 @@ class GatekeeperRoute(Gatekeeper):
         :return: seconds
         """
         if len(self.track) > 0:
-            speed = self.track[-1].speed
-            count = 1
-            initial_time = self.track[-1].time
-            index = len(self.track) - 2
-            while index >= 0:
-                count += 1
-                speed += self.track[index].speed
-                if (initial_time - self.track[index].time).total_seconds() > average_duration_seconds:
-                    break
-                index -= 1
-            average_speed = speed / count  # kt
+            # Average over the positions in the duration, including the first position before it
+            index = self.track.last_index_older_than(datetime.timedelta(seconds=average_duration_seconds))
+            average_speed = float(self.track.column("speed")[max(index, 0) :].mean())  # kt
             distance = abs(
                 cross_track_distance(
                     gate.gate_line[0][0],
@@ -613,7 +600,8 @@ class GatekeeperRoute(Gatekeeper):
         self.check_intersections()
         self.calculate_gate_score()
         if (
-            self.recalculation_completed
+            self.transmit_live_estimates
+            and self.recalculation_completed
             and self.last_crossing_time_transmission + CROSSING_TIME_TRANSMISSION_INTERVAL < time.time()
         ):
             self.last_crossing_time_transmission = time.time()
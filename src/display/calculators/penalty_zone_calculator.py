@@ -3,11 +3,12 @@ from multiprocessing import Queue
 from typing import List, Optional
 
 from display.calculators.calculator import Calculator
-from display.calculators.calculator_utilities import PolygonHelper, get_shortest_intersection_time
+from display.calculators.calculator_utilities import get_shortest_intersection_time
 from display.calculators.positions_and_gates import Gate
 from display.calculators.update_score_message import UpdateScoreMessage
 from display.models import Contestant, Scorecard, Route, INFORMATION, ANOMALY
 from display.models.contestant_utility_models import ContestantReceivedPosition
+from display.utilities.zone_engine import ZoneEngine
 
 logger = logging.getLogger(__name__)
 
@@ -35,14 +36,14 @@ class PenaltyZoneCalculator(Calculator):
         self.last_outside_penalty = None
         self.crossed_outside_position = None
         waypoint = self.contestant.navigation_task.route.waypoints[0]
-        self.polygon_helper = PolygonHelper(waypoint.latitude, waypoint.longitude)
-        self.zone_polygons = []
         self.zone_map = {}
         self.entered_polygon_times = {}
         zones = route.prohibited_set.filter(type="penalty")
         for zone in zones:
             self.zone_map[zone.pk] = zone
-            self.zone_polygons.append((zone.pk, self.polygon_helper.build_polygon(zone.path)))
+        self.zone_engine = ZoneEngine.from_paths(
+            waypoint.latitude, waypoint.longitude, [(zone.pk, zone.path) for zone in self.zone_map.values()]
+        )
 
     def passed_finishpoint(self, track: List[ContestantReceivedPosition], last_gate: "Gate"):
         pass
@@ -55,9 +56,7 @@ class PenaltyZoneCalculator(Calculator):
         Danger level ranges from 0 to 100 where 100 is inside a penalty zone
         """
         LOOKAHEAD_SECONDS = 40
-        shortest_time = get_shortest_intersection_time(
-            track, self.polygon_helper, self.zone_polygons, LOOKAHEAD_SECONDS
-        )
+        shortest_time = get_shortest_intersection_time(track, self.zone_engine, LOOKAHEAD_SECONDS)
         return 99 * (LOOKAHEAD_SECONDS - shortest_time) / LOOKAHEAD_SECONDS
 
     def get_danger_level_and_accumulated_score(self, track: List[ContestantReceivedPosition]):
@@ -75,8 +74,8 @@ class PenaltyZoneCalculator(Calculator):
     def check_inside_prohibited_zone(self, track: List[ContestantReceivedPosition], last_gate: Optional["Gate"]):
         position = track[-1]
         zone_pks_the_position_was_already_inside = list(self.entered_polygon_times.keys())
-        zone_pks_the_position_is_currently_inside = self.polygon_helper.check_inside_polygons(
-            self.zone_polygons, position.latitude, position.longitude
+        zone_pks_the_position_is_currently_inside = self.zone_engine.zones_containing(
+            position.latitude, position.longitude
         )
         for zone_pk in zone_pks_the_position_is_currently_inside:
             if zone_pk not in self.entered_polygon_times:
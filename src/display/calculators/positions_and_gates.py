@@ -2,7 +2,7 @@ import logging
 from datetime import timedelta, datetime
 from typing import Tuple, List, Optional
 
-from display.models.contestant_utility_models import ContestantReceivedPosition
+from display.calculators.track_buffer import TrackBuffer, TrackPosition
 from display.utilities.coordinate_utilities import (
     fraction_of_leg,
     calculate_bearing,
@@ -80,19 +80,19 @@ class Gate:
             )
         return False
 
-    def get_gate_intersection_time(self, projector: Projector, track: List[ContestantReceivedPosition]) -> Optional[datetime]:
+    def get_gate_intersection_time(self, projector: Projector, track: TrackBuffer) -> Optional[datetime]:
         if len(track) > 2:
             return get_intersect_time(projector, track[-3], track[-1], self.gate_line[0], self.gate_line[1])
         return None
 
-    def get_gate_infinite_intersection_time(self, projector: Projector, track: List[ContestantReceivedPosition]) -> Optional[datetime]:
+    def get_gate_infinite_intersection_time(self, projector: Projector, track: TrackBuffer) -> Optional[datetime]:
         if len(track) > 2:
             return get_intersect_time(
                 projector, track[-3], track[-1], self.gate_line_infinite[0], self.gate_line_infinite[1]
             )
         return None
 
-    def get_gate_extended_intersection_time(self, projector: Projector, track: List[ContestantReceivedPosition]) -> Optional[datetime]:
+    def get_gate_extended_intersection_time(self, projector: Projector, track: TrackBuffer) -> Optional[datetime]:
         if len(track) > 2 and self.gate_line_extended:
             return get_intersect_time(
                 projector, track[-3], track[-1], self.gate_line_extended[0], self.gate_line_extended[1]
@@ -133,7 +133,7 @@ class MultiGate:
         for gate in self.gates:
             gate.expected_time = expected_time
 
-    def get_gate_intersection_time(self, projector: Projector, track: List[ContestantReceivedPosition]) -> Optional[datetime]:
+    def get_gate_intersection_time(self, projector: Projector, track: TrackBuffer) -> Optional[datetime]:
         for gate in self.gates:
             intersection_time = gate.get_gate_intersection_time(projector, track)
             if intersection_time is not None:
@@ -153,15 +153,19 @@ def round_seconds(stamp: datetime) -> datetime:
 
 
 def get_intersect_time(
-    projector: Projector, track_segment_start: ContestantReceivedPosition, track_segment_finish: ContestantReceivedPosition, gate_start, gate_finish
+    projector: Projector, track_segment_start: TrackPosition, track_segment_finish: TrackPosition, gate_start, gate_finish
 ) -> Optional[datetime]:
+    """
+    The track positions come from the track buffer of the gatekeeper, which has already projected them with the same
+    projector.
+    """
     # intersection = line_intersect(track_segment_start.longitude, track_segment_start.latitude,
     #                               track_segment_finish.longitude,
     #                               track_segment_finish.latitude, gate_start[1], gate_start[0], gate_finish[1],
     #                               gate_finish[0])
-    intersection = projector.intersect(
-        (track_segment_start.latitude, track_segment_start.longitude),
-        (track_segment_finish.latitude, track_segment_finish.longitude),
+    intersection = projector.intersect_projected(
+        (track_segment_start.x, track_segment_start.y),
+        (track_segment_finish.x, track_segment_finish.y),
         gate_start,
         gate_finish,
     )
@@ -0,0 +1,87 @@
+import logging
+import threading
+import time
+from queue import Queue, Empty
+from typing import List, Iterable
+
+from django.db import connection
+
+from display.models import ContestantReceivedPosition
+
+logger = logging.getLogger(__name__)
+
+# Flush the buffer when it holds this many positions
+FLUSH_SIZE = 50
+# Flush the buffer when the oldest buffered position has waited this many seconds
+FLUSH_INTERVAL = 2
+# Maximum number of positions waiting to be written. If the database cannot keep up, add() blocks until there is space.
+MAXIMUM_BUFFERED_POSITIONS = 5000
+
+
+class ReceivedPositionWriter:
+    """
+    Writes ContestantReceivedPosition objects to the database from a background thread so that the database latency
+    is kept out of the scoring loop of the calculator. Positions are buffered and written with a single bulk_create
+    when FLUSH_SIZE positions have been buffered or FLUSH_INTERVAL seconds have passed since the first buffered
+    position, whichever comes first. close() writes any remaining positions and waits for the thread to finish.
+    """
+
+    def __init__(
+        self,
+        flush_size: int = FLUSH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+        maximum_buffered_positions: int = MAXIMUM_BUFFERED_POSITIONS,
+    ):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.queue = Queue(maxsize=maximum_buffered_positions)
+        self.closed = False
+        self.thread = threading.Thread(target=self.writer_thread, daemon=True, name="received_position_writer")
+        self.thread.start()
+
+    def add(self, positions: Iterable[ContestantReceivedPosition]):
+        if self.closed:
+            raise RuntimeError("Attempting to add positions to a closed ReceivedPositionWriter")
+        for position in positions:
+            self.queue.put(position)
+
+    def close(self):
+        """
+        Write all buffered positions and terminate the writer thread
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+
+    def flush(self, buffer: List[ContestantReceivedPosition]):
+        if len(buffer) == 0:
+            return
+        try:
+            ContestantReceivedPosition.objects.bulk_create(buffer)
+        except Exception:
+            logger.exception(f"Failed writing {len(buffer)} received positions")
+
+    def writer_thread(self):
+        buffer = []
+        deadline = None
+        running = True
+        while running:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                position = self.queue.get(timeout=timeout)
+                if position is None:
+                    running = False
+                else:
+                    if len(buffer) == 0:
+                        deadline = time.monotonic() + self.flush_interval
+                    buffer.append(position)
+            except Empty:
+                pass
+            if not running or len(buffer) >= self.flush_size or (deadline is not None and time.monotonic() >= deadline):
+                self.flush(buffer)
+                buffer = []
+                deadline = None
+        # The thread has its own database connection
+        connection.close()
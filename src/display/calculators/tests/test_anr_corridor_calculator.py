@@ -28,13 +28,13 @@ from display.models import (
     EditableRoute,
 )
 from utilities.mock_utilities import TraccarMock
-from redis_queue import RedisQueue
+from redis_queue import create_position_queue
 
 logger = logging.getLogger(__name__)
 
 
 def calculator_runner(contestant, track):
-    q = RedisQueue(contestant.pk)
+    q = create_position_queue(contestant.pk)
     contestant_processor = ContestantProcessor(contestant, live_processing=False)
     for i in track:
         i["id"] = 0
@@ -194,7 +194,7 @@ class TestANRPerLeg(TransactionTestCase):
             wind_direction=160,
             wind_speed=0,
         )
-        q = RedisQueue(self.contestant.pk)
+        q = create_position_queue(self.contestant.pk)
         contestant_processor = ContestantProcessor(self.contestant, live_processing=True)
         for i in track:
             i["id"] = 0
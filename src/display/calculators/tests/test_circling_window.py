@@ -0,0 +1,122 @@
+import datetime
+from collections import namedtuple
+from typing import List, Optional, Tuple
+from unittest import TestCase
+
+from display.calculators.circling_window import CirclingWindow
+from display.calculators.tests.utilities import load_traccar_track
+from display.utilities.coordinate_utilities import bearing_difference, calculate_bearing
+
+Position = namedtuple("Position", ["time", "latitude", "longitude"])
+
+LOOKBACK = datetime.timedelta(seconds=90)
+GATE_INTERVAL = 150
+
+
+def reference_get_bearing_for_index(gate_bearings: List[Tuple[int, float]], index: int) -> Optional[float]:
+    for bearing_index, bearing in reversed(gate_bearings):
+        if bearing_index <= index:
+            return bearing
+    return None
+
+
+def reference_find_circling(track, gate_bearings, earliest_circle_check) -> Optional[tuple]:
+    """
+    The walk that BacktrackingAndProcedureTurnsCalculator.detect_circling performed for every position before
+    CirclingWindow
+    """
+    next_position = track[-1]
+    now = next_position.time
+    current_position_index = len(track) - 2
+    current_position = track[current_position_index]
+    difference = 0
+    next_bearing = None
+    next_track_bearing = reference_get_bearing_for_index(gate_bearings, len(track) - 1)
+    track_turn = 0
+    while (
+        current_position_index > 0
+        and current_position.time > now - LOOKBACK
+        and current_position.time > earliest_circle_check
+    ):
+        current_position_index -= 1
+        current_bearing = calculate_bearing(
+            (current_position.latitude, current_position.longitude), (next_position.latitude, next_position.longitude)
+        )
+        if next_bearing is not None:
+            difference += bearing_difference(current_bearing, next_bearing)
+        next_bearing = current_bearing
+        next_position = current_position
+        current_position = track[current_position_index]
+        current_track_bearing = reference_get_bearing_for_index(gate_bearings, current_position_index)
+        if (
+            current_track_bearing != next_track_bearing
+            and current_track_bearing is not None
+            and next_track_bearing is not None
+        ):
+            track_turn += bearing_difference(current_track_bearing, next_track_bearing)
+        next_track_bearing = current_track_bearing
+        if track_turn > 0 and difference > 0 or track_turn < 0 and difference < 0:
+            turn_limit = 180 + abs(track_turn)
+        else:
+            turn_limit = 180
+        if abs(difference) > turn_limit:
+            return current_position_index + 1, difference, track_turn
+    return None
+
+
+class TestCirclingWindow(TestCase):
+    def replay(self, track_file: str) -> int:
+        """
+        Replay the track with the reference walk and the circling window, resetting the earliest circle check when
+        circling stops like the calculator does, and check that they find the same circling for every position
+        """
+        positions = [Position(*item) for item in load_traccar_track(track_file)]
+        window = CirclingWindow(LOOKBACK)
+        gate_bearings = []
+        track = []
+        earliest_circle_check = positions[0].time
+        circling = False
+        detections = 0
+        for index, position in enumerate(positions):
+            track.append(position)
+            if index % GATE_INTERVAL == 0:
+                gate_bearings.append((index, (index * 37) % 360))
+                window.add_gate_bearing(index, (index * 37) % 360)
+            window.update(track)
+            if len(track) < 3:
+                continue
+            expected = reference_find_circling(track, gate_bearings, earliest_circle_check)
+            detection = window.find_circling(earliest_circle_check)
+            self.assertEqual(
+                expected, detection and (detection.index, detection.difference, detection.track_turn), index
+            )
+            if expected is not None:
+                detections += 1
+                circling = True
+            elif circling:
+                circling = False
+                earliest_circle_check = position.time
+        return detections
+
+    def test_replay_circling_track(self):
+        self.assertGreater(self.replay("display/calculators/tests/tommy_missing_circling_penalty.csv"), 0)
+
+    def test_replay_tracks(self):
+        for track_file in ("kolaf_eidsvoll_traccar.csv", "kurtbergen.csv", "vjoycarhamar.csv"):
+            self.replay(f"display/calculators/tests/{track_file}")
+
+    def test_get_bearing_for_index(self):
+        window = CirclingWindow(LOOKBACK)
+        gate_bearings = [(3, 90.0), (10, 180.0), (10, 270.0), (25, 0.0)]
+        for index, bearing in gate_bearings:
+            window.add_gate_bearing(index, bearing)
+        for index in range(30):
+            self.assertEqual(reference_get_bearing_for_index(gate_bearings, index), window.get_bearing_for_index(index))
+
+    def test_window_is_pruned(self):
+        window = CirclingWindow(LOOKBACK)
+        start = datetime.datetime(2021, 3, 31, tzinfo=datetime.timezone.utc)
+        track = [Position(start + datetime.timedelta(seconds=second), 60, 11 + second * 0.001) for second in range(300)]
+        window.update(track)
+        self.assertEqual(89, len(window.segments))
+        self.assertIsNone(window.find_circling(start))
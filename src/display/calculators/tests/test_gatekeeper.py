@@ -171,7 +171,8 @@ class TestCrossingEstimate(TransactionTestCase):
             speed=70,
             course=270,
         )
-        gatekeeper.track = [start_position, next_position]
+        gatekeeper.track.append(start_position)
+        gatekeeper.track.append(next_position)
         gate, estimated = gatekeeper.estimate_crossing_time_of_next_timed_gate()
         self.assertEqual(self.route.waypoints[0].name, gate.name)
         expected = dateutil.parser.parse("2020-01-01T00:00:02.631887+00:00")
@@ -198,7 +199,8 @@ class TestCrossingEstimate(TransactionTestCase):
             speed=70,
             course=270,
         )
-        gatekeeper.track = [start_position, next_position]
+        gatekeeper.track.append(start_position)
+        gatekeeper.track.append(next_position)
         gate, estimated = gatekeeper.estimate_crossing_time_of_next_timed_gate()
         self.assertEqual(self.route.waypoints[2].name, gate.name)
         expected = dateutil.parser.parse("2020-01-01T00:07:22.512632+00:00")
@@ -6,10 +6,12 @@ import gpxpy
 
 from django.test import TransactionTestCase
 
+from display.calculators.batch_contestant_processor import BatchContestantProcessor
 from display.calculators.calculator_utilities import load_track_points_traccar_csv
 from display.calculators.contestant_processor import ContestantProcessor
 from display.calculators.positions_and_gates import Gate
 from display.calculators.tests.utilities import load_traccar_track
+from display.utilities.calculator_running_utilities import is_calculator_running
 from display.utilities.route_building_utilities import (
     create_precision_route_from_gpx,
     calculate_extended_gate,
@@ -27,11 +29,11 @@ from display.models import (
     EditableRoute,
 )
 from utilities.mock_utilities import TraccarMock
-from redis_queue import RedisQueue
+from redis_queue import create_position_queue
 
 
 def calculator_runner(contestant, track):
-    q = RedisQueue(contestant.pk)
+    q = create_position_queue(contestant.pk)
     contestant_processor = ContestantProcessor(contestant, live_processing=False)
     for i in track:
         i["id"] = 0
@@ -45,6 +47,15 @@ def calculator_runner(contestant, track):
         q.pop()
 
 
+def batch_calculator_runner(contestant, track):
+    for i in track:
+        i["id"] = 0
+        i["deviceId"] = ""
+        i["attributes"] = {}
+        i["device_time"] = dateutil.parser.parse(i["time"])
+    BatchContestantProcessor(contestant).run(track)
+
+
 def load_track_points(filename):
     with open(filename, "r") as i:
         gpx = gpxpy.parse(i)
@@ -131,6 +142,26 @@ class TestFullTrack(TransactionTestCase):
         contestant_track = ContestantTrack.objects.get(contestant=self.contestant)
         self.assertEqual(222, contestant_track.score)  # 150.0,
 
+    def test_batch_scoring_correct_track_precision(self, *args):
+        positions = load_track_points("display/calculators/tests/test_contestant_correct_track.gpx")
+        batch_calculator_runner(self.contestant, positions)
+        contestant_track = ContestantTrack.objects.get(contestant=self.contestant)
+        self.assertEqual(222, contestant_track.score)
+        self.assertTrue(contestant_track.calculator_finished)
+        self.assertLess(0, self.contestant.get_compressed_track().number_of_positions)
+        self.assertEqual(0, self.contestant.contestantreceivedposition_set.count())
+        self.assertEqual(self.contestant.scorelogentry_set.count(), self.contestant.trackannotation_set.count())
+
+    def test_batch_scoring_failing_calculator_finishes_contestant(self, *args):
+        positions = load_track_points("display/calculators/tests/test_contestant_correct_track.gpx")
+        with patch("display.calculators.gatekeeper_route.GatekeeperRoute.calculate_score", side_effect=ValueError):
+            batch_calculator_runner(self.contestant, positions)
+        contestant_track = ContestantTrack.objects.get(contestant=self.contestant)
+        self.assertTrue(contestant_track.calculator_finished)
+        self.assertFalse(is_calculator_running(self.contestant.pk))
+        # The position that the calculator failed on is kept
+        self.assertEqual(1, self.contestant.get_compressed_track().number_of_positions)
+
     def test_secret_score_no_override(self, *args):
         expected_time = datetime.datetime(2017, 1, 1, tzinfo=datetime.timezone.utc)
         actual_time = datetime.datetime(2017, 1, 1, 0, 1, tzinfo=datetime.timezone.utc)
@@ -0,0 +1,40 @@
+import time
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from display.calculators.received_position_writer import ReceivedPositionWriter
+
+
+@patch("display.calculators.received_position_writer.ContestantReceivedPosition.objects.bulk_create")
+class TestReceivedPositionWriter(SimpleTestCase):
+    def test_flush_by_size(self, bulk_create):
+        writer = ReceivedPositionWriter(flush_size=3, flush_interval=60)
+        writer.add([1, 2, 3, 4])
+        time.sleep(0.2)
+        bulk_create.assert_called_once_with([1, 2, 3])
+        writer.close()
+        self.assertListEqual([4], bulk_create.call_args_list[-1].args[0])
+
+    def test_flush_by_time(self, bulk_create):
+        writer = ReceivedPositionWriter(flush_size=50, flush_interval=0.1)
+        writer.add([1, 2])
+        time.sleep(0.3)
+        bulk_create.assert_called_once_with([1, 2])
+        writer.close()
+        bulk_create.assert_called_once()
+
+    def test_close_flushes_everything(self, bulk_create):
+        writer = ReceivedPositionWriter(flush_size=50, flush_interval=60)
+        writer.add([1, 2, 3])
+        writer.close()
+        bulk_create.assert_called_once_with([1, 2, 3])
+        with self.assertRaises(RuntimeError):
+            writer.add([4])
+
+    def test_failed_write_does_not_stop_writer(self, bulk_create):
+        bulk_create.side_effect = [Exception("Database error"), None]
+        writer = ReceivedPositionWriter(flush_size=1, flush_interval=60)
+        writer.add([1, 2])
+        writer.close()
+        self.assertEqual(2, bulk_create.call_count)
@@ -0,0 +1,64 @@
+import datetime
+from unittest import TestCase
+
+from display.calculators.track_buffer import TrackBuffer, TrackPosition
+from display.utilities.coordinate_utilities import Projector
+
+START = datetime.datetime(2023, 5, 1, 12, tzinfo=datetime.timezone.utc)
+
+
+def position(seconds: float, latitude: float = 60, longitude: float = 11) -> TrackPosition:
+    return TrackPosition(None, START + datetime.timedelta(seconds=seconds), latitude, longitude, 300, 80, 90, 0, 0)
+
+
+class TestTrackBuffer(TestCase):
+    def setUp(self):
+        self.track = TrackBuffer(Projector(60, 11), capacity=2)
+        for second in range(10):
+            self.track.append(position(second, longitude=11 + second * 0.001))
+
+    def test_grows_beyond_capacity(self):
+        self.assertEqual(10, len(self.track))
+        self.assertListEqual(list(range(10)), [item.index for item in self.track])
+
+    def test_indexing(self):
+        self.assertEqual(START + datetime.timedelta(seconds=9), self.track[-1].time)
+        self.assertEqual(START, self.track[0].time)
+        self.assertEqual(11.002, self.track[2].longitude)
+        self.assertEqual(80, self.track[-3].speed)
+        self.assertListEqual([7, 8, 9], [item.index for item in self.track[-3:]])
+        with self.assertRaises(IndexError):
+            self.track[10]
+
+    def test_last_position_is_reused_until_append(self):
+        last = self.track[-1]
+        self.assertIs(last, self.track[9])
+        self.track.append(position(10))
+        self.assertIsNot(last, self.track[-1])
+
+    def test_times_are_exact(self):
+        track = TrackBuffer()
+        time = START + datetime.timedelta(microseconds=123457)
+        track.append(TrackPosition(None, time, 60, 11, 0, 0, 0, 0, 0))
+        self.assertEqual(time, track[0].time)
+        self.assertEqual(datetime.timezone.utc, track[0].time.tzinfo)
+
+    def test_naive_times(self):
+        track = TrackBuffer()
+        time = datetime.datetime(2023, 5, 1, 12, 0, 1)
+        track.append(TrackPosition(None, time, 60, 11, 0, 0, 0, 0, 0))
+        self.assertEqual(time, track[-1].time)
+
+    def test_local_coordinates(self):
+        self.assertAlmostEqual(0, self.track[0].x, 3)
+        self.assertAlmostEqual(9 * 55.8, self.track[-1].x, 0)
+        self.assertEqual(10, len(self.track.column("y")))
+        self.assertAlmostEqual(0.03, self.track.column("y")[-1], 2)
+
+    def test_last_index_older_than(self):
+        self.assertEqual(5, self.track.last_index_older_than(datetime.timedelta(seconds=3)))
+        self.assertEqual(0, self.track.last_index_older_than(datetime.timedelta(seconds=8.5)))
+        self.assertEqual(-1, self.track.last_index_older_than(datetime.timedelta(seconds=9)))
+        track = TrackBuffer()
+        track.append(position(0))
+        self.assertEqual(-1, track.last_index_older_than(datetime.timedelta(seconds=3)))
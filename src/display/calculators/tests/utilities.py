@@ -1,7 +1,7 @@
 import datetime
 from typing import List, Tuple
 
-import dateutil
+import dateutil.parser
 
 
 def load_traccar_track(track_file) -> List[Tuple[datetime.datetime, float, float]]:
@@ -0,0 +1,167 @@
+"""
+Array backed storage of the track that the gatekeeper and calculators score.
+
+The track is stored as a struct of numpy arrays, one column per field, instead of a list of ContestantReceivedPosition
+model instances. The columns grow by doubling their capacity, so appending is amortised O(1), and the filled part of
+every column can be used directly for vectorised calculations over a time window. The local x and y of every position
+are calculated once when it is appended, and are used for the gate intersections. Indexing the buffer returns
+lightweight TrackPosition records with the same attributes that the calculators use from the model, so the buffer can
+be used wherever the calculators expect a list of positions.
+"""
+import datetime
+from typing import Iterator, List, Optional, Union
+
+import numpy as np
+
+from display.utilities.coordinate_utilities import Projector
+
+INITIAL_CAPACITY = 1024
+UTC_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+NAIVE_EPOCH = datetime.datetime(1970, 1, 1)
+ONE_MICROSECOND = datetime.timedelta(microseconds=1)
+
+# Name and type of each column. Times are stored as integer microseconds since the epoch so that they are exact.
+TRACK_BUFFER_COLUMNS = (
+    ("time", np.int64),
+    ("latitude", np.float64),
+    ("longitude", np.float64),
+    ("altitude", np.float64),
+    ("speed", np.float64),
+    ("course", np.float64),
+    ("x", np.float64),
+    ("y", np.float64),
+)
+
+
+def to_microseconds(time: datetime.datetime) -> int:
+    """
+    Microseconds since the epoch, naive times are treated as UTC
+    """
+    return (time - (NAIVE_EPOCH if time.tzinfo is None else UTC_EPOCH)) // ONE_MICROSECOND
+
+
+class TrackPosition:
+    """
+    A single position of the track buffer
+    """
+
+    __slots__ = ("index", "time", "latitude", "longitude", "altitude", "speed", "course", "x", "y")
+
+    def __init__(self, index, time, latitude, longitude, altitude, speed, course, x, y):
+        self.index = index
+        self.time = time
+        self.latitude = latitude
+        self.longitude = longitude
+        self.altitude = altitude
+        self.speed = speed
+        self.course = course
+        self.x = x
+        self.y = y
+
+    def __repr__(self):
+        return f"TrackPosition({self.index}, {self.time}, {self.latitude}, {self.longitude})"
+
+
+class TrackBuffer:
+    def __init__(self, projector: Optional[Projector] = None, capacity: int = INITIAL_CAPACITY):
+        """
+        :param projector: Projection used to precompute the local x and y (metres) of every position. If None, x and y
+        are not calculated.
+        """
+        self.projector = projector
+        self._size = 0
+        self._columns = {
+            name: np.zeros(max(capacity, 1), dtype=column_type) for name, column_type in TRACK_BUFFER_COLUMNS
+        }
+        self._tzinfo = None
+        self._last_position = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def __iter__(self) -> Iterator[TrackPosition]:
+        for index in range(self._size):
+            yield self._position(index)
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[TrackPosition, List[TrackPosition]]:
+        if isinstance(item, slice):
+            return [self._position(index) for index in range(*item.indices(self._size))]
+        index = item + self._size if item < 0 else item
+        if not 0 <= index < self._size:
+            raise IndexError("track buffer index out of range")
+        if index == self._size - 1:
+            # The calculators mostly look at the last position, so it is only created once
+            if self._last_position is None:
+                self._last_position = self._position(index)
+            return self._last_position
+        return self._position(index)
+
+    def _to_datetime(self, microseconds: int) -> datetime.datetime:
+        if self._tzinfo is None:
+            return NAIVE_EPOCH + datetime.timedelta(microseconds=microseconds)
+        return (UTC_EPOCH + datetime.timedelta(microseconds=microseconds)).astimezone(self._tzinfo)
+
+    def _position(self, index: int) -> TrackPosition:
+        columns = self._columns
+        return TrackPosition(
+            index,
+            self._to_datetime(int(columns["time"][index])),
+            float(columns["latitude"][index]),
+            float(columns["longitude"][index]),
+            float(columns["altitude"][index]),
+            float(columns["speed"][index]),
+            float(columns["course"][index]),
+            float(columns["x"][index]),
+            float(columns["y"][index]),
+        )
+
+    def _grow(self):
+        for name, column in self._columns.items():
+            grown = np.zeros(2 * len(column), dtype=column.dtype)
+            grown[: self._size] = column[: self._size]
+            self._columns[name] = grown
+
+    def append(self, position):
+        """
+        Append a position, which can be anything with the attributes time, latitude, longitude, altitude, speed and
+        course (typically ContestantReceivedPosition). Positions must be appended in chronological order.
+        """
+        if self._size == len(self._columns["time"]):
+            self._grow()
+        index = self._size
+        columns = self._columns
+        if index == 0:
+            # Times are returned in the time zone of the first position
+            self._tzinfo = position.time.tzinfo
+        columns["time"][index] = to_microseconds(position.time)
+        columns["latitude"][index] = position.latitude
+        columns["longitude"][index] = position.longitude
+        columns["altitude"][index] = position.altitude
+        columns["speed"][index] = position.speed
+        columns["course"][index] = position.course
+        if self.projector is not None:
+            columns["x"][index], columns["y"][index] = self.projector.to_projection.transform(
+                position.longitude, position.latitude
+            )
+        self._size += 1
+        self._last_position = None
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        View of the filled part of the column
+        """
+        return self._columns[name][: self._size]
+
+    def last_index_older_than(self, duration: datetime.timedelta) -> int:
+        """
+        Index of the last position that is more than duration older than the last position of the track, or -1 if there
+        is none
+        """
+        if self._size < 2:
+            return -1
+        times = self._columns["time"]
+        oldest_time = times[self._size - 1] - duration // ONE_MICROSECOND
+        return int(np.searchsorted(times[: self._size - 1], oldest_time, side="left")) - 1
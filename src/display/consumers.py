@@ -1,10 +1,13 @@
+import asyncio
 import datetime
 import json
 import logging
 import threading
+import time
+from typing import List
 
-from asgiref.sync import async_to_sync
-from channels.generic.websocket import WebsocketConsumer
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.generic.websocket import WebsocketConsumer, AsyncWebsocketConsumer
 from django.core.exceptions import ObjectDoesNotExist
 from redis import StrictRedis
 
@@ -12,13 +15,15 @@ from display.utilities.coordinate_utilities import (
     calculate_bounding_box,
     equirectangular_distance,
 )
-from display.models import NavigationTask, Contest
+from display.models import NavigationTask, Contest, Contestant
+from display.utilities.global_map_cells import GLOBAL_TRAFFIC_GROUP, cell_groups_for_bounding_box
 from live_tracking_map.settings import (
     REDIS_HOST,
     REDIS_PORT,
     REDIS_PASSWORD,
 )
-from websocket_channels import WebsocketFacade
+from global_position_store import GlobalPositionStore, ALL_TRAFFIC_SUBSCRIPTION_TTL
+from websocket_channels import WebsocketFacade, SCORE_DELTA, SCORE_SEQUENCE
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +42,12 @@ class DateTimeEncoder(json.JSONEncoder):
 
 
 class TrackingConsumer(WebsocketConsumer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The sequence number of the last score delta forwarded to the client for each contestant
+        self.score_sequences = {}
+        self.websocket_facade = WebsocketFacade()
+
     def connect(self):
         self.navigation_task_pk = self.scope["url_route"]["kwargs"]["navigation_task"]
         self.navigation_task_group_name = "tracking_{}".format(self.navigation_task_pk)
@@ -47,20 +58,98 @@ class TrackingConsumer(WebsocketConsumer):
             self.navigation_task = NavigationTask.objects.get(pk=self.navigation_task_pk)
         except ObjectDoesNotExist:
             return
+        # The client loads the complete score state over REST when it connects, so only deltas after the current
+        # sequence numbers are needed. Without this every client would resynchronise every contestant on the first
+        # score sequence message.
+        contestants = list(Contestant.objects.filter(navigation_task_id=self.navigation_task_pk).only("pk"))
+        self.score_sequences = dict(
+            zip(
+                (contestant.pk for contestant in contestants),
+                self.websocket_facade.current_score_sequences(contestants),
+            )
+        )
         self.accept()
 
     def receive(self, text_data, **kwargs):
-        pass
-        # message = json.loads(text_data)
+        try:
+            message = json.loads(text_data)
+        except ValueError:
+            return
+        if (
+            isinstance(message, dict)
+            and message.get("type") == "resync"
+            and isinstance(message.get("contestant_id"), int)
+        ):
+            self.resync_scores(message["contestant_id"])
+
+    def resync_scores(self, contestant_id: int):
+        """
+        Send the complete score state (annotations, score log and gate scores) of the contestant to the client
+        """
+        try:
+            contestant = Contestant.objects.get(pk=contestant_id, navigation_task_id=self.navigation_task_pk)
+        except ObjectDoesNotExist:
+            return
+        sequence, messages = self.websocket_facade.score_state_messages(contestant)
+        logger.debug(f"Resynchronising scores for contestant {contestant_id} at sequence {sequence}")
+        self.score_sequences[contestant_id] = max(sequence, self.score_sequences.get(contestant_id, 0))
+        for message in messages:
+            self.send(text_data=message["text"])
+
+    def should_forward_score_message(self, event: dict) -> bool:
+        """
+        Check the sequence number of a score delta or score sequence message against the last delta forwarded for the
+        contestant. Deltas that are already included in a resynchronisation are dropped, and if any deltas are
+        missing the complete score state is sent instead of the delta.
+        """
+        contestant_id = event["contestant_id"]
+        sequence = event["sequence"]
+        last_sequence = self.score_sequences.get(contestant_id)
+        if event["message_type"] == SCORE_SEQUENCE:
+            # Sequence messages are only used for gap detection. If the contestant did not exist when the client
+            # connected we do not know what the client has, so it is resynchronised once.
+            if last_sequence is None or sequence > last_sequence:
+                self.resync_scores(contestant_id)
+            return False
+        if last_sequence is not None:
+            if sequence <= last_sequence:
+                return False
+            if sequence > last_sequence + 1:
+                self.resync_scores(contestant_id)
+                return False
+        self.score_sequences[contestant_id] = sequence
+        return True
 
     def tracking_data(self, event):
-        self.send(text_data=json.dumps(event["data"], cls=DateTimeEncoder))
+        """
+        The text of the message is encoded by the WebsocketFacade and is forwarded without being decoded
+        """
+        if event["message_type"] in (SCORE_DELTA, SCORE_SEQUENCE) and not self.should_forward_score_message(event):
+            return
+        self.send(text_data=event["text"])
 
 
 GLOBAL_TRAFFIC_MAXIMUM_AGE = datetime.timedelta(seconds=20)
+# Global traffic is sent to the client in frames (JSON lists of positions) at this interval
+GLOBAL_FRAME_INTERVAL = 1
+# Minimum number of seconds between two updates of the same aircraft for clients displaying a map with a range (metres)
+# up to the given value. The more of the world the client displays, the less detail it needs.
+GLOBAL_UPDATE_INTERVALS = ((50000, 1), (200000, 3), (1000000, 10))
+# Minimum number of seconds between updates of the same aircraft for larger maps or clients without a location
+GLOBAL_DEFAULT_UPDATE_INTERVAL = 20
+# Aircraft that have not been updated for this many seconds are removed from the last sent table
+GLOBAL_LAST_SENT_MAXIMUM_AGE = 600
+global_position_store = GlobalPositionStore()
+
 
+class GlobalConsumer(AsyncWebsocketConsumer):
+    """
+    Sends global traffic close to the location of the client. The client is subscribed to the groups of the global map
+    cells covered by its map (see update_subscriptions), and the positions are throttled per aircraft depending on the
+    range of the map (see update_interval). Only the latest position of each aircraft is kept until it is due, and all
+    due positions are sent together as one frame every GLOBAL_FRAME_INTERVAL.
+    """
 
-class GlobalConsumer(WebsocketConsumer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.location = None
@@ -71,11 +160,19 @@ class GlobalConsumer(WebsocketConsumer):
         #     self.redis = StrictRedis(unix_socket_path="/tmp/docker/redis.sock")
         # else:
         # self.redis = StrictRedis(REDIS_HOST, REDIS_PORT)#, password=REDIS_PASSWORD)
-        self.groups.append("tracking_global")
+        # Receive all traffic until the location is known, see update_subscriptions
+        self.groups.append(GLOBAL_TRAFFIC_GROUP)
+        # Latest encoded position of each aircraft that has not been sent yet
+        self.pending_positions = {}
+        # Monotonic time when each aircraft was last sent to the client
+        self.last_sent = {}
+        self.frame_task = None
 
-    def connect(self):
-        self.accept()
+    async def connect(self):
+        await self.accept()
         logger.info(f"Current user {self.scope.get('user')}")
+        await sync_to_async(global_position_store.subscribe_all_traffic)(self.channel_name)
+        self.frame_task = asyncio.ensure_future(self.transmit_frames())
         # Location has not been set at this point
         # if self.location and self.range:
         #     position = (data["latitude"], data["longitude"])
@@ -83,12 +180,16 @@ class GlobalConsumer(WebsocketConsumer):
         #         continue
         # self.send(text_data=json.dumps(data, cls=DateTimeEncoder))
 
-    def disconnect(self, code):
-        super().disconnect(code)
+    async def disconnect(self, code):
+        await super().disconnect(code)
+        if GLOBAL_TRAFFIC_GROUP in self.groups:
+            await sync_to_async(global_position_store.unsubscribe_all_traffic)(self.channel_name)
+        if self.frame_task:
+            self.frame_task.cancel()
         if self.safe_sky_timer:
             self.safe_sky_timer.cancel()
 
-    def receive(self, text_data, **kwargs):
+    async def receive(self, text_data=None, bytes_data=None):
         message = json.loads(text_data)
         message_type = message.get("type")
         if message_type == "location":
@@ -104,13 +205,99 @@ class GlobalConsumer(WebsocketConsumer):
             else:
                 self.location = None
                 self.range = None
+                self.bounding_box = None
+            await self.update_subscriptions()
+            if self.location and self.range:
+                await self.add_stored_positions()
 
-    def tracking_data(self, event):
+    async def add_stored_positions(self):
+        """
+        Add the latest stored positions within range to the next frame, so that the client does not have to wait for
+        the aircraft to report their next positions
+        """
+        positions = await sync_to_async(global_position_store.positions_in_radius)(
+            self.location[0], self.location[1], self.range
+        )
+        for device_id, data in positions:
+            if device_id not in self.last_sent:
+                self.pending_positions.setdefault(device_id, data)
+
+    async def update_subscriptions(self):
+        """
+        Subscribe to the global map cells overlapping the bounding box, or to all traffic if there is no bounding box
+        or it is too large. New groups are added before the old ones are discarded so that no positions are lost.
+        Subscriptions to all traffic are also registered in the global position store, since the traffic is only
+        published to GLOBAL_TRAFFIC_GROUP while it has subscribers.
+        """
+        groups = cell_groups_for_bounding_box(self.bounding_box) if self.bounding_box is not None else None
+        if groups is None:
+            groups = {GLOBAL_TRAFFIC_GROUP}
+        current_groups = set(self.groups)
+        if GLOBAL_TRAFFIC_GROUP in groups - current_groups:
+            await sync_to_async(global_position_store.subscribe_all_traffic)(self.channel_name)
+        for group in groups - current_groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+            self.groups.append(group)
+        for group in current_groups - groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
+            self.groups.remove(group)
+        if GLOBAL_TRAFFIC_GROUP in current_groups - groups:
+            await sync_to_async(global_position_store.unsubscribe_all_traffic)(self.channel_name)
+
+    def update_interval(self) -> float:
+        """
+        The minimum number of seconds between updates of the same aircraft for the current range of the client
+        """
+        if self.location and self.range:
+            for maximum_range, interval in GLOBAL_UPDATE_INTERVALS:
+                if self.range <= maximum_range:
+                    return interval
+        return GLOBAL_DEFAULT_UPDATE_INTERVAL
+
+    def due_positions(self, now: float) -> List[str]:
+        """
+        Remove and return the pending positions of the aircraft that have not been sent for at least the update
+        interval
+        """
+        interval = self.update_interval()
+        due = [
+            device_id
+            for device_id in self.pending_positions
+            if now - self.last_sent.get(device_id, -interval) >= interval
+        ]
+        for device_id in due:
+            self.last_sent[device_id] = now
+        return [self.pending_positions.pop(device_id) for device_id in due]
+
+    def purge_last_sent(self, now: float):
+        for device_id, sent in list(self.last_sent.items()):
+            if now - sent > GLOBAL_LAST_SENT_MAXIMUM_AGE and device_id not in self.pending_positions:
+                del self.last_sent[device_id]
+
+    async def transmit_frames(self):
+        last_purge = time.monotonic()
+        last_subscription_renewal = time.monotonic()
+        while True:
+            await asyncio.sleep(GLOBAL_FRAME_INTERVAL)
+            now = time.monotonic()
+            if now - last_subscription_renewal > ALL_TRAFFIC_SUBSCRIPTION_TTL / 4:
+                if GLOBAL_TRAFFIC_GROUP in self.groups:
+                    await sync_to_async(global_position_store.subscribe_all_traffic)(self.channel_name)
+                last_subscription_renewal = now
+            positions = self.due_positions(now)
+            if len(positions) > 0:
+                # The positions are already encoded, so the frame is built without decoding them
+                await self.send(text_data="[" + ",".join(positions) + "]")
+            if now - last_purge > GLOBAL_LAST_SENT_MAXIMUM_AGE:
+                self.purge_last_sent(now)
+                last_purge = now
+
+    async def tracking_data(self, event):
         if self.location and self.range:
             position = (event["latitude"], event["longitude"])
             if equirectangular_distance(position, self.location) > self.range:
                 return
-        self.send(text_data=event["data"])
+        self.pending_positions[str(event["device_id"])] = event["data"]
 
 
 class AirsportsPositionsConsumer(WebsocketConsumer):
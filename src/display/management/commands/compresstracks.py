@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from display.models import Contestant
+
+
+class Command(BaseCommand):
+    help = "Compress the received positions of all contestants whose calculator has finished."
+
+    def handle(self, *args, **options):
+        contestants = Contestant.objects.filter(
+            contestanttrack__calculator_finished=True, contestantreceivedposition__isnull=False
+        ).distinct()
+        for contestant in contestants:
+            contestant.compress_track()
+            self.stdout.write(f"Compressed track for {contestant}")
@@ -0,0 +1,24 @@
+# Generated by Django 5.0 on 2026-10-17 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('display', '0116_flymasterdata_alter_contestant_air_speed_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompressedContestantTrack',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('track_version', models.IntegerField(default=0)),
+                ('number_of_positions', models.IntegerField(default=0)),
+                ('data', models.BinaryField()),
+                ('contestant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='display.contestant')),
+            ],
+        ),
+    ]
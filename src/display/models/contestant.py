@@ -2,7 +2,7 @@ import datetime
 import logging
 import time
 from io import BytesIO
-from typing import Optional
+from typing import Optional, Union, List, Dict
 
 import numpy as np
 import matplotlib.pyplot as plt
@@ -10,7 +10,7 @@ from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models, IntegrityError
+from django.db import models, IntegrityError, transaction
 from django.db.models import Q, QuerySet
 from django.urls import reverse
 from django.utils.safestring import mark_safe
@@ -18,7 +18,7 @@ from django.utils.safestring import mark_safe
 from display.calculators.calculator_utilities import round_time_second
 from display.fields.my_pickled_object_field import MyPickledObjectField
 from display.flymaster_position_builder import build_positions_from_flymaster
-from display.models.contestant_utility_models import ContestantReceivedPosition
+from display.models.contestant_utility_models import ContestantReceivedPosition, CompressedContestantTrack
 from display.models.flymaster_data import FlymasterData
 from display.utilities.calculate_gate_times import calculate_and_get_relative_gate_times
 from display.utilities.calculator_running_utilities import is_calculator_running
@@ -32,6 +32,8 @@ from display.utilities.navigation_task_type_definitions import (
     LANDING,
 )
 from display.utilities.traccar_factory import get_traccar_instance
+from display.utilities.track_compression import decompress_track_columns
+from display.utilities.track_decimation import project_track, simplify_track
 from display.utilities.track_merger import merge_tracks
 from display.utilities.tracking_definitions import (
     TRACKING_PILOT_AND_COPILOT,
@@ -47,6 +49,7 @@ from traccar_facade import augment_positions_from_traccar
 logger = logging.getLogger(__name__)
 
 TRACKING_DEVICE_TIMEOUT = 10
+DECIMATED_TRACK_CACHE_TIMEOUT = 7 * 24 * 3600
 
 
 def round_gate_times(times: dict) -> dict:
@@ -798,11 +801,11 @@ Flying off track by more than {"{:.0f}".format(scorecard.backtracking_bearing_di
         traccar = get_traccar_instance()
         device_ids = traccar.get_device_ids_for_contestant(self)
 
-        tracks = []
-        for device_id in device_ids:
-            track = traccar.get_positions_for_device_id(device_id, self.tracker_start_time, self.finished_by_time)
+        tracks = list(
+            traccar.get_positions_for_devices(device_ids, self.tracker_start_time, self.finished_by_time).values()
+        )
+        for track in tracks:
             augment_positions_from_traccar(track)
-            tracks.append(track)
         logger.debug(f"Returned {len(tracks)} with lengths {', '.join([str(len(item)) for item in tracks])}")
         return merge_tracks(tracks)
 
@@ -817,15 +820,85 @@ Flying off track by more than {"{:.0f}".format(scorecard.backtracking_bearing_di
             track.extend(positions)
         return track
 
-    def get_track(self) -> QuerySet[ContestantReceivedPosition]:
+    def get_track(self) -> Union[QuerySet[ContestantReceivedPosition], List[ContestantReceivedPosition]]:
         """
         Get the track for the contestant.  We only want the track that is used for the last calculation. This is always
         stored in the ContestantReceivedPosition objects, which is cleared whenever a calculation is restarted. This
         means that this function will always only return the data that is used for the latest calculation up until
-        this time.
+        this time. When the calculator has finished, the track is compressed and returned as a list of unsaved
+        ContestantReceivedPosition objects.
         """
+        if compressed_track := self.get_compressed_track():
+            return compressed_track.positions()
         return self.contestantreceivedposition_set.all()
 
+    def get_track_columns(self) -> Dict[str, np.ndarray]:
+        """
+        Get the time, latitude, longitude, altitude, speed, course and progress of the track as numpy columns. Times
+        are epoch milliseconds.
+        """
+        if compressed_track := self.get_compressed_track():
+            return decompress_track_columns(bytes(compressed_track.data))
+        fields = ("time", "latitude", "longitude", "altitude", "speed", "course", "progress")
+        rows = list(self.contestantreceivedposition_set.all().values_list(*fields))
+        columns = {
+            field: np.array([row[index] for row in rows], dtype=np.float64)
+            for index, field in enumerate(fields)
+            if field != "time"
+        }
+        columns["time"] = np.array([round(row[0].timestamp() * 1000) for row in rows], dtype=np.int64)
+        return columns
+
+    def get_decimated_track_indices(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        tolerance: Optional[float] = None,
+        max_points: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Return the indices of the track positions to keep when the track is simplified to the given tolerance in
+        metres and/or max number of points. Results for finished tracks are cached per track version.
+        """
+        finished = hasattr(self, "contestanttrack") and self.contestanttrack.calculator_finished
+        key = f"decimated_track_{self.pk}_{self.track_version}_{tolerance}_{max_points}"
+        if finished and (cached := cache.get(key)) is not None:
+            return np.frombuffer(cached, dtype=np.int32)
+        x, y = project_track(latitudes, longitudes)
+        indices = simplify_track(x, y, tolerance, max_points).astype(np.int32)
+        if finished:
+            cache.set(key, indices.tobytes(), DECIMATED_TRACK_CACHE_TIMEOUT)
+        return indices
+
+    def get_compressed_track(self) -> Optional[CompressedContestantTrack]:
+        """
+        Return the compressed track for the latest calculation if the track has been compressed
+        """
+        try:
+            compressed_track = self.compressedcontestanttrack
+        except ObjectDoesNotExist:
+            return None
+        if compressed_track.track_version != self.track_version:
+            return None
+        return compressed_track
+
+    def compress_track(self):
+        """
+        Pack the received positions into a CompressedContestantTrack and delete the individual positions. Should only
+        be called when the calculator has finished.
+        """
+        with transaction.atomic():
+            compressed_track = CompressedContestantTrack.compress(self)
+            self.contestantreceivedposition_set.all().delete()
+        logger.info(f"{self}: Compressed track with {compressed_track.number_of_positions} positions")
+
+    def delete_track(self):
+        """
+        Delete all received positions for the contestant, whether they are compressed or not
+        """
+        self.contestantreceivedposition_set.all().delete()
+        CompressedContestantTrack.objects.filter(contestant=self).delete()
+
     def get_latest_position(self) -> Optional[ContestantReceivedPosition]:
         try:
             return self.get_track()[-1]
@@ -843,7 +916,7 @@ Flying off track by more than {"{:.0f}".format(scorecard.backtracking_bearing_di
         except IntegrityError:
             logger.exception(f"Contestant has already passed gate {gate_name}")
 
-    def record_score_by_gate(self, gate_name: str, score: float):
+    def record_score_by_gate(self, gate_name: str, score: float) -> "GateCumulativeScore":
         """
         Recall the cumulative score at a gate
         """
@@ -852,6 +925,7 @@ Flying off track by more than {"{:.0f}".format(scorecard.backtracking_bearing_di
         gate_score, _ = GateCumulativeScore.objects.get_or_create(gate=gate_name, contestant=self)
         gate_score.points += score
         gate_score.save()
+        return gate_score
 
     def reset_track_and_score(self):
         """
@@ -871,9 +945,7 @@ Flying off track by more than {"{:.0f}".format(scorecard.backtracking_bearing_di
         Generate a matplotlib chart showing the processing statistics for the contestants. Returns the binary (png)
         image.
         """
-        from display.models import ContestantReceivedPosition
-
-        stored_positions = ContestantReceivedPosition.objects.filter(contestant=self)
+        stored_positions = self.get_track()
         total_delay = []
         transmission_delay = []
         processor_queueing_delay = []
@@ -19,6 +19,8 @@ class ContestantTrack(models.Model):
     passed_finish_gate = models.BooleanField(default=False)
     calculator_finished = models.BooleanField(default=False)
     calculator_started = models.BooleanField(default=False)
+    # Names of the fields with unsaved changes while changes are deferred, see defer_changes
+    _deferred_fields = None
 
     def reset(self):
         self.score = self.contestant.navigation_task.scorecard.initial_score
@@ -46,6 +48,8 @@ class ContestantTrack(models.Model):
             return None
 
     def update_last_gate(self, gate_name, time_difference):
+        if self.__defer(last_gate=gate_name, last_gate_time_offset=time_difference):
+            return
         self.refresh_from_db()
         self.last_gate = gate_name
         self.last_gate_time_offset = time_difference
@@ -85,6 +89,8 @@ class ContestantTrack(models.Model):
             self.__push_change()
 
     def updates_current_state(self, state: str):
+        if self.__defer(current_state=state):
+            return
         self.refresh_from_db()
         if self.current_state != state:
             self.current_state = state
@@ -92,6 +98,8 @@ class ContestantTrack(models.Model):
             self.__push_change()
 
     def update_current_leg(self, current_leg: str):
+        if self.__defer(current_leg=current_leg):
+            return
         self.refresh_from_db()
         if self.current_leg != current_leg:
             self.current_leg = current_leg
@@ -110,17 +118,50 @@ class ContestantTrack(models.Model):
         self.__push_change()
 
     def set_passed_starting_gate(self):
+        if self.__defer(passed_starting_gate=True):
+            return
         self.refresh_from_db()
         self.passed_starting_gate = True
         self.save(update_fields=["passed_starting_gate"])
         self.__push_change()
 
     def set_passed_finish_gate(self):
+        if self.__defer(passed_finish_gate=True):
+            return
         self.refresh_from_db()
         self.passed_finish_gate = True
         self.save(update_fields=["passed_finish_gate"])
         self.__push_change()
 
+    def defer_changes(self):
+        """
+        Until save_deferred_changes is called, the state updates from the calculators (current state, leg, last gate
+        and passed gates) are only applied to this instance. Used when a complete track is scored at once, where
+        nobody sees the intermediate states.
+        """
+        self._deferred_fields = set()
+
+    def save_deferred_changes(self):
+        """
+        Save and push the state updates made since defer_changes was called, and stop deferring
+        """
+        deferred_fields = self._deferred_fields
+        self._deferred_fields = None
+        if deferred_fields:
+            self.save(update_fields=sorted(deferred_fields))
+            self.__push_change()
+
+    def __defer(self, **fields) -> bool:
+        """
+        If changes are deferred, apply the fields to the instance and return True
+        """
+        if self._deferred_fields is None:
+            return False
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self._deferred_fields.update(fields)
+        return True
+
     def __push_change(self):
         from websocket_channels import WebsocketFacade
 
@@ -1,6 +1,9 @@
+from typing import List, Dict, Sequence
+
 from django.db import models
 
 from display.fields.my_pickled_object_field import MyPickledObjectField
+from display.utilities.track_compression import compress_track, decompress_track, TRACK_FIELDS
 
 
 class ContestantUploadedTrack(models.Model):
@@ -55,3 +58,49 @@ class ContestantReceivedPosition(models.Model):
             "course": self.course,
             "device_time": self.time,
         }
+
+
+class CompressedContestantTrack(models.Model):
+    """
+    The track of a contestant whose calculator has finished, packed into a compressed columnar blob (see
+    display.utilities.track_compression). When the track has been compressed, the ContestantReceivedPosition objects
+    for the contestant are deleted. The compressed track is deleted whenever a calculation is restarted.
+    """
+
+    contestant = models.OneToOneField("Contestant", on_delete=models.CASCADE)
+    track_version = models.IntegerField(default=0)
+    number_of_positions = models.IntegerField(default=0)
+    data = models.BinaryField()
+
+    @classmethod
+    def compress(cls, contestant) -> "CompressedContestantTrack":
+        return cls.store(contestant, list(contestant.contestantreceivedposition_set.all().values(*TRACK_FIELDS)))
+
+    @classmethod
+    def store(cls, contestant, positions: Sequence[Dict]) -> "CompressedContestantTrack":
+        """
+        Store the track of the contestant from position dictionaries with the keys in TRACK_FIELDS ordered by time
+        """
+        compressed_track, _ = cls.objects.update_or_create(
+            contestant=contestant,
+            defaults={
+                "track_version": contestant.track_version,
+                "number_of_positions": len(positions),
+                "data": compress_track(positions),
+            },
+        )
+        return compressed_track
+
+    def values(self, fields: Sequence[str] = TRACK_FIELDS) -> List[Dict]:
+        """
+        Return the positions as dictionaries in the same way as ContestantReceivedPosition.objects.values(*fields)
+        """
+        return decompress_track(bytes(self.data), fields)
+
+    def positions(self) -> List[ContestantReceivedPosition]:
+        """
+        Return the positions as (unsaved) ContestantReceivedPosition objects
+        """
+        return [
+            ContestantReceivedPosition(contestant_id=self.contestant_id, **item) for item in self.values(TRACK_FIELDS)
+        ]
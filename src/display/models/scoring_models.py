@@ -37,7 +37,7 @@ class ScoreLogEntry(models.Model):
         from websocket_channels import WebsocketFacade
 
         ws = WebsocketFacade()
-        ws.transmit_score_log_entry(entry.contestant)
+        ws.transmit_score_log_entry_change(entry)
         return entry
 
     @classmethod
@@ -86,7 +86,7 @@ class TrackAnnotation(models.Model):
         from websocket_channels import WebsocketFacade
 
         ws = WebsocketFacade()
-        ws.transmit_annotations(annotation.contestant)
+        ws.transmit_annotation_change(annotation)
 
     @classmethod
     def create_and_push(cls, **kwargs) -> "TrackAnnotation":
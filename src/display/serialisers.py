@@ -785,6 +785,18 @@ class ContestantTrackSerialiser(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class SnapshotContestantTrackSerialiser(ContestantTrackSerialiser):
+    """
+    Used by the navigation task snapshot. The contest summary is looked up in the "contest_summaries" dictionary
+    (contestant ID to points) in the context instead of being queried for each contestant.
+    """
+
+    contest_summary = serializers.SerializerMethodField()
+
+    def get_contest_summary(self, instance: ContestantTrack) -> Optional[float]:
+        return self.context.get("contest_summaries", {}).get(instance.contestant_id)
+
+
 class ContestantSerialiser(serializers.ModelSerializer):
     class Meta:
         model = Contestant
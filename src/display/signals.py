@@ -1,3 +1,4 @@
+import datetime
 import logging
 from functools import wraps
 from random import choice
@@ -29,8 +30,12 @@ from display.models import (
     Person,
     MyUser,
     EditableRoute,
+    Team,
+    PlayingCard,
 )
 from display.models.scorecard_and_gate_score import Scorecard
+from display.utilities.device_contestant_index import notify_contestant_device_change
+from display.utilities.snapshot_cache_utilities import invalidate_snapshots
 from display.utilities.traccar_factory import get_traccar_instance
 from display.utilities.tracking_definitions import TrackingService
 
@@ -161,6 +166,17 @@ def push_contest_summary_change(sender, instance: ContestSummary, **kwargs):
 
     ws = WebsocketFacade()
     ws.transmit_contest_results(None, instance.contest)
+    invalidate_snapshots(instance.contest_id)
+
+
+@receiver(post_save, sender=PlayingCard)
+@receiver(post_delete, sender=PlayingCard)
+def invalidate_snapshots_on_playing_card_change(sender, instance: PlayingCard, **kwargs):
+    try:
+        invalidate_snapshots(instance.contestant.navigation_task.contest_id)
+    except ObjectDoesNotExist:
+        # The contestant is being deleted
+        pass
 
 
 @receiver(post_save, sender=Task)
@@ -343,6 +359,44 @@ def create_tracker_in_traccar(sender, instance: Contestant, **kwargs):
         traccar.get_or_create_device(instance.tracker_device_id, instance.tracker_device_id)
 
 
+def _active_contestants():
+    return Contestant.objects.filter(finished_by_time__gte=datetime.datetime.now(datetime.timezone.utc))
+
+
+@receiver(post_save, sender=Contestant)
+@receiver(post_delete, sender=Contestant)
+def update_device_index_for_contestant(sender, instance: Contestant, **kwargs):
+    notify_contestant_device_change([instance.pk])
+
+
+@receiver(post_save, sender=ContestantTrack)
+def update_device_index_for_contestant_track(sender, instance: ContestantTrack, update_fields=None, **kwargs):
+    if update_fields is None or "calculator_finished" in update_fields:
+        notify_contestant_device_change([instance.contestant_id])
+
+
+@receiver(post_save, sender=Team)
+def update_device_index_for_team(sender, instance: Team, **kwargs):
+    notify_contestant_device_change(_active_contestants().filter(team=instance).values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Crew)
+def update_device_index_for_crew(sender, instance: Crew, **kwargs):
+    notify_contestant_device_change(_active_contestants().filter(team__crew=instance).values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Person)
+def update_device_index_for_person(sender, instance: Person, update_fields=None, **kwargs):
+    # The person is saved for every received position to update last_seen, so only react to tracking ID changes
+    if update_fields is not None and not {"app_tracking_id", "simulator_tracking_id"}.intersection(update_fields):
+        return
+    notify_contestant_device_change(
+        _active_contestants()
+        .filter(Q(team__crew__member1=instance) | Q(team__crew__member2=instance))
+        .values_list("pk", flat=True)
+    )
+
+
 def generate_random_string(length) -> str:
     return "".join(choice(ascii_uppercase + ascii_lowercase + digits) for i in range(length))
 
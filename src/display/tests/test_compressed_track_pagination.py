@@ -0,0 +1,46 @@
+import datetime
+
+from django.test import SimpleTestCase
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from display.viewsets import CompressedTrackPositions, MyCursorPagination
+
+START = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def positions(count: int) -> list:
+    return [{"time": START + datetime.timedelta(seconds=index), "latitude": index} for index in range(count)]
+
+
+class TestCompressedTrackPagination(SimpleTestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.page_size = MyCursorPagination.page_size
+
+    def paginate(self, cursor=None):
+        pagination = MyCursorPagination()
+        request = Request(self.factory.get("/track/", {"cursor": cursor} if cursor else {}))
+        page = pagination.paginate_queryset(CompressedTrackPositions(positions(self.page_size * 2 + 10)), request)
+        return pagination, [item["latitude"] for item in page]
+
+    def test_pages_follow_the_cursor(self):
+        pagination, page = self.paginate()
+        self.assertListEqual(list(range(self.page_size)), page)
+        self.assertIsNone(pagination.get_previous_link())
+        pagination, page = self.paginate(pagination.get_next_link())
+        self.assertListEqual(list(range(self.page_size, self.page_size * 2)), page)
+        pagination, page = self.paginate(pagination.get_next_link())
+        self.assertListEqual(list(range(self.page_size * 2, self.page_size * 2 + 10)), page)
+        self.assertIsNone(pagination.get_next_link())
+
+    def test_previous_page(self):
+        pagination, _ = self.paginate()
+        pagination, _ = self.paginate(pagination.get_next_link())
+        pagination, page = self.paginate(pagination.get_previous_link())
+        self.assertListEqual(list(range(self.page_size)), page)
+
+    def test_invalid_cursor_position(self):
+        with self.assertRaises(NotFound):
+            CompressedTrackPositions(positions(1)).filter(time__gt="not a time")
@@ -19,6 +19,7 @@ from display.models import (
     TRACKING_COPILOT,
     TRACKING_PILOT,
 )
+from display.utilities.device_contestant_index import DeviceContestantIndex
 from display.utilities.tracking_definitions import TrackingService
 from utilities.mock_utilities import TraccarMock
 
@@ -346,3 +347,82 @@ class TestGetContestantForDevice(TransactionTestCase):
         with self.assertRaises(ValidationError):
             ContestTeam.objects.create(team=self.team, tracking_device=TRACKING_COPILOT, contest=self.contest)
         ContestTeam.objects.create(team=self.double_team, tracking_device=TRACKING_COPILOT, contest=self.contest)
+
+
+class TestDeviceContestantIndex(TransactionTestCase):
+    def setUp(self, *args):
+        # Same contestants as TestGetContestantForDevice
+        TestGetContestantForDevice.setUp(self)
+        self.index = DeviceContestantIndex()
+        self.index.rebuild(datetime.datetime(2020, 1, 1, 9, tzinfo=datetime.timezone.utc))
+
+    def test_get_tracking_device(self):
+        contestant, simulator = self.index.lookup(
+            TRACKER_NAME, datetime.datetime(2020, 1, 1, 10, tzinfo=datetime.timezone.utc)
+        )
+        self.assertEqual(self.contestant_tracking_device, contestant)
+        self.assertFalse(simulator)
+
+    def test_get_tracking_pilot_simulator(self):
+        contestant, simulator = self.index.lookup(
+            self.team.crew.member1.simulator_tracking_id,
+            datetime.datetime(2020, 1, 1, 12, 3, tzinfo=datetime.timezone.utc),
+        )
+        self.assertEqual(self.contestant_pilot_device, contestant)
+        self.assertTrue(simulator)
+
+    def test_get_after_finished_by_time(self):
+        contestant, simulator = self.index.lookup(
+            self.team.crew.member1.app_tracking_id,
+            datetime.datetime(2020, 1, 1, 13, 1, tzinfo=datetime.timezone.utc),
+        )
+        self.assertEqual(None, contestant)
+
+    def test_get_late_position_after_finished_by_time(self):
+        # The calculator is still running within its delay when a buffered position from before the finished by time
+        # arrives
+        self.index.rebuild(datetime.datetime(2020, 1, 1, 13, 30, tzinfo=datetime.timezone.utc))
+        contestant, simulator = self.index.lookup(
+            self.team.crew.member1.app_tracking_id,
+            datetime.datetime(2020, 1, 1, 12, 59, tzinfo=datetime.timezone.utc),
+        )
+        self.assertEqual(self.contestant_pilot_device, contestant)
+
+    def test_lookup_crew_member(self):
+        self.assertEqual(
+            self.double_team.crew.member2,
+            self.index.lookup_crew_member(
+                self.double_team.crew.member2.app_tracking_id,
+                datetime.datetime(2020, 1, 1, 14, 30, tzinfo=datetime.timezone.utc),
+            ),
+        )
+        self.assertEqual(
+            self.team.crew.member1,
+            self.index.lookup_crew_member(
+                self.team.crew.member1.simulator_tracking_id,
+                datetime.datetime(2020, 1, 1, 12, 30, tzinfo=datetime.timezone.utc),
+            ),
+        )
+        self.assertIsNone(
+            self.index.lookup_crew_member(TRACKER_NAME, datetime.datetime(2020, 1, 1, 10, tzinfo=datetime.timezone.utc))
+        )
+
+    def test_update_contestant(self):
+        self.contestant_pilot_device.finished_by_time = datetime.datetime(
+            2020, 1, 1, 13, 30, tzinfo=datetime.timezone.utc
+        )
+        self.contestant_pilot_device.save()
+        self.index.update_contestants([self.contestant_pilot_device.pk])
+        contestant, simulator = self.index.lookup(
+            self.team.crew.member1.app_tracking_id,
+            datetime.datetime(2020, 1, 1, 13, 15, tzinfo=datetime.timezone.utc),
+        )
+        self.assertEqual(self.contestant_pilot_device, contestant)
+
+    def test_remove_finished_contestant(self):
+        self.contestant_tracking_device.contestanttrack.set_calculator_finished()
+        self.index.update_contestants([self.contestant_tracking_device.pk])
+        contestant, simulator = self.index.lookup(
+            TRACKER_NAME, datetime.datetime(2020, 1, 1, 10, tzinfo=datetime.timezone.utc)
+        )
+        self.assertEqual(None, contestant)
@@ -4,7 +4,8 @@ from parameterized import parameterized
 from display.utilities.coordinate_utilities import calculate_bearing, get_heading_difference, extend_line, \
     fraction_of_leg, Projector, get_procedure_turn_track, create_bisecting_line_between_segments, \
     create_bisecting_line_between_segments_corridor_width_lonlat, \
-    create_bisecting_line_between_segments_corridor_width_xy, equirectangular_distance, calculate_distance_lat_lon
+    create_bisecting_line_between_segments_corridor_width_xy, equirectangular_distance, calculate_distance_lat_lon, \
+    calculate_bounding_box
 
 
 class TestCoordinateUtilities(TestCase):
@@ -45,6 +46,14 @@ class TestCoordinateUtilities(TestCase):
         self.assertAlmostEqual(intersection[0], 61.0036, 3)
         self.assertAlmostEqual(intersection[1], 11)
 
+    def test_pyproj_line_intersect_projected(self):
+        projector = Projector(60, 11)
+        start = projector.to_projection.transform(11, 60)
+        finish = projector.to_projection.transform(11, 62)
+        intersection = projector.intersect_projected(start, finish, (61, 10), (61, 12))
+        self.assertEqual(projector.intersect((60, 11), (62, 11), (61, 10), (61, 12)), intersection)
+        self.assertIn((61, 12), projector.projected_points)
+
     @parameterized.expand([
         ((60, 10), (60, 12), (60, 11), 0.5, "horizontal"),
         ((60, 10), (62, 10), (61, 10), 0.5, "vertical")
@@ -108,6 +117,14 @@ class TestCoordinateUtilities(TestCase):
     def test_distance(self,b,e,expected):
         self.assertEqual(expected, calculate_distance_lat_lon(b,e))
 
+    def test_bounding_box_contains_circle(self):
+        centre = (60, 11)
+        south, west, north, east = calculate_bounding_box(centre, 100000)
+        self.assertAlmostEqual(100000, equirectangular_distance(centre, (north, 11)), delta=1)
+        self.assertAlmostEqual(100000, equirectangular_distance(centre, (south, 11)), delta=1)
+        self.assertGreater(equirectangular_distance(centre, (60, east)), 100000)
+        self.assertLess(east - west, 4.5)
+
 class TestProcedureTurnPoints(TestCase):
     def test_simple(self):
         points = get_procedure_turn_track(60, 11, 270, 30, 0.05)
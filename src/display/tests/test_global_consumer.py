@@ -0,0 +1,56 @@
+from django.test import SimpleTestCase
+
+from display.consumers import GlobalConsumer, GLOBAL_DEFAULT_UPDATE_INTERVAL
+from display.utilities.coordinate_utilities import calculate_bounding_box
+
+
+def position_event(device_id: str, latitude: float = 60, longitude: float = 11) -> dict:
+    return {
+        "type": "tracking.data",
+        "data": f'{{"deviceId": "{device_id}", "latitude": {latitude}}}',
+        "device_id": device_id,
+        "latitude": latitude,
+        "longitude": longitude,
+    }
+
+
+class TestGlobalConsumerThrottling(SimpleTestCase):
+    def setUp(self):
+        self.consumer = GlobalConsumer()
+
+    def set_location(self, range_metres: float):
+        self.consumer.location = (60, 11)
+        self.consumer.range = range_metres
+        self.consumer.bounding_box = calculate_bounding_box(self.consumer.location, range_metres)
+
+    async def test_only_latest_position_is_kept(self):
+        await self.consumer.tracking_data(position_event("a", latitude=60))
+        await self.consumer.tracking_data(position_event("a", latitude=60.01))
+        await self.consumer.tracking_data(position_event("b"))
+        positions = self.consumer.due_positions(100)
+        self.assertEqual(2, len(positions))
+        self.assertIn("60.01", positions[0])
+        self.assertListEqual([], self.consumer.due_positions(100))
+
+    async def test_positions_out_of_range_are_dropped(self):
+        self.set_location(10000)
+        await self.consumer.tracking_data(position_event("a", latitude=61))
+        self.assertListEqual([], self.consumer.due_positions(100))
+
+    async def test_updates_are_throttled_by_range(self):
+        self.set_location(100000)
+        interval = self.consumer.update_interval()
+        self.assertLess(interval, GLOBAL_DEFAULT_UPDATE_INTERVAL)
+        await self.consumer.tracking_data(position_event("a"))
+        self.assertEqual(1, len(self.consumer.due_positions(100)))
+        await self.consumer.tracking_data(position_event("a"))
+        self.assertListEqual([], self.consumer.due_positions(100 + interval / 2))
+        self.assertEqual(1, len(self.consumer.due_positions(100 + interval)))
+
+    def test_update_interval_without_location(self):
+        self.assertEqual(GLOBAL_DEFAULT_UPDATE_INTERVAL, self.consumer.update_interval())
+
+    def test_purge_last_sent(self):
+        self.consumer.last_sent = {"a": 0, "b": 1000}
+        self.consumer.purge_last_sent(1200)
+        self.assertDictEqual({"b": 1000}, self.consumer.last_sent)
@@ -0,0 +1,32 @@
+from unittest import TestCase
+
+from display.utilities.global_map_cells import (
+    cell_for_position,
+    cell_group_for_position,
+    cell_groups_for_bounding_box,
+    NUMBER_OF_ROWS,
+)
+
+
+class TestGlobalMapCells(TestCase):
+    def test_cell_for_position(self):
+        self.assertEqual((75, 95), cell_for_position(60.5, 11.2))
+        self.assertEqual((0, 0), cell_for_position(-90, -180))
+        self.assertEqual((NUMBER_OF_ROWS - 1, 0), cell_for_position(90, 180))
+
+    def test_position_is_in_overlapping_cells(self):
+        groups = cell_groups_for_bounding_box((59, 10, 62, 13))
+        self.assertIn(cell_group_for_position(60.5, 11.2), groups)
+        self.assertNotIn(cell_group_for_position(64.5, 11.2), groups)
+        self.assertEqual(3 * 2, len(groups))
+
+    def test_bounding_box_crossing_antimeridian(self):
+        groups = cell_groups_for_bounding_box((-20, 178, -18, 182))
+        self.assertIn(cell_group_for_position(-19, 179), groups)
+        self.assertIn(cell_group_for_position(-19, -179), groups)
+        self.assertEqual(2 * 3, len(groups))
+
+    def test_large_bounding_box(self):
+        self.assertIsNone(cell_groups_for_bounding_box((0, 0, 60, 60)))
+        self.assertIsNone(cell_groups_for_bounding_box((-90, -180, 90, 180)))
+
@@ -0,0 +1,53 @@
+from unittest import TestCase
+
+import numpy as np
+
+from display.utilities.track_binary_format import (
+    encode_binary_track,
+    decode_binary_track,
+    encode_varints,
+    decode_varints,
+    zigzag_encode,
+    zigzag_decode,
+)
+
+
+class TestTrackBinaryFormat(TestCase):
+    def test_varints(self):
+        values = np.array([0, 1, 127, 128, 300, 2**35, 2**64 - 1], dtype=np.uint64)
+        encoded = encode_varints(values)
+        self.assertEqual(b"\x00\x01\x7f\x80\x01\xac\x02", encoded[:7])
+        decoded, offset = decode_varints(encoded, len(values))
+        self.assertListEqual(values.tolist(), decoded.tolist())
+        self.assertEqual(len(encoded), offset)
+
+    def test_zigzag(self):
+        values = np.array([0, -1, 1, -2, 2, -(2**40)], dtype=np.int64)
+        self.assertListEqual([0, 1, 2, 3, 4], zigzag_encode(values)[:5].tolist())
+        self.assertListEqual(values.tolist(), zigzag_decode(zigzag_encode(values)).tolist())
+
+    def test_round_trip(self):
+        count = 3600
+        columns = {
+            "time": 1596261600000 + np.arange(count, dtype=np.int64) * 1000,
+            "latitude": 60 + np.cumsum(np.full(count, 0.0001)),
+            "longitude": np.linspace(179.5, 180.5, count) - 360 * (np.linspace(179.5, 180.5, count) > 180),
+            "altitude": np.full(count, 300.0),
+            "speed": np.full(count, 80.5),
+            "course": np.full(count, 359.9),
+            "progress": np.linspace(0, 100, count),
+        }
+        encoded = encode_binary_track(columns)
+        decoded = decode_binary_track(encoded)
+        np.testing.assert_allclose(columns["time"], decoded["time"])
+        np.testing.assert_allclose(columns["latitude"], decoded["latitude"], atol=1e-6)
+        np.testing.assert_allclose(columns["longitude"], decoded["longitude"], atol=1e-6)
+        np.testing.assert_allclose(columns["course"], decoded["course"], atol=0.1)
+        # About nine bytes per position compared to around 150 for the JSON representation
+        self.assertLess(len(encoded), 10 * count)
+
+    def test_empty_track(self):
+        columns = {
+            name: np.array([]) for name in ("time", "latitude", "longitude", "altitude", "speed", "course", "progress")
+        }
+        self.assertEqual(0, len(decode_binary_track(encode_binary_track(columns))["time"]))
@@ -0,0 +1,70 @@
+import datetime
+from unittest import TestCase
+
+from display.utilities.track_compression import compress_track, decompress_track, decompress_track_columns, TRACK_FIELDS
+
+
+def generate_position(index: int, longitude: float = 11.0, device_id: str = "device") -> dict:
+    time = datetime.datetime(2020, 8, 1, 6, tzinfo=datetime.timezone.utc) + datetime.timedelta(seconds=index)
+    return {
+        "time": time,
+        "latitude": 60.0 + index * 0.0001,
+        "longitude": longitude,
+        "altitude": 300.0 + index,
+        "speed": 80.5,
+        "course": 123.0,
+        "battery_level": 55.0,
+        "position_id": 1000 + index,
+        "device_id": device_id,
+        "progress": index / 10,
+        "interpolated": index % 2 == 0,
+        "processor_received_time": time + datetime.timedelta(milliseconds=500),
+        "calculator_received_time": None,
+        "websocket_transmitted_time": time + datetime.timedelta(seconds=2),
+        "server_time": time,
+    }
+
+
+class TestTrackCompression(TestCase):
+    def test_round_trip(self):
+        positions = [generate_position(index) for index in range(100)]
+        decompressed = decompress_track(compress_track(positions))
+        self.assertEqual(len(positions), len(decompressed))
+        for original, restored in zip(positions, decompressed):
+            self.assertEqual(original["time"], restored["time"])
+            self.assertAlmostEqual(original["latitude"], restored["latitude"], places=6)
+            self.assertAlmostEqual(original["longitude"], restored["longitude"], places=6)
+            self.assertAlmostEqual(original["altitude"], restored["altitude"], places=1)
+            self.assertAlmostEqual(original["speed"], restored["speed"], places=1)
+            self.assertEqual(original["position_id"], restored["position_id"])
+            self.assertEqual(original["device_id"], restored["device_id"])
+            self.assertEqual(original["interpolated"], restored["interpolated"])
+            self.assertEqual(original["processor_received_time"], restored["processor_received_time"])
+            self.assertIsNone(restored["calculator_received_time"])
+            self.assertEqual(original["websocket_transmitted_time"], restored["websocket_transmitted_time"])
+
+    def test_selected_fields(self):
+        decompressed = decompress_track(compress_track([generate_position(0)]), ("time", "latitude"))
+        self.assertListEqual(
+            [{"time": datetime.datetime(2020, 8, 1, 6, tzinfo=datetime.timezone.utc), "latitude": 60.0}],
+            decompressed,
+        )
+
+    def test_multiple_devices(self):
+        positions = [generate_position(index, device_id="first" if index < 5 else "second") for index in range(10)]
+        columns = decompress_track_columns(compress_track(positions))
+        self.assertListEqual(["first", "second"], columns["device_ids"])
+        self.assertListEqual([0] * 5 + [1] * 5, columns["device_id"].tolist())
+
+    def test_crossing_antimeridian(self):
+        positions = [generate_position(0, 179.9999999), generate_position(1, -179.9999999)]
+        decompressed = decompress_track(compress_track(positions), TRACK_FIELDS)
+        self.assertAlmostEqual(179.9999999, decompressed[0]["longitude"], places=7)
+        self.assertAlmostEqual(-179.9999999, decompressed[1]["longitude"], places=7)
+
+    def test_empty_track(self):
+        self.assertListEqual([], decompress_track(compress_track([])))
+
+    def test_compressed_size(self):
+        positions = [generate_position(index) for index in range(3600)]
+        self.assertLess(len(compress_track(positions)), 10 * len(positions))
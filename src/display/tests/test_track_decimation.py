@@ -0,0 +1,69 @@
+from unittest import TestCase
+
+import numpy as np
+
+from display.utilities.track_decimation import simplify_track, douglas_peucker_importance, project_track
+
+
+def reference_douglas_peucker(points, tolerance):
+    """
+    Straightforward recursive implementation used to verify the vectorised version
+    """
+
+    def distance(point, start, finish):
+        point, start, finish = np.array(point), np.array(start), np.array(finish)
+        segment = finish - start
+        if not segment.any():
+            return np.linalg.norm(point - start)
+        fraction = np.clip(np.dot(point - start, segment) / np.dot(segment, segment), 0, 1)
+        return np.linalg.norm(point - (start + fraction * segment))
+
+    def simplify(first, last):
+        if last - first < 2:
+            return []
+        distances = [distance(points[index], points[first], points[last]) for index in range(first + 1, last)]
+        farthest = int(np.argmax(distances))
+        if distances[farthest] <= tolerance:
+            return []
+        split = first + 1 + farthest
+        return simplify(first, split) + [split] + simplify(split, last)
+
+    return [0] + simplify(0, len(points) - 1) + [len(points) - 1]
+
+
+class TestTrackDecimation(TestCase):
+    def setUp(self):
+        generator = np.random.default_rng(42)
+        self.x = np.cumsum(generator.normal(size=300) * 10)
+        self.y = np.cumsum(generator.normal(size=300) * 10)
+
+    def test_matches_reference_implementation(self):
+        points = list(zip(self.x, self.y))
+        for tolerance in (1, 10, 50, 200):
+            self.assertListEqual(
+                reference_douglas_peucker(points, tolerance), simplify_track(self.x, self.y, tolerance).tolist()
+            )
+
+    def test_straight_line(self):
+        x = np.arange(100, dtype=float)
+        self.assertListEqual([0, 99], simplify_track(x, x * 2, tolerance=0.1).tolist())
+
+    def test_max_points(self):
+        indices = simplify_track(self.x, self.y, max_points=20)
+        self.assertEqual(20, len(indices))
+        self.assertEqual(0, indices[0])
+        self.assertEqual(299, indices[-1])
+        self.assertTrue(np.all(np.diff(indices) > 0))
+
+    def test_importance_of_endpoints(self):
+        importance = douglas_peucker_importance(self.x, self.y)
+        self.assertEqual(np.inf, importance[0])
+        self.assertEqual(np.inf, importance[-1])
+
+    def test_tolerance_in_metres(self):
+        # A track that deviates 50 metres from a straight line in the middle
+        latitudes = np.array([60.0, 60.005, 60.01])
+        longitudes = np.array([11.0, 11.0 + 50 / (111320 * np.cos(np.radians(60.005))), 11.0])
+        x, y = project_track(latitudes, longitudes)
+        self.assertListEqual([0, 1, 2], simplify_track(x, y, tolerance=45).tolist())
+        self.assertListEqual([0, 2], simplify_track(x, y, tolerance=55).tolist())
@@ -0,0 +1,83 @@
+import json
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from display.consumers import TrackingConsumer
+from websocket_channels import SCORE_DELTA, SCORE_SEQUENCE
+
+
+def score_message(message_type: str, sequence: int, contestant_id: int = 1) -> dict:
+    return {
+        "type": "tracking.data",
+        "message_type": message_type,
+        "contestant_id": contestant_id,
+        "sequence": sequence,
+        "text": json.dumps({"type": message_type, "sequence": sequence}),
+    }
+
+
+@patch.object(TrackingConsumer, "send")
+@patch.object(TrackingConsumer, "resync_scores")
+class TestTrackingConsumerScoreSequence(SimpleTestCase):
+    def setUp(self):
+        self.consumer = TrackingConsumer()
+
+    def test_consecutive_deltas_are_forwarded(self, resync_scores, send):
+        for sequence in (4, 5, 6):
+            self.consumer.tracking_data(score_message(SCORE_DELTA, sequence))
+        self.assertEqual(3, send.call_count)
+        self.assertEqual(6, json.loads(send.call_args.kwargs["text_data"])["sequence"])
+        resync_scores.assert_not_called()
+
+    def test_gap_triggers_resync(self, resync_scores, send):
+        self.consumer.tracking_data(score_message(SCORE_DELTA, 4))
+        self.consumer.tracking_data(score_message(SCORE_DELTA, 6))
+        self.assertEqual(1, send.call_count)
+        resync_scores.assert_called_once_with(1)
+
+    def test_deltas_included_in_resync_are_dropped(self, resync_scores, send):
+        self.consumer.score_sequences[1] = 10
+        self.consumer.tracking_data(score_message(SCORE_DELTA, 9))
+        self.consumer.tracking_data(score_message(SCORE_DELTA, 10))
+        send.assert_not_called()
+        resync_scores.assert_not_called()
+
+    def test_sequence_resyncs_unknown_contestant_once(self, resync_scores, send):
+        def resync(contestant_id):
+            self.consumer.score_sequences[contestant_id] = 3
+
+        resync_scores.side_effect = resync
+        self.consumer.tracking_data(score_message(SCORE_SEQUENCE, 3))
+        self.consumer.tracking_data(score_message(SCORE_SEQUENCE, 3))
+        resync_scores.assert_called_once_with(1)
+        send.assert_not_called()
+
+    def test_sequence_seeded_on_connect_does_not_resync(self, resync_scores, send):
+        self.consumer.score_sequences[1] = 5
+        self.consumer.tracking_data(score_message(SCORE_SEQUENCE, 5))
+        self.consumer.tracking_data(score_message(SCORE_DELTA, 6))
+        resync_scores.assert_not_called()
+        send.assert_called_once()
+
+    def test_sequence_ahead_of_forwarded_deltas_triggers_resync(self, resync_scores, send):
+        self.consumer.tracking_data(score_message(SCORE_DELTA, 4))
+        self.consumer.tracking_data(score_message(SCORE_SEQUENCE, 5))
+        resync_scores.assert_called_once_with(1)
+
+    def test_contestants_are_sequenced_independently(self, resync_scores, send):
+        self.consumer.tracking_data(score_message(SCORE_DELTA, 4, contestant_id=1))
+        self.consumer.tracking_data(score_message(SCORE_DELTA, 9, contestant_id=2))
+        self.consumer.tracking_data(score_message(SCORE_DELTA, 5, contestant_id=1))
+        self.assertEqual(3, send.call_count)
+        resync_scores.assert_not_called()
+
+    def test_other_messages_are_forwarded(self, resync_scores, send):
+        self.consumer.tracking_data({"type": "tracking.data", "message_type": "position_data_batch", "text": "{}"})
+        send.assert_called_once_with(text_data="{}")
+
+    def test_resync_request(self, resync_scores, send):
+        self.consumer.receive(json.dumps({"type": "resync", "contestant_id": 3}))
+        self.consumer.receive(json.dumps({"type": "resync", "contestant_id": "3"}))
+        self.consumer.receive("not json")
+        resync_scores.assert_called_once_with(3)
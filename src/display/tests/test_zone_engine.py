@@ -0,0 +1,83 @@
+from unittest import TestCase
+
+import cartopy.crs as ccrs
+import numpy as np
+
+from display.utilities.coordinate_utilities import utm_from_lat_lon
+from display.utilities.zone_engine import ZoneEngine, local_utm_transformer
+
+
+def square(latitude: float, longitude: float, size: float = 0.01) -> list:
+    return [
+        (latitude, longitude),
+        (latitude, longitude + size),
+        (latitude + size, longitude + size),
+        (latitude + size, longitude),
+    ]
+
+
+class TestZoneEngine(TestCase):
+    def setUp(self):
+        self.zones = [(index, square(60 + 0.02 * (index // 10), 11 + 0.02 * (index % 10))) for index in range(100)]
+        self.engine = ZoneEngine.from_paths(60, 11, self.zones)
+
+    def test_transformer_matches_cartopy(self):
+        x, y = local_utm_transformer(60, 11).transform(11.7, 60.9)
+        expected_x, expected_y = utm_from_lat_lon(60, 11).transform_point(11.7, 60.9, ccrs.PlateCarree())
+        self.assertAlmostEqual(expected_x, x, 3)
+        self.assertAlmostEqual(expected_y, y, 3)
+
+    def test_transformer_is_cached(self):
+        self.assertIs(local_utm_transformer(60, 11), local_utm_transformer(61, 10))
+
+    def test_zones_containing(self):
+        self.assertListEqual([23], self.engine.zones_containing(60.045, 11.065))
+        self.assertListEqual([], self.engine.zones_containing(60.055, 11.065))
+
+    def test_overlapping_zones_are_returned_in_order(self):
+        engine = ZoneEngine.from_paths(60, 11, [("b", square(60, 11, 0.02)), ("a", square(60.005, 11.005))])
+        self.assertListEqual(["b", "a"], engine.zones_containing(60.01, 11.01))
+
+    def test_boundary_distances_within_maximum(self):
+        distances = self.engine.boundary_distances(60.005, 11.005, 600)
+        self.assertSetEqual({0}, set(distances.keys()))
+        self.assertAlmostEqual(279, distances[0], delta=1)
+        self.assertEqual(100, len(self.engine.boundary_distances(60.005, 11.005)))
+
+    def test_boundary_distance_from_outside(self):
+        self.assertAlmostEqual(1114, self.engine.boundary_distance(0, 60.02, 11.005), delta=1)
+
+    def test_empty_engine(self):
+        engine = ZoneEngine.from_paths(60, 11, [])
+        self.assertListEqual([], engine.zones_containing(60, 11))
+        self.assertDictEqual({}, engine.boundary_distances(60, 11, 1000))
+        self.assertDictEqual({}, engine.time_to_intersection(60, 11, 0, 60, 0, 40))
+
+    def test_time_to_intersection(self):
+        engine = ZoneEngine.from_paths(60, 11, [("test", [(60, 11), (60, 12), (61, 12), (61, 11)])])
+        self.assertDictEqual({"test": 72}, engine.time_to_intersection(59.999, 11.5, 0, 6, 0, 600))
+
+    def test_time_to_intersection_from_inside(self):
+        engine = ZoneEngine.from_paths(60, 11, [("test", square(60, 11))])
+        self.assertDictEqual(
+            {"test": 12}, engine.time_to_intersection(60.005, 11.005, 0, 120, 0, 40, from_inside=True)
+        )
+
+    def test_time_to_intersection_skips_unreachable_zones(self):
+        self.assertDictEqual({}, self.engine.time_to_intersection(59.9, 11.005, 180, 120, 0, 40))
+
+    def test_predicted_path_straight(self):
+        x, y = self.engine.predicted_path(60, 11.3, 90, 3600, 0, 11, 2)
+        self.assertEqual(6, len(x))
+        # 1 nm per second, within the difference between the UTM scale factor and the spherical earth model
+        self.assertAlmostEqual(5 * 2 * 1852, np.hypot(x[-1] - x[0], y[-1] - y[0]), delta=20)
+
+    def test_predicted_path_full_circle(self):
+        x, y = self.engine.predicted_path(60, 11, 0, 120, 6, 61, 1)
+        self.assertAlmostEqual(x[0], x[-1], delta=1)
+        self.assertAlmostEqual(y[0], y[-1], delta=1)
+
+    def test_time_to_intersection_while_turning(self):
+        engine = ZoneEngine.from_paths(60, 11, [("test", square(60, 11.01))])
+        self.assertDictEqual({}, engine.time_to_intersection(60.005, 11, 0, 120, -3, 40))
+        self.assertDictEqual({"test": 14}, engine.time_to_intersection(60.005, 11, 0, 120, 6, 40))
@@ -1,6 +1,12 @@
+import redis_lock
 from django.core.cache import cache
+from redis.client import Redis
+
+from live_tracking_map.settings import REDIS_HOST, REDIS_PORT
 
 KEY_BASE = "CALCULATOR_RUNNING"
+# Shared by all the start locks of the process, the client only connects when it is used
+lock_connection = Redis(REDIS_HOST, REDIS_PORT, 2)  # , REDIS_PASSWORD)
 
 
 def calculator_is_alive(contestant_pk: int, timeout: float):
@@ -13,3 +19,11 @@ def calculator_is_terminated(contestant_pk: int):
 
 def is_calculator_running(contestant_pk: int) -> bool:
     return cache.get(f"{KEY_BASE}_{contestant_pk}") is True
+
+
+def calculator_start_lock(contestant_pk: int) -> redis_lock.Lock:
+    """
+    Lock that must be held while checking whether a calculator is running and starting it. This is shared between all
+    the processes that can start calculators, so that two of them never start the same calculator.
+    """
+    return redis_lock.Lock(lock_connection, f"{KEY_BASE}_{contestant_pk}_lock", expire=60, auto_renewal=True)
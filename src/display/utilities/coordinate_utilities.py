@@ -274,6 +274,17 @@ class Projector:
         AEQD = CRS.from_proj4(proj4str)
         self.to_projection = Transformer.from_crs(WGS84, AEQD, always_xy=True)
         self.from_projection = Transformer.from_crs(AEQD, WGS84, always_xy=True)
+        self.projected_points = {}
+
+    def project_cached(self, point) -> Tuple[float, float]:
+        """
+        Projected x and y of the (latitude, longitude) point. The result is cached, so this should only be used for
+        points that are projected repeatedly, such as gate lines.
+        """
+        key = tuple(point)
+        if key not in self.projected_points:
+            self.projected_points[key] = self.to_projection.transform(key[1], key[0])
+        return self.projected_points[key]
 
     def intersect(self, start1, stop1, start2, stop2):
         start1 = self.to_projection.transform(*reversed(start1))
@@ -287,6 +298,17 @@ class Projector:
         converted = self.from_projection.transform(*intersection)
         return converted[1], converted[0]
 
+    def intersect_projected(self, start1, stop1, start2, stop2):
+        """
+        Same as intersect, but start1 and stop1 are already projected (x, y). start2 and stop2 are (latitude,
+        longitude) and are projected with project_cached.
+        """
+        intersection = line_intersect(*start1, *stop1, *self.project_cached(start2), *self.project_cached(stop2))
+        if intersection is None:
+            return None
+        converted = self.from_projection.transform(*intersection)
+        return converted[1], converted[0]
+
 
 def nv_intersect(start1, stop1, start2, stop2, on_segments: bool = False):
     pointA1 = nv.GeoPoint(start1[0], start1[1], degrees=True)
@@ -721,6 +743,8 @@ def calculate_bounding_box(centre: Tuple[float, float], radius: float) -> Tuple[
     :param radius: metres
     :return: most_south, most_west, most_north, most_east
     """
-    dy = 360 * radius / R
-    dx = dy * np.cos(to_rad(centre[0]))
+    dy = math.degrees(radius / R)
+    # The longitude span is widest at the edge of the box that is farthest from the equator
+    widest_latitude = min(abs(centre[0]) + dy, 89.9)
+    dx = min(dy / math.cos(to_rad(widest_latitude)), 180)
     return centre[0] - dy, centre[1] - dx, centre[0] + dy, centre[1] + dx
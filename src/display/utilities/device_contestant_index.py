@@ -0,0 +1,254 @@
+import bisect
+import datetime
+import logging
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple, Iterable
+
+from django.db import transaction
+from redis import StrictRedis
+
+from display.models import Contestant, Person
+from display.utilities.tracking_definitions import (
+    TRACKING_DEVICE,
+    TRACKING_PILOT,
+    TRACKING_COPILOT,
+    TRACKING_PILOT_AND_COPILOT,
+    TrackingService,
+)
+from live_tracking_map.settings import REDIS_HOST, REDIS_PORT
+
+logger = logging.getLogger(__name__)
+
+DEVICE_INDEX_CHANGES_KEY = "device_contestant_index_changes"
+DEVICE_INDEX_SEQUENCE_KEY = "device_contestant_index_sequence"
+# Number of change records kept in redis. Readers that fall further behind than this perform a full rebuild.
+MAXIMUM_CHANGE_RECORDS = 10000
+# How far into the future contestants are loaded into the index
+INDEX_LOOKAHEAD = datetime.timedelta(hours=6)
+# Contestants whose calculators have not finished are kept this long after their finished by time, so that late and
+# buffered positions from within the calculation delay are still routed to them
+LATE_POSITION_WINDOW = datetime.timedelta(hours=24)
+# The look-ahead window is moved forward by rebuilding the entire index at this interval
+INDEX_REBUILD_INTERVAL = datetime.timedelta(hours=1)
+# Minimum number of seconds between each time the change records are read
+CHANGE_POLL_INTERVAL = 1
+
+
+class DeviceInterval(NamedTuple):
+    start: datetime.datetime
+    finish: datetime.datetime
+    contestant_pk: int
+    is_simulator: bool
+    # The crew member ("member1" or "member2") whose tracking app is the device, None for tracking devices
+    crew_member: Optional[str]
+
+
+def notify_contestant_device_change(contestant_pks: Iterable[int]):
+    """
+    Notify all device contestant indices that the tracking configuration for the contestants may have changed. The
+    notification is sent when the current transaction is committed so that the readers see the updated contestants.
+    """
+    contestant_pks = list(contestant_pks)
+    if len(contestant_pks) == 0:
+        return
+
+    def notify():
+        redis = StrictRedis(REDIS_HOST, REDIS_PORT)  # , password=REDIS_PASSWORD)
+        sequence = 0
+        for pk in contestant_pks:
+            sequence = redis.incr(DEVICE_INDEX_SEQUENCE_KEY)
+            # Only the latest change for each contestant is kept
+            redis.zadd(DEVICE_INDEX_CHANGES_KEY, {str(pk): sequence})
+        redis.zremrangebyscore(DEVICE_INDEX_CHANGES_KEY, "-inf", sequence - MAXIMUM_CHANGE_RECORDS)
+
+    transaction.on_commit(notify)
+
+
+def device_intervals_for_contestant(contestant: Contestant) -> List[Tuple[str, DeviceInterval]]:
+    """
+    Return the (device, interval) pairs that route positions to the contestant. This mirrors the queries in
+    Contestant.get_contestant_for_device_at_time.
+    """
+    intervals = []
+
+    def add(device: Optional[str], is_simulator: bool, crew_member: Optional[str] = None):
+        if device:
+            intervals.append(
+                (
+                    device,
+                    DeviceInterval(
+                        contestant.tracker_start_time,
+                        contestant.finished_by_time,
+                        contestant.pk,
+                        is_simulator,
+                        crew_member,
+                    ),
+                )
+            )
+
+    if contestant.tracking_device == TRACKING_DEVICE:
+        if contestant.tracking_service == TrackingService.TRACCAR:
+            add(contestant.tracker_device_id, False)
+        return intervals
+    crew = contestant.team.crew
+    if contestant.tracking_device in (TRACKING_PILOT, TRACKING_PILOT_AND_COPILOT) and crew.member1 is not None:
+        add(crew.member1.app_tracking_id, False, "member1")
+        add(crew.member1.simulator_tracking_id, True, "member1")
+    if contestant.tracking_device in (TRACKING_COPILOT, TRACKING_PILOT_AND_COPILOT) and crew.member2 is not None:
+        add(crew.member2.app_tracking_id, False, "member2")
+        add(crew.member2.simulator_tracking_id, True, "member2")
+    return intervals
+
+
+class DeviceContestantIndex:
+    """
+    In-process index from traccar device (unique ID) to the contestants that are tracked by the device. For each
+    device the index keeps a list of tracking intervals sorted by tracker start time, so that the contestant for a
+    device at a given time is found with a binary search without touching the database.
+
+    The index is built in bulk for all contestants that are active within INDEX_LOOKAHEAD, and is kept up to date
+    by reading the change records written by notify_contestant_device_change() from the model signals.
+    """
+
+    def __init__(self):
+        self.redis = StrictRedis(REDIS_HOST, REDIS_PORT)  # , password=REDIS_PASSWORD)
+        self.device_starts: Dict[str, List[datetime.datetime]] = {}
+        self.device_intervals: Dict[str, List[DeviceInterval]] = {}
+        self.contestants: Dict[int, Contestant] = {}
+        self.contestant_devices: Dict[int, List[str]] = {}
+        self.last_sequence = 0
+        self.last_change_poll = 0
+        self.last_rebuild = None
+        self.window_start = None
+        self.window_end = None
+
+    @staticmethod
+    def _active_contestants(window_start: datetime.datetime, window_end: datetime.datetime):
+        """
+        The contestants whose tracking intervals overlap the window and whose calculators have not finished. Positions
+        are matched against the tracking intervals by their own time stamps in lookup().
+        """
+        return Contestant.objects.filter(
+            tracker_start_time__lte=window_end,
+            finished_by_time__gte=window_start,
+            contestanttrack__calculator_finished=False,
+        ).select_related(
+            "navigation_task",
+            "team",
+            "team__crew",
+            "team__crew__member1",
+            "team__crew__member2",
+        )
+
+    def rebuild(self, now: Optional[datetime.datetime] = None):
+        """
+        Load all contestants that are active from LATE_POSITION_WINDOW before now until INDEX_LOOKAHEAD after now
+        into the index.
+        """
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        # Read the sequence before loading so that changes that happen while loading are picked up afterwards
+        self.last_sequence = int(self.redis.get(DEVICE_INDEX_SEQUENCE_KEY) or 0)
+        self.device_starts = {}
+        self.device_intervals = {}
+        self.contestants = {}
+        self.contestant_devices = {}
+        self.window_start = now - LATE_POSITION_WINDOW
+        self.window_end = now + INDEX_LOOKAHEAD
+        for contestant in self._active_contestants(self.window_start, self.window_end):
+            self._add_contestant(contestant)
+        self.last_rebuild = now
+        logger.info(
+            f"Built device contestant index with {len(self.contestants)} contestants and {len(self.device_intervals)} devices"
+        )
+
+    def _add_contestant(self, contestant: Contestant):
+        self.contestants[contestant.pk] = contestant
+        devices = []
+        for device, interval in device_intervals_for_contestant(contestant):
+            starts = self.device_starts.setdefault(device, [])
+            index = bisect.bisect_right(starts, interval.start)
+            starts.insert(index, interval.start)
+            self.device_intervals.setdefault(device, []).insert(index, interval)
+            devices.append(device)
+        self.contestant_devices[contestant.pk] = devices
+
+    def _remove_contestant(self, contestant_pk: int):
+        self.contestants.pop(contestant_pk, None)
+        for device in self.contestant_devices.pop(contestant_pk, []):
+            intervals = self.device_intervals.get(device, [])
+            remaining = [interval for interval in intervals if interval.contestant_pk != contestant_pk]
+            if len(remaining) > 0:
+                self.device_intervals[device] = remaining
+                self.device_starts[device] = [interval.start for interval in remaining]
+            else:
+                self.device_intervals.pop(device, None)
+                self.device_starts.pop(device, None)
+
+    def update_contestants(self, contestant_pks: Iterable[int]):
+        """
+        Reload the contestants from the database, removing them from the index if they are no longer active.
+        """
+        if self.window_end is None:
+            return
+        contestant_pks = set(contestant_pks)
+        for pk in contestant_pks:
+            self._remove_contestant(pk)
+        for contestant in self._active_contestants(self.window_start, self.window_end).filter(pk__in=contestant_pks):
+            self._add_contestant(contestant)
+
+    def refresh_if_necessary(self):
+        """
+        Apply any outstanding changes and rebuild the index if the look-ahead window must be moved. Change records
+        are read at most once every CHANGE_POLL_INTERVAL seconds.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if self.last_rebuild is None or now - self.last_rebuild > INDEX_REBUILD_INTERVAL:
+            self.rebuild()
+            return
+        if time.time() - self.last_change_poll < CHANGE_POLL_INTERVAL:
+            return
+        self.last_change_poll = time.time()
+        current_sequence = int(self.redis.get(DEVICE_INDEX_SEQUENCE_KEY) or 0)
+        if current_sequence == self.last_sequence:
+            return
+        if current_sequence - self.last_sequence > MAXIMUM_CHANGE_RECORDS or current_sequence < self.last_sequence:
+            # We have lost track of the changes (or redis has been flushed)
+            self.rebuild()
+            return
+        changes = self.redis.zrangebyscore(
+            DEVICE_INDEX_CHANGES_KEY, f"({self.last_sequence}", current_sequence, withscores=True
+        )
+        self.update_contestants(int(pk) for pk, _ in changes)
+        self.last_sequence = current_sequence
+
+    def _find_interval(self, device: str, stamp: datetime.datetime) -> Optional[DeviceInterval]:
+        starts = self.device_starts.get(device)
+        if starts is None:
+            return None
+        intervals = self.device_intervals[device]
+        # Search backwards from the last interval that started at or before the time stamp
+        for index in range(bisect.bisect_right(starts, stamp) - 1, -1, -1):
+            interval = intervals[index]
+            if interval.finish >= stamp:
+                return interval
+        return None
+
+    def lookup(self, device: str, stamp: datetime.datetime) -> Tuple[Optional[Contestant], bool]:
+        """
+        Return the contestant tracked by the device at the time stamp together with a flag that is true if the device
+        is a simulator tracking ID.
+        """
+        interval = self._find_interval(device, stamp)
+        if interval is None:
+            return None, False
+        return self.contestants[interval.contestant_pk], interval.is_simulator
+
+    def lookup_crew_member(self, device: str, stamp: datetime.datetime) -> Optional[Person]:
+        """
+        Return the crew member whose tracking app (or simulator) is the device at the time stamp, or None if the device
+        is not a tracking app.
+        """
+        interval = self._find_interval(device, stamp)
+        if interval is None or interval.crew_member is None:
+            return None
+        return getattr(self.contestants[interval.contestant_pk].team.crew, interval.crew_member)
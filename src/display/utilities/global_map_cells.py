@@ -0,0 +1,54 @@
+"""
+Global map traffic is published to a channel group for each cell of a fixed latitude/longitude grid, and to the group
+holding all the traffic while that group has subscribers (see GlobalPositionStore.has_all_traffic_subscribers). A
+global map consumer subscribes to the cells that overlap the bounding box of the map it displays, so it only receives
+traffic that is close to it instead of every position in the world. Consumers that display a larger area than
+MAXIMUM_SUBSCRIBED_CELLS cells subscribe to the group with all the traffic instead.
+"""
+import math
+from typing import Optional, Set, Tuple
+
+GLOBAL_TRAFFIC_GROUP = "tracking_global"
+CELL_SIZE = 2  # degrees
+MAXIMUM_SUBSCRIBED_CELLS = 150
+NUMBER_OF_ROWS = 180 // CELL_SIZE
+NUMBER_OF_COLUMNS = 360 // CELL_SIZE
+
+
+def _row(latitude: float) -> int:
+    return min(max(int(math.floor((latitude + 90) / CELL_SIZE)), 0), NUMBER_OF_ROWS - 1)
+
+
+def _unwrapped_column(longitude: float) -> int:
+    return int(math.floor((longitude + 180) / CELL_SIZE))
+
+
+def cell_for_position(latitude: float, longitude: float) -> Tuple[int, int]:
+    """
+    The row and column of the grid cell that contains the position
+    """
+    return _row(latitude), _unwrapped_column(longitude) % NUMBER_OF_COLUMNS
+
+
+def cell_group_name(row: int, column: int) -> str:
+    return f"{GLOBAL_TRAFFIC_GROUP}_{row}_{column}"
+
+
+def cell_group_for_position(latitude: float, longitude: float) -> str:
+    return cell_group_name(*cell_for_position(latitude, longitude))
+
+
+def cell_groups_for_bounding_box(bounding_box: Tuple[float, float, float, float]) -> Optional[Set[str]]:
+    """
+    The groups of all the cells that overlap the bounding box (most_south, most_west, most_north, most_east), which may
+    cross the antimeridian. Returns None if the bounding box overlaps more than MAXIMUM_SUBSCRIBED_CELLS cells.
+    """
+    south, west, north, east = bounding_box
+    rows = range(_row(south), _row(north) + 1)
+    if east - west >= 360:
+        columns = range(NUMBER_OF_COLUMNS)
+    else:
+        columns = {column % NUMBER_OF_COLUMNS for column in range(_unwrapped_column(west), _unwrapped_column(east) + 1)}
+    if len(rows) * len(columns) > MAXIMUM_SUBSCRIBED_CELLS:
+        return None
+    return {cell_group_name(row, column) for row in rows for column in columns}
@@ -0,0 +1,24 @@
+from django.core.cache import cache
+
+SNAPSHOT_VERSION_KEY = "navigation_task_snapshot_version_{}"
+
+
+def snapshot_version(contest_pk: int) -> int:
+    """
+    Version of the data in the navigation task snapshots of the contest that is not covered by the score sequence of
+    the contestants, i.e. playing cards and contest summaries
+    """
+    return cache.get(SNAPSHOT_VERSION_KEY.format(contest_pk), 0)
+
+
+def invalidate_snapshots(contest_pk: int):
+    """
+    Make sure that no cached navigation task snapshot for the contest is served after playing cards or contest
+    summaries have changed
+    """
+    key = SNAPSHOT_VERSION_KEY.format(contest_pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The key is never expired, if it was reset an old snapshot with the same version could be served
+        cache.set(key, 1, timeout=None)
@@ -0,0 +1,117 @@
+"""
+Compact binary representation of a contestant track used by the track.bin endpoint.
+
+The track is encoded column by column. Every column is a sequence of integers, which are delta encoded (each value is
+the difference to the previous value in the same column, the first value is the difference to zero), zigzag encoded
+so that small negative numbers become small positive numbers, and finally written as LEB128 variable length integers
+(seven bits per byte, least significant group first, the high bit set on all bytes except the last).
+
+The layout is:
+
+    magic "ATRK", version (1 byte), number of positions (varint), followed by the columns in the order of
+    BINARY_TRACK_COLUMNS
+
+Each column is stored as integers with the given scale, so the value is recovered by dividing by the scale:
+
+    time       epoch milliseconds / 1000 (seconds)
+    latitude   degrees * 1e6
+    longitude  degrees * 1e6
+    altitude   metres * 1 (rounded to whole metres)
+    speed      knots * 10
+    course     degrees * 10
+    progress   percent * 10
+"""
+from typing import Dict
+
+import numpy as np
+
+BINARY_TRACK_MAGIC = b"ATRK"
+BINARY_TRACK_VERSION = 1
+BINARY_TRACK_CONTENT_TYPE = "application/vnd.airsports.track"
+
+# Column name and the factor that the value is multiplied with before it is rounded to an integer. Times are given
+# in epoch milliseconds, so the time column ends up as whole seconds.
+BINARY_TRACK_COLUMNS = (
+    ("time", 1 / 1000),
+    ("latitude", 1e6),
+    ("longitude", 1e6),
+    ("altitude", 1),
+    ("speed", 10),
+    ("course", 10),
+    ("progress", 10),
+)
+_MAXIMUM_VARINT_LENGTH = 10
+
+
+def encode_varints(values: np.ndarray) -> bytes:
+    """
+    Encode an array of unsigned integers as LEB128 variable length integers
+    """
+    remaining = values.astype(np.uint64)
+    groups = np.empty((len(remaining), _MAXIMUM_VARINT_LENGTH), dtype=np.uint8)
+    lengths = np.ones(len(remaining), dtype=np.int64)
+    for index in range(_MAXIMUM_VARINT_LENGTH):
+        groups[:, index] = remaining & np.uint64(0x7F)
+        remaining = remaining >> np.uint64(7)
+        more = remaining > 0
+        groups[more, index] |= 0x80
+        lengths += more
+    # Rows are flattened in order, so this keeps the groups of each value together
+    return groups[np.arange(_MAXIMUM_VARINT_LENGTH) < lengths[:, None]].tobytes()
+
+
+def decode_varints(data: bytes, count: int, offset: int = 0) -> (np.ndarray, int):
+    """
+    Decode count LEB128 variable length integers starting at offset. Returns the values and the offset after the last
+    value.
+    """
+    values = np.empty(count, dtype=np.uint64)
+    position = offset
+    for index in range(count):
+        value = 0
+        shift = 0
+        while True:
+            byte = data[position]
+            position += 1
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if byte < 0x80:
+                break
+        values[index] = value
+    return values, position
+
+
+def zigzag_encode(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def zigzag_decode(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.uint64)
+    return ((values >> np.uint64(1)).astype(np.int64)) ^ -((values & np.uint64(1)).astype(np.int64))
+
+
+def encode_binary_track(columns: Dict[str, np.ndarray]) -> bytes:
+    """
+    Encode a track given as numpy columns with the names in BINARY_TRACK_COLUMNS. time is in epoch milliseconds.
+    """
+    count = len(columns["time"])
+    parts = [BINARY_TRACK_MAGIC, bytes([BINARY_TRACK_VERSION]), encode_varints(np.array([count]))]
+    for name, scale in BINARY_TRACK_COLUMNS:
+        scaled = np.round(np.asarray(columns[name], dtype=np.float64) * scale).astype(np.int64)
+        parts.append(encode_varints(zigzag_encode(np.diff(scaled, prepend=0))))
+    return b"".join(parts)
+
+
+def decode_binary_track(data: bytes) -> Dict[str, np.ndarray]:
+    """
+    Decode a track encoded with encode_binary_track. Intended for testing, the front end has its own decoder.
+    """
+    if data[:4] != BINARY_TRACK_MAGIC or data[4] != BINARY_TRACK_VERSION:
+        raise ValueError("Unknown binary track format")
+    (count,), offset = decode_varints(data, 1, 5)
+    columns = {}
+    for name, scale in BINARY_TRACK_COLUMNS:
+        values, offset = decode_varints(data, int(count), offset)
+        columns[name] = np.cumsum(zigzag_decode(values)) / scale
+    return columns
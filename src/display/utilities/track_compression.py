@@ -0,0 +1,210 @@
+"""
+Compressed columnar storage of a contestant track.
+
+A finished track is stored as one blob instead of one ContestantReceivedPosition row per position. Every field is
+stored as a separate column so that similar values are next to each other, and the columns are delta encoded where
+consecutive values are close, which makes the zlib compressed result a small fraction of the size of the rows:
+
+* time is stored as the first time stamp in the header followed by int32 millisecond deltas
+* latitude and longitude are stored as int32 deltas of the coordinate scaled by 1e7 (about 1 cm resolution)
+* altitude is stored as int32 deltas of decimetres
+* speed, course, progress and battery level are stored as float16
+* the position ID is stored as int64 deltas
+* the device ID is stored as an index into a table of the distinct device IDs
+* the processing time stamps are stored as int32 millisecond offsets from the position time
+"""
+import datetime
+import struct
+import zlib
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+TRACK_FORMAT_VERSION = 1
+TRACK_FIELDS = (
+    "time",
+    "latitude",
+    "longitude",
+    "altitude",
+    "speed",
+    "course",
+    "battery_level",
+    "position_id",
+    "device_id",
+    "progress",
+    "interpolated",
+    "processor_received_time",
+    "calculator_received_time",
+    "websocket_transmitted_time",
+    "server_time",
+)
+TIMING_FIELDS = (
+    "processor_received_time",
+    "calculator_received_time",
+    "websocket_transmitted_time",
+    "server_time",
+)
+COORDINATE_SCALE = 1e7
+ALTITUDE_SCALE = 10
+
+# magic, version, number of positions, first time stamp (epoch milliseconds), number of device IDs
+_HEADER = struct.Struct("<3sBIqH")
+_MAGIC = b"TRK"
+_NO_TIME = np.iinfo(np.int32).min
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MILLISECOND = datetime.timedelta(milliseconds=1)
+
+# Column name and storage type in the order they appear in the blob
+_COLUMNS = (
+    ("time", np.int32),
+    ("latitude", np.int32),
+    ("longitude", np.int32),
+    ("altitude", np.int32),
+    ("speed", np.float16),
+    ("course", np.float16),
+    ("battery_level", np.float16),
+    ("position_id", np.int64),
+    ("device_id", np.uint16),
+    ("progress", np.float16),
+    ("interpolated", np.uint8),
+) + tuple((field, np.int32) for field in TIMING_FIELDS)
+
+
+class InvalidTrackFormat(Exception):
+    pass
+
+
+def _to_milliseconds(stamp: datetime.datetime) -> int:
+    return (stamp - _EPOCH) // _MILLISECOND
+
+
+def _delta_encode(values: np.ndarray) -> np.ndarray:
+    # The arithmetic wraps around on overflow (e.g. when crossing the antimeridian), which is reversed exactly by the
+    # equally wrapping cumulative sum when decoding.
+    return np.diff(values, prepend=values.dtype.type(0))
+
+
+def _delta_decode(values: np.ndarray) -> np.ndarray:
+    return np.cumsum(values, dtype=values.dtype)
+
+
+def compress_track(positions: Sequence[Dict]) -> bytes:
+    """
+    Compress a list of position dictionaries with the keys in TRACK_FIELDS (e.g. from
+    ContestantReceivedPosition.objects.values(*TRACK_FIELDS)) ordered by time.
+    """
+    count = len(positions)
+    times = np.fromiter((_to_milliseconds(item["time"]) for item in positions), dtype=np.int64, count=count)
+    first_time = int(times[0]) if count else 0
+    time_deltas = np.diff(times, prepend=first_time)
+    if count and np.abs(time_deltas).max() > np.iinfo(np.int32).max:
+        raise ValueError("The time between two consecutive positions is too large to be compressed")
+    device_ids = list(dict.fromkeys(str(item["device_id"]) for item in positions))
+    device_index = {device_id: index for index, device_id in enumerate(device_ids)}
+
+    def column(field: str, dtype=np.float64) -> np.ndarray:
+        return np.fromiter((item[field] or 0 for item in positions), dtype=dtype, count=count)
+
+    def timing_column(field: str) -> np.ndarray:
+        return np.fromiter(
+            (
+                _to_milliseconds(item[field]) - time if item[field] is not None else _NO_TIME
+                for item, time in zip(positions, times.tolist())
+            ),
+            dtype=np.int64,
+            count=count,
+        ).clip(_NO_TIME, np.iinfo(np.int32).max)
+
+    columns = {
+        "time": time_deltas,
+        "latitude": _delta_encode(np.round(column("latitude") * COORDINATE_SCALE).astype(np.int32)),
+        "longitude": _delta_encode(np.round(column("longitude") * COORDINATE_SCALE).astype(np.int32)),
+        "altitude": _delta_encode(np.round(column("altitude") * ALTITUDE_SCALE).astype(np.int32)),
+        "speed": column("speed"),
+        "course": column("course"),
+        "battery_level": column("battery_level"),
+        "position_id": _delta_encode(column("position_id", np.int64)),
+        "device_id": np.fromiter((device_index[str(item["device_id"])] for item in positions), np.uint16, count),
+        "progress": column("progress"),
+        "interpolated": column("interpolated", np.uint8),
+    }
+    for field in TIMING_FIELDS:
+        columns[field] = timing_column(field)
+    encoded_device_ids = b"".join(
+        struct.pack("<H", len(encoded)) + encoded for encoded in (device_id.encode("utf-8") for device_id in device_ids)
+    )
+    body = b"".join(columns[name].astype(dtype).tobytes() for name, dtype in _COLUMNS)
+    return (
+        _HEADER.pack(_MAGIC, TRACK_FORMAT_VERSION, count, first_time, len(device_ids))
+        + encoded_device_ids
+        + zlib.compress(body)
+    )
+
+
+def decompress_track_columns(data: bytes) -> Dict[str, np.ndarray]:
+    """
+    Decompress a track compressed with compress_track into numpy columns. Times are epoch milliseconds (int64),
+    coordinates and altitude are float64, and timing fields are epoch milliseconds or -1 if missing. The device_id
+    column holds indexes into the list in the "device_ids" key.
+    """
+    magic, version, count, first_time, number_of_device_ids = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise InvalidTrackFormat("Not a compressed track")
+    if version != TRACK_FORMAT_VERSION:
+        raise InvalidTrackFormat(f"Unknown track format version {version}")
+    offset = _HEADER.size
+    device_ids = []
+    for _ in range(number_of_device_ids):
+        (length,) = struct.unpack_from("<H", data, offset)
+        offset += 2
+        device_ids.append(data[offset : offset + length].decode("utf-8"))
+        offset += length
+    body = zlib.decompress(data[offset:])
+    raw = {}
+    position = 0
+    for name, dtype in _COLUMNS:
+        size = np.dtype(dtype).itemsize * count
+        raw[name] = np.frombuffer(body, dtype=dtype, count=count, offset=position)
+        position += size
+    times = first_time + np.cumsum(raw["time"], dtype=np.int64)
+    columns = {
+        "time": times,
+        "latitude": _delta_decode(raw["latitude"]) / COORDINATE_SCALE,
+        "longitude": _delta_decode(raw["longitude"]) / COORDINATE_SCALE,
+        "altitude": _delta_decode(raw["altitude"]) / ALTITUDE_SCALE,
+        "speed": raw["speed"].astype(np.float64),
+        "course": raw["course"].astype(np.float64),
+        "battery_level": raw["battery_level"].astype(np.float64),
+        "position_id": _delta_decode(raw["position_id"]),
+        "device_id": raw["device_id"],
+        "progress": raw["progress"].astype(np.float64),
+        "interpolated": raw["interpolated"].astype(bool),
+        "device_ids": device_ids,
+    }
+    for field in TIMING_FIELDS:
+        offsets = raw[field].astype(np.int64)
+        columns[field] = np.where(offsets == _NO_TIME, -1, times + offsets)
+    return columns
+
+
+def _to_datetime(milliseconds: int) -> Optional[datetime.datetime]:
+    if milliseconds < 0:
+        return None
+    return _EPOCH + datetime.timedelta(milliseconds=milliseconds)
+
+
+def decompress_track(data: bytes, fields: Sequence[str] = TRACK_FIELDS) -> List[Dict]:
+    """
+    Decompress a track compressed with compress_track into a list of position dictionaries with the given fields,
+    matching what ContestantReceivedPosition.objects.values(*fields) would return.
+    """
+    columns = decompress_track_columns(data)
+    values = {}
+    for field in fields:
+        if field == "time" or field in TIMING_FIELDS:
+            values[field] = [_to_datetime(item) for item in columns[field].tolist()]
+        elif field == "device_id":
+            values[field] = [columns["device_ids"][item] for item in columns[field].tolist()]
+        else:
+            values[field] = columns[field].tolist()
+    return [dict(zip(fields, row)) for row in zip(*(values[field] for field in fields))]
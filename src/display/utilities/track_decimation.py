@@ -0,0 +1,100 @@
+"""
+Douglas-Peucker simplification of tracks for drawing tracks at small scales.
+
+Instead of running the recursive algorithm for a single tolerance, the importance of every point is calculated once:
+the importance of a point is the distance that made the algorithm keep it, capped by the importance of the point that
+split the segment it belongs to. A point is kept by the Douglas-Peucker algorithm with tolerance t exactly when its
+importance is greater than t, so the same importance array gives the simplification for any tolerance, and the max
+points simplification is simply the most important points. The segments of each level of the recursion are processed
+together with numpy, so the number of python iterations is the depth of the recursion and not the number of points.
+"""
+from typing import Optional
+
+import numpy as np
+
+from display.utilities.coordinate_utilities import Projector
+
+
+def project_track(latitudes: np.ndarray, longitudes: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Project the track to metres in an azimuthal equidistant projection centred on the middle of the track
+    """
+    if len(latitudes) == 0:
+        return np.array([]), np.array([])
+    projector = Projector(float(np.median(latitudes)), float(np.median(longitudes)))
+    x, y = projector.to_projection.transform(np.asarray(longitudes), np.asarray(latitudes))
+    return np.asarray(x), np.asarray(y)
+
+
+def _distance_to_segments(x, y, start_x, start_y, finish_x, finish_y) -> np.ndarray:
+    """
+    Distance from each point to the corresponding segment (not the infinite line, since tracks often loop back)
+    """
+    dx = finish_x - start_x
+    dy = finish_y - start_y
+    length_squared = dx * dx + dy * dy
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fraction = np.where(length_squared > 0, ((x - start_x) * dx + (y - start_y) * dy) / length_squared, 0)
+    fraction = np.clip(fraction, 0, 1)
+    return np.hypot(x - (start_x + fraction * dx), y - (start_y + fraction * dy))
+
+
+def douglas_peucker_importance(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Calculate the Douglas-Peucker importance of each point. The first and last points have infinite importance.
+    """
+    count = len(x)
+    importance = np.zeros(count)
+    if count == 0:
+        return importance
+    importance[0] = importance[-1] = np.inf
+    starts = np.array([0])
+    finishes = np.array([count - 1])
+    parent_importance = np.array([np.inf])
+    while True:
+        interior_counts = finishes - starts - 1
+        has_interior = interior_counts > 0
+        starts, finishes = starts[has_interior], finishes[has_interior]
+        parent_importance, interior_counts = parent_importance[has_interior], interior_counts[has_interior]
+        if len(starts) == 0:
+            return importance
+        # Indices of all the interior points of all segments, and the segment that each belongs to
+        segment_offsets = np.concatenate(([0], np.cumsum(interior_counts)[:-1]))
+        segment = np.repeat(np.arange(len(starts)), interior_counts)
+        indices = np.arange(interior_counts.sum()) - segment_offsets[segment] + starts[segment] + 1
+        distances = _distance_to_segments(
+            x[indices],
+            y[indices],
+            x[starts[segment]],
+            y[starts[segment]],
+            x[finishes[segment]],
+            y[finishes[segment]],
+        )
+        # Sort by segment and then by decreasing distance, the first point of each segment is the farthest one
+        order = np.lexsort((-distances, segment))
+        farthest = order[segment_offsets]
+        split_indices = indices[farthest]
+        split_importance = np.minimum(distances[farthest], parent_importance)
+        importance[split_indices] = split_importance
+        starts, finishes = np.concatenate((starts, split_indices)), np.concatenate((split_indices, finishes))
+        parent_importance = np.concatenate((split_importance, split_importance))
+
+
+def simplify_track(
+    x: np.ndarray, y: np.ndarray, tolerance: Optional[float] = None, max_points: Optional[int] = None
+) -> np.ndarray:
+    """
+    Return the sorted indices of the points to keep so that no removed point is farther than tolerance (in the unit
+    of x and y) from the simplified track, and so that at most max_points points are kept. The first and last points
+    are always kept.
+    """
+    importance = douglas_peucker_importance(x, y)
+    keep = np.ones(len(x), dtype=bool)
+    if tolerance is not None:
+        keep &= importance > tolerance
+    if max_points is not None and keep.sum() > max_points:
+        candidates = np.flatnonzero(keep)
+        most_important = np.argsort(-importance[candidates], kind="stable")[: max(max_points, 2)]
+        keep[:] = False
+        keep[candidates[most_important]] = True
+    return np.flatnonzero(keep)
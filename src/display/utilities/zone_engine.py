@@ -0,0 +1,214 @@
+"""
+Point in zone and distance to zone queries for the calculators.
+
+The zones are projected once into the UTM zone of the route, where distances are in metres, and the zone geometries
+are prepared and indexed with an STRtree. Every position is projected with a cached pyproj Transformer, the tree
+selects the zones whose bounding boxes are close to the position, and only those are tested with the prepared
+geometries. This keeps the cost of a position roughly independent of the number of zones in the navigation task.
+"""
+from functools import lru_cache
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+import utm
+from pyproj import CRS, Transformer
+from shapely.geometry import LineString, Point, Polygon, box
+from shapely.strtree import STRtree
+
+from display.utilities.coordinate_utilities import project_position_lat_lon
+
+
+@lru_cache(maxsize=None)
+def utm_transformer(zone: int, southern_hemisphere: bool) -> Transformer:
+    """
+    Transformer from WGS84 longitude and latitude (in that order) to the UTM zone
+    """
+    return Transformer.from_crs(
+        CRS.from_epsg(4326),
+        CRS.from_dict({"proj": "utm", "zone": zone, "south": southern_hemisphere, "ellps": "WGS84"}),
+        always_xy=True,
+    )
+
+
+def local_utm_transformer(latitude: float, longitude: float) -> Transformer:
+    """
+    Transformer to the UTM zone of the position, the same frame as utm_from_lat_lon
+    """
+    _, _, zone, _ = utm.from_latlon(latitude, longitude)
+    return utm_transformer(int(zone), latitude < 0)
+
+
+def project_polygon(transformer: Transformer, path: Sequence[Tuple[float, float]]) -> Polygon:
+    """
+    :param path: List of (latitude, longitude)
+    """
+    points = np.array(path, dtype=float)
+    x, y = transformer.transform(points[:, 1], points[:, 0])
+    return Polygon(np.column_stack((x, y)))
+
+
+class ZoneEngine:
+    def __init__(self, transformer: Transformer, zones: Sequence[Tuple[Hashable, Polygon]]):
+        """
+        :param transformer: Transformer from longitude and latitude to the frame of the zone polygons
+        :param zones: List of (key, polygon) where the polygons are already projected
+        """
+        self.transformer = transformer
+        self.keys = [key for key, _ in zones]
+        self.polygons = [polygon for _, polygon in zones]
+        # Prepared in place, which speeds up both the scalar and the vectorised predicates
+        shapely.prepare(self.polygons)
+        self.boundaries = [polygon.exterior for polygon in self.polygons]
+        self.tree = STRtree(self.polygons)
+
+    @classmethod
+    def from_paths(
+        cls, latitude: float, longitude: float, zones: Iterable[Tuple[Hashable, Sequence[Tuple[float, float]]]]
+    ) -> "ZoneEngine":
+        """
+        Project the zones into the UTM zone of the reference position
+
+        :param zones: List of (key, path) where path is a list of (latitude, longitude)
+        """
+        transformer = local_utm_transformer(latitude, longitude)
+        return cls(transformer, [(key, project_polygon(transformer, path)) for key, path in zones])
+
+    def __len__(self):
+        return len(self.keys)
+
+    def project(self, latitude: float, longitude: float) -> Point:
+        return Point(self.transformer.transform(longitude, latitude))
+
+    def _candidates(self, geometry) -> List[int]:
+        """
+        Indices of the zones whose bounding box intersects the bounding box of the geometry, in the order the zones
+        were given
+        """
+        return sorted(self.tree.query(geometry).tolist())
+
+    def zones_containing(self, latitude: float, longitude: float) -> List[Hashable]:
+        """
+        Keys of the zones that contain the position
+        """
+        point = self.project(latitude, longitude)
+        return [self.keys[index] for index in self._candidates(point) if self.polygons[index].contains(point)]
+
+    def contains(self, key: Hashable, latitude: float, longitude: float) -> bool:
+        return key in self.zones_containing(latitude, longitude)
+
+    def boundary_distances(
+        self, latitude: float, longitude: float, maximum_distance: Optional[float] = None
+    ) -> Dict[Hashable, float]:
+        """
+        Distance in metres from the position to the boundary of each zone, both from the inside and the outside. If
+        maximum_distance is given, only the zones with a boundary within maximum_distance are included.
+        """
+        return {
+            self.keys[index]: distance
+            for index, distance in self._boundary_distances(latitude, longitude, maximum_distance).items()
+        }
+
+    def _boundary_distances(
+        self, latitude: float, longitude: float, maximum_distance: Optional[float] = None
+    ) -> Dict[int, float]:
+        point = self.project(latitude, longitude)
+        if maximum_distance is None:
+            candidates = range(len(self.keys))
+        else:
+            candidates = self._candidates(
+                box(
+                    point.x - maximum_distance,
+                    point.y - maximum_distance,
+                    point.x + maximum_distance,
+                    point.y + maximum_distance,
+                )
+            )
+        distances = {}
+        for index in candidates:
+            distance = self.boundaries[index].distance(point)
+            if maximum_distance is None or distance <= maximum_distance:
+                distances[index] = distance
+        return distances
+
+    def boundary_distance(self, key: Hashable, latitude: float, longitude: float) -> float:
+        index = self.keys.index(key)
+        return self.boundaries[index].distance(self.project(latitude, longitude))
+
+    def predicted_path(
+        self,
+        latitude: float,
+        longitude: float,
+        bearing: float,
+        speed: float,
+        turning_rate: float,
+        lookahead_seconds: int,
+        lookahead_step: int = 2,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Extrapolate the position with constant speed and turning rate, one point every lookahead_step seconds. The
+        arc is built directly in the projected frame, rotated by the grid convergence at the position and scaled by
+        the local scale factor, so only the starting position and a reference point are transformed.
+
+        :return: The projected x and y of the starting position and each extrapolated point
+        """
+        REFERENCE_DISTANCE = 100  # m
+        seconds = np.arange(lookahead_step, lookahead_seconds, lookahead_step)
+        north_latitude, north_longitude = project_position_lat_lon((latitude, longitude), 0, REFERENCE_DISTANCE)
+        (x, north_x), (y, north_y) = self.transformer.transform(
+            [longitude, north_longitude], [latitude, north_latitude]
+        )
+        # Direction of true north in the projected frame, and metres in the projected frame per metre on the ground
+        north_direction = np.arctan2(north_x - x, north_y - y)
+        scale = np.hypot(north_x - x, north_y - y) / REFERENCE_DISTANCE
+        step_length = scale * 1852 * speed / 3600 * lookahead_step  # projected metres
+        headings = np.deg2rad(bearing + seconds * turning_rate) + north_direction
+        path_x = np.concatenate(([x], x + np.cumsum(step_length * np.sin(headings))))
+        path_y = np.concatenate(([y], y + np.cumsum(step_length * np.cos(headings))))
+        return path_x, path_y
+
+    def time_to_intersection(
+        self,
+        latitude: float,
+        longitude: float,
+        bearing: float,
+        speed: float,
+        turning_rate: float,
+        lookahead_seconds: int,
+        lookahead_step: int = 2,
+        from_inside: bool = False,
+    ) -> Dict[Hashable, float]:
+        """
+        Returns the number of seconds until a possible intersect of any zone from the current position with projected
+        speed and turning rate, rounded up to lookahead_step. Zones whose boundary is too far away to be reached within
+        lookahead_seconds are not tested.
+
+        The predicted path is built once as a single line, which discards the zones it does not touch, and each
+        remaining zone is tested against all the steps of the path in one vectorised call.
+
+        :param bearing: degrees
+        :param speed: knots
+        :param turning_rate: degrees per second
+        :param lookahead_seconds: How far ahead to extrapolate the trajectory
+        :param from_inside: If true, find the time when the trajectory is no longer inside the zone
+        """
+        reachable = self._boundary_distances(latitude, longitude, 1852 * speed / 3600 * lookahead_seconds)
+        if len(reachable) == 0:
+            return {}
+        path_x, path_y = self.predicted_path(
+            latitude, longitude, bearing, speed, turning_rate, lookahead_seconds, lookahead_step
+        )
+        if len(path_x) < 2:
+            return {}
+        path = LineString(np.column_stack((path_x, path_y)))
+        steps = shapely.linestrings(
+            np.stack((np.column_stack((path_x[:-1], path_y[:-1])), np.column_stack((path_x[1:], path_y[1:]))), axis=1)
+        )
+        intersection_times = {}
+        for index in sorted(reachable):
+            if not from_inside and not self.polygons[index].intersects(path):
+                continue
+            hits = shapely.intersects(self.polygons[index], steps) != from_inside
+            if hits.any():
+                intersection_times[self.keys[index]] = int(lookahead_step * (np.argmax(hits) + 1))
+        return intersection_times
@@ -1406,11 +1406,12 @@ def delete_score_item(request, pk):
     entry = get_object_or_404(ScoreLogEntry, pk=pk)
     contestant = entry.contestant
     contestant.contestanttrack.update_score(contestant.contestanttrack.score - entry.points)
+    entry_pk = entry.pk
+    annotation_ids = list(entry.trackannotation_set.values_list("pk", flat=True))
     entry.delete()
     # Push the updated data so that it is reflected on the contest track
     wf = WebsocketFacade()
-    wf.transmit_score_log_entry(contestant)
-    wf.transmit_annotations(contestant)
+    wf.transmit_deleted_score_log_entry(contestant, entry_pk, annotation_ids)
     wf.transmit_basic_information(contestant)
     return HttpResponseRedirect(reverse("contestant_gate_times", kwargs={"pk": contestant.pk}))
 
@@ -1,13 +1,18 @@
 import base64
 from collections import OrderedDict
 import datetime
+import hashlib
 import logging
+from typing import Optional, Tuple, Dict, List
 
+import numpy as np
+
+from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django.core.paginator import InvalidPage
 from django.db import transaction
-from django.db.models import Q, Count
-from django.http import Http404
+from django.db.models import Q, Count, Prefetch
+from django.http import Http404, HttpResponse, HttpResponseNotModified
 from django.utils.cache import add_never_cache_headers, patch_response_headers
 from guardian.shortcuts import get_objects_for_user
 from rest_framework import status, permissions, mixins
@@ -20,6 +25,8 @@ from rest_framework.exceptions import NotFound
 import rest_framework.exceptions as drf_exceptions
 from urllib import parse
 
+from dateutil import parser
+
 from display.tasks import (
     import_gpx_track,
     generate_and_maybe_notify_flight_order,
@@ -41,6 +48,8 @@ from display.models import (
     Aeroplane,
     Club,
     ANOMALY,
+    ContestantReceivedPosition,
+    ScoreLogEntry,
     Task,
     TaskTest,
 )
@@ -65,6 +74,7 @@ from display.permissions import (
 )
 from display.serialisers import (
     ContestantTrackSerialiser,
+    SnapshotContestantTrackSerialiser,
     NavigationTasksSummarySerialiser,
     ContestTeamManagementSerialiser,
     PersonSerialiser,
@@ -104,7 +114,9 @@ from display.serialisers import (
     ContestantNestedTeamSerialiser,
 )
 from display.utilities.show_slug_choices import ShowChoicesMetadata
+from display.utilities.track_binary_format import encode_binary_track, BINARY_TRACK_CONTENT_TYPE
 from display.utilities.tracking_definitions import TrackingService
+from display.utilities.snapshot_cache_utilities import snapshot_version
 from websocket_channels import WebsocketFacade, generate_contestant_data_block
 
 logger = logging.getLogger(__name__)
@@ -264,6 +276,7 @@ class EditableRouteViewSet(ModelViewSet):
 
 
 TRACK_DATA_PAGE_SIZE_MINUTES = 30
+TRACK_DATA_FIELDS = ("time", "latitude", "longitude", "speed", "course", "altitude", "progress")
 
 
 class MyCursorPagination(CursorPagination):
@@ -297,6 +310,35 @@ class MyCursorPagination(CursorPagination):
         )
 
 
+class CompressedTrackPositions:
+    """
+    The positions of a compressed track with the part of the queryset interface that CursorPagination uses, so that
+    compressed tracks are paginated with the same cursors, offsets and directions as tracks stored as positions.
+    """
+
+    def __init__(self, positions: List[Dict]):
+        self.positions = positions
+
+    def order_by(self, *ordering) -> "CompressedTrackPositions":
+        # The positions are unique in time, so the id in the ordering is not needed
+        return CompressedTrackPositions(
+            sorted(self.positions, key=lambda item: item["time"], reverse=ordering[0].startswith("-"))
+        )
+
+    def filter(self, time__lt: Optional[str] = None, time__gt: Optional[str] = None) -> "CompressedTrackPositions":
+        try:
+            if time__lt is not None:
+                cursor_time = parser.parse(time__lt)
+                return CompressedTrackPositions([item for item in self.positions if item["time"] < cursor_time])
+            cursor_time = parser.parse(time__gt)
+            return CompressedTrackPositions([item for item in self.positions if item["time"] > cursor_time])
+        except (ValueError, OverflowError):
+            raise NotFound(MyCursorPagination.invalid_cursor_message)
+
+    def __getitem__(self, item):
+        return self.positions[item]
+
+
 class ContestPagination(MyCursorPagination):
     page_size = 50
     ordering = ["-finish_time", "-start_time", "id"]
@@ -653,6 +695,17 @@ class NavigationTaskViewSet(ModelViewSet):
             serialiser = self.get_serializer(instance=navigation_task.scorecard)
             return Response(serialiser.data, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=["get"])
+    def snapshot(self, request, *args, **kwargs):
+        """
+        Loads the initial score data and tracks for all contestants in the navigation task with a single request.
+        Accepts the same tolerance and max_points parameters as the contestant track endpoint. The tracking map does
+        not use it yet, it still calls score_data and paginated_track_data for each contestant.
+        """
+        navigation_task = self.get_object()  # This is important, this is where the object permissions are checked
+        tolerance, max_points = ContestantViewSet.get_decimation_parameters(request)
+        return Response(generate_navigation_task_snapshot(navigation_task, tolerance, max_points))
+
     @action(
         detail=True,
         methods=["put", "delete"],
@@ -840,6 +893,104 @@ def generate_score_data(contestant_pk):
     return data
 
 
+SNAPSHOT_CACHE_KEY = "navigation_task_snapshot"
+# Snapshots of tasks where all calculators have finished only change if a calculator is restarted or the scores are
+# edited, both of which change the cache key. Snapshots of ongoing tasks are only cached long enough to serve a burst
+# of clients loading the map.
+FINISHED_SNAPSHOT_CACHE_TIMEOUT = 24 * 3600
+LIVE_SNAPSHOT_CACHE_TIMEOUT = 5
+
+
+def generate_navigation_task_snapshot(
+    navigation_task: NavigationTask, tolerance: Optional[float] = None, max_points: Optional[int] = None
+) -> Dict:
+    """
+    Generate the score data (see generate_score_data) and the track (see paginated_track_data) for all contestants in
+    the navigation task. The number of database queries does not depend on the number of contestants. The result is
+    cached in redis with a key that includes the track version, calculator state, score and score sequence of every
+    contestant, and the snapshot version of the contest (see snapshot_cache_utilities).
+    """
+    contestants = list(
+        Contestant.objects.filter(navigation_task=navigation_task)
+        .select_related("contestanttrack")
+        .order_by("pk")
+    )
+    # Every change to the score log entries, annotations and gate scores increases the score sequence of the
+    # contestant, and manual score changes are reflected in the contestant track score
+    score_sequences = WebsocketFacade().current_score_sequences(contestants)
+    versions = ",".join(
+        f"{contestant.pk}:{contestant.track_version}:{int(contestant.contestanttrack.calculator_finished)}:"
+        f"{score_sequence}:{contestant.contestanttrack.score}"
+        for contestant, score_sequence in zip(contestants, score_sequences)
+    )
+    versions += f";{snapshot_version(navigation_task.contest_id)}"
+    key = f"{SNAPSHOT_CACHE_KEY}_{navigation_task.pk}_{hashlib.md5(versions.encode()).hexdigest()}_{tolerance}_{max_points}"
+    if (snapshot := cache.get(key)) is not None:
+        return snapshot
+    contestants = list(
+        Contestant.objects.filter(pk__in=[contestant.pk for contestant in contestants])
+        .select_related("contestanttrack")
+        .prefetch_related(
+            "trackannotation_set",
+            Prefetch("scorelogentry_set", queryset=ScoreLogEntry.objects.filter(type=ANOMALY), to_attr="anomalies"),
+            "gatecumulativescore_set",
+            "playingcard_set",
+            "compressedcontestanttrack",
+        )
+        .order_by("pk")
+    )
+    contest_summaries = {
+        summary.team_id: summary.points
+        for summary in ContestSummary.objects.filter(
+            contest_id=navigation_task.contest_id, team_id__in=[contestant.team_id for contestant in contestants]
+        )
+    }
+    uncompressed_positions = {}
+    uncompressed_contestants = [
+        contestant.pk for contestant in contestants if contestant.get_compressed_track() is None
+    ]
+    for position in ContestantReceivedPosition.objects.filter(contestant_id__in=uncompressed_contestants).values(
+        "contestant_id", *TRACK_DATA_FIELDS
+    ):
+        uncompressed_positions.setdefault(position.pop("contestant_id"), []).append(position)
+    contestant_data = []
+    for contestant in contestants:
+        # Share the navigation task so that the route and scorecard are only fetched once
+        contestant.navigation_task = navigation_task
+        if compressed_track := contestant.get_compressed_track():
+            track = compressed_track.values(TRACK_DATA_FIELDS)
+        else:
+            track = uncompressed_positions.get(contestant.pk, [])
+        if len(track) and (tolerance is not None or max_points is not None):
+            indices = contestant.get_decimated_track_indices(
+                np.array([position["latitude"] for position in track]),
+                np.array([position["longitude"] for position in track]),
+                tolerance,
+                max_points,
+            )
+            track = [track[index] for index in indices]
+        if len(track):
+            track[-1]["progress"] = contestant.calculate_progress(track[-1]["time"], ignore_finished=True)
+        data = generate_contestant_data_block(
+            contestant,
+            annotations=TrackAnnotationSerialiser(contestant.trackannotation_set.all(), many=True).data,
+            log_entries=ScoreLogEntrySerialiser(contestant.anomalies, many=True).data,
+            gate_scores=GateCumulativeScoreSerialiser(contestant.gatecumulativescore_set.all(), many=True).data,
+            playing_cards=PlayingCardSerialiser(contestant.playingcard_set.all(), many=True).data,
+            contestant_track_data=SnapshotContestantTrackSerialiser(
+                contestant.contestanttrack,
+                context={"contest_summaries": {contestant.pk: contest_summaries.get(contestant.team_id)}},
+            ).data,
+            gate_times=contestant.gate_times,
+        )
+        data["track"] = track
+        contestant_data.append(data)
+    snapshot = {"navigation_task_id": navigation_task.pk, "contestants": contestant_data}
+    all_finished = all(contestant.contestanttrack.calculator_finished for contestant in contestants)
+    cache.set(key, snapshot, FINISHED_SNAPSHOT_CACHE_TIMEOUT if all_finished else LIVE_SNAPSHOT_CACHE_TIMEOUT)
+    return snapshot
+
+
 class ContestantViewSet(ModelViewSet):
     queryset = Contestant.objects.all()
     permission_classes = [
@@ -921,11 +1072,11 @@ class ContestantViewSet(ModelViewSet):
         contestant: Contestant = (
             self.get_object()
         )  # This is important, this is where the object permissions are checked
+        if compressed_track := contestant.get_compressed_track():
+            return self.compressed_track_data(request, contestant, compressed_track)
         position_data = contestant.get_track()
         pagination = MyCursorPagination()
-        page = pagination.paginate_queryset(
-            position_data.values("time", "latitude", "longitude", "speed", "course", "altitude", "progress"), request
-        )
+        page = pagination.paginate_queryset(position_data.values(*TRACK_DATA_FIELDS), request)
         if page is not None:
             if len(page):
                 page[-1]["progress"] = contestant.calculate_progress(page[-1]["time"], ignore_finished=True)
@@ -954,15 +1105,95 @@ class ContestantViewSet(ModelViewSet):
 
         return response
 
+    @staticmethod
+    def compressed_track_data(request, contestant: Contestant, compressed_track) -> Response:
+        """
+        Respond with a page of the compressed track in the same format as paginated_track_data. The cursors are
+        interchangeable, so a client that started paginating before the track was compressed continues from the cursor
+        of the previous page.
+        """
+        pagination = MyCursorPagination()
+        page = pagination.paginate_queryset(
+            CompressedTrackPositions(compressed_track.values(TRACK_DATA_FIELDS)), request
+        )
+        if len(page):
+            page[-1]["progress"] = contestant.calculate_progress(page[-1]["time"], ignore_finished=True)
+        response = pagination.get_paginated_response(page)
+        patch_response_headers(response, 60 * 60 * 24 * 31)
+        return response
+
+    @staticmethod
+    def get_decimation_parameters(request) -> Tuple[Optional[float], Optional[int]]:
+        """
+        Read the optional tolerance (metres) and max_points query parameters used to simplify tracks
+        """
+        try:
+            tolerance = float(request.query_params["tolerance"]) if "tolerance" in request.query_params else None
+            max_points = int(request.query_params["max_points"]) if "max_points" in request.query_params else None
+        except ValueError:
+            raise drf_exceptions.ValidationError("tolerance must be a number and max_points must be an integer")
+        if (tolerance is not None and tolerance < 0) or (max_points is not None and max_points < 2):
+            raise drf_exceptions.ValidationError("tolerance must be positive and max_points must be at least 2")
+        return tolerance, max_points
+
+    @action(detail=True, methods=["get"], url_path="track.bin")
+    def track_binary(self, request, pk=None, **kwargs):
+        """
+        Returns the entire GPS track for the contestant in a single response in the binary format described in
+        display.utilities.track_binary_format. When the calculator has finished the response has an ETag based on
+        the track version and the decimation parameters. If the track_version query parameter matches the current
+        track version, the response is also marked as immutable since a recalculation will increase the track version.
+        The tracking map still loads tracks through paginated_track_data, it does not decode this format yet.
+        """
+        contestant = self.get_object()  # This is important, this is where the object permissions are checked
+        finished = hasattr(contestant, "contestanttrack") and contestant.contestanttrack.calculator_finished
+        tolerance, max_points = self.get_decimation_parameters(request)
+        etag = f'"track-{contestant.pk}-{contestant.track_version}-{tolerance}-{max_points}"'
+        if finished and etag in request.headers.get("If-None-Match", ""):
+            response = HttpResponseNotModified()
+            response["ETag"] = etag
+            return response
+        columns = contestant.get_track_columns()
+        if tolerance is not None or max_points is not None:
+            indices = contestant.get_decimated_track_indices(
+                columns["latitude"], columns["longitude"], tolerance, max_points
+            )
+            columns = {name: values[indices] for name, values in columns.items() if isinstance(values, np.ndarray)}
+        if len(columns["time"]):
+            last_time = datetime.datetime.fromtimestamp(columns["time"][-1] / 1000, datetime.timezone.utc)
+            columns["progress"][-1] = contestant.calculate_progress(last_time, ignore_finished=True)
+        response = HttpResponse(encode_binary_track(columns), content_type=BINARY_TRACK_CONTENT_TYPE)
+        if finished:
+            response["ETag"] = etag
+            # The track is protected by the object permissions, so it must never be stored by shared caches
+            if request.query_params.get("track_version") == str(contestant.track_version):
+                response["Cache-Control"] = "private, max-age=31536000, immutable"
+            else:
+                response["Cache-Control"] = "private, no-cache"
+        else:
+            add_never_cache_headers(response)
+        return response
+
     @action(detail=True, methods=["get"])
     def track(self, request, pk=None, **kwargs):
         """
-        Returns the GPS track for the contestant
+        Returns the GPS track for the contestant, simplified if the tolerance or max_points parameters are given. No
+        front end view requests simplified tracks yet.
         """
         contestant = self.get_object()  # This is important, this is where the object permissions are checked
         contestant_track = contestant.contestanttrack
 
         position_data = contestant.get_track()
+        tolerance, max_points = self.get_decimation_parameters(request)
+        if tolerance is not None or max_points is not None:
+            position_data = list(position_data)
+            indices = contestant.get_decimated_track_indices(
+                np.array([position.latitude for position in position_data]),
+                np.array([position.longitude for position in position_data]),
+                tolerance,
+                max_points,
+            )
+            position_data = [position_data[index] for index in indices]
         contestant_track.track = position_data
         serialiser = ContestantTrackWithTrackPointsSerialiser(contestant_track)
         return Response(serialiser.data)
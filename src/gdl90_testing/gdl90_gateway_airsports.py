@@ -54,7 +54,8 @@ def transmit_position(message: Dict):
 
 def on_message(ws, message):
     data = json.loads(message)
-    transmit_position(data)
+    for position in data if isinstance(data, list) else [data]:
+        transmit_position(position)
 
 
 def on_error(ws, error):
@@ -0,0 +1,163 @@
+"""
+Latest position of every aircraft on the global map, stored in redis.
+
+The positions are stored as the JSON text that is sent to the global map clients, so they are encoded once and can
+be forwarded to new clients without being decoded. Three keys are used:
+
+* REDIS_GLOBAL_POSITIONS_KEY, a hash from device ID to the encoded position
+* a sorted set from device ID to the position time stamp (epoch seconds), used to skip positions that are older than
+  the stored position and to prune aircraft that have not been seen for PURGE_GLOBAL_MAP_INTERVAL
+* a geo index of the positions, used to find the aircraft close to a new global map client
+
+The global map consumers that receive all the traffic instead of the traffic in the cells close to them register in a
+fourth key, so that the publishers only send to the group with all the traffic while somebody is listening.
+
+A batch of positions is written with two round trips to redis regardless of its size: one to read the time stamps of
+the stored positions and one to write the new positions.
+"""
+import logging
+import time
+from typing import List, NamedTuple, Tuple, Union
+
+from redis import StrictRedis
+
+from live_tracking_map.settings import REDIS_GLOBAL_POSITIONS_KEY, REDIS_HOST, REDIS_PORT, PURGE_GLOBAL_MAP_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_POSITION_TIMES_KEY = f"{REDIS_GLOBAL_POSITIONS_KEY}_time"
+GLOBAL_POSITION_LOCATIONS_KEY = f"{REDIS_GLOBAL_POSITIONS_KEY}_location"
+# Redis geo indexes only support latitudes within this limit
+MAXIMUM_GEO_LATITUDE = 85.05112878
+# Minimum number of seconds between each pruning of stale positions by the same store
+PURGE_CHECK_INTERVAL = 10
+# Sorted set from the channel name of each consumer that receives all the traffic to the time its subscription expires
+ALL_TRAFFIC_SUBSCRIBERS_KEY = f"{REDIS_GLOBAL_POSITIONS_KEY}_all_traffic_subscribers"
+# Consumers renew their subscription to all the traffic well within this number of seconds, so that the subscriptions
+# of consumers that disappear without unsubscribing expire
+ALL_TRAFFIC_SUBSCRIPTION_TTL = 120
+# Number of seconds a store caches whether there are any subscribers to all the traffic
+ALL_TRAFFIC_SUBSCRIBER_CHECK_INTERVAL = 5
+
+
+class StoredPosition(NamedTuple):
+    device_id: Union[str, int]
+    time_stamp: float  # epoch seconds
+    latitude: float
+    longitude: float
+    data: str  # JSON encoded position sent to the global map clients
+
+
+class GlobalPositionStore:
+    def __init__(self, redis: StrictRedis = None):
+        self.redis = redis or StrictRedis(REDIS_HOST, REDIS_PORT)  # , password=REDIS_PASSWORD)
+        self.last_purge = 0
+        self.last_subscriber_check = 0
+        self.all_traffic_subscribed = False
+
+    def store_positions(self, positions: List[StoredPosition], only_newer: bool = True) -> List[StoredPosition]:
+        """
+        Store the positions and return the ones that were stored. If only_newer is set, positions that are not newer
+        than the stored position of the device are skipped. If a batch contains several positions for the same
+        device, only the last one is kept.
+        """
+        latest = {}
+        for position in positions:
+            latest[str(position.device_id)] = position
+        if len(latest) == 0:
+            return []
+        if only_newer:
+            pipeline = self.redis.pipeline(transaction=False)
+            for device_id in latest:
+                pipeline.zscore(GLOBAL_POSITION_TIMES_KEY, device_id)
+            stored_times = pipeline.execute()
+            latest = {
+                device_id: position
+                for (device_id, position), stored_time in zip(latest.items(), stored_times)
+                if stored_time is None or position.time_stamp > stored_time
+            }
+            if len(latest) == 0:
+                return []
+        locations = []
+        for device_id, position in latest.items():
+            latitude = min(max(position.latitude, -MAXIMUM_GEO_LATITUDE), MAXIMUM_GEO_LATITUDE)
+            locations.extend((position.longitude, latitude, device_id))
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.hset(
+            REDIS_GLOBAL_POSITIONS_KEY, mapping={device_id: position.data for device_id, position in latest.items()}
+        )
+        pipeline.zadd(
+            GLOBAL_POSITION_TIMES_KEY, {device_id: position.time_stamp for device_id, position in latest.items()}
+        )
+        pipeline.geoadd(GLOBAL_POSITION_LOCATIONS_KEY, locations)
+        pipeline.execute()
+        self.purge_if_due()
+        return list(latest.values())
+
+    def purge(self, maximum_age: float = PURGE_GLOBAL_MAP_INTERVAL) -> int:
+        """
+        Remove the positions that are older than maximum_age seconds. Returns the number of removed positions.
+        """
+        cutoff = time.time() - maximum_age
+        stale = self.redis.zrangebyscore(GLOBAL_POSITION_TIMES_KEY, "-inf", cutoff)
+        if len(stale) > 0:
+            pipeline = self.redis.pipeline(transaction=False)
+            pipeline.hdel(REDIS_GLOBAL_POSITIONS_KEY, *stale)
+            pipeline.zrem(GLOBAL_POSITION_LOCATIONS_KEY, *stale)
+            pipeline.zremrangebyscore(GLOBAL_POSITION_TIMES_KEY, "-inf", cutoff)
+            pipeline.execute()
+        self.last_purge = time.time()
+        return len(stale)
+
+    def purge_if_due(self):
+        if time.time() - self.last_purge > PURGE_CHECK_INTERVAL:
+            removed = self.purge()
+            if removed > 0:
+                logger.debug(f"Purged {removed} stale global positions")
+
+    def positions_in_radius(self, latitude: float, longitude: float, radius: float) -> List[Tuple[str, str]]:
+        """
+        The device IDs and encoded positions of the aircraft within radius metres of the location that are more recent
+        than PURGE_GLOBAL_MAP_INTERVAL
+        """
+        device_ids = self.redis.geosearch(
+            GLOBAL_POSITION_LOCATIONS_KEY, longitude=longitude, latitude=latitude, radius=radius, unit="m"
+        )
+        if len(device_ids) == 0:
+            return []
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.hmget(REDIS_GLOBAL_POSITIONS_KEY, device_ids)
+        pipeline.zmscore(GLOBAL_POSITION_TIMES_KEY, device_ids)
+        encoded_positions, time_stamps = pipeline.execute()
+        cutoff = time.time() - PURGE_GLOBAL_MAP_INTERVAL
+        return [
+            (device_id.decode("utf-8"), data.decode("utf-8"))
+            for device_id, data, time_stamp in zip(device_ids, encoded_positions, time_stamps)
+            if data is not None and time_stamp is not None and time_stamp > cutoff
+        ]
+
+    def subscribe_all_traffic(self, channel_name: str):
+        """
+        Register or renew the subscription of the consumer to all the traffic
+        """
+        self.redis.zadd(ALL_TRAFFIC_SUBSCRIBERS_KEY, {channel_name: time.time() + ALL_TRAFFIC_SUBSCRIPTION_TTL})
+
+    def unsubscribe_all_traffic(self, channel_name: str):
+        self.redis.zrem(ALL_TRAFFIC_SUBSCRIBERS_KEY, channel_name)
+
+    def has_all_traffic_subscribers(self) -> bool:
+        """
+        True if any consumer is subscribed to all the traffic. The answer is cached for
+        ALL_TRAFFIC_SUBSCRIBER_CHECK_INTERVAL seconds, so new subscribers may wait that long for the first positions.
+        """
+        now = time.time()
+        if now - self.last_subscriber_check > ALL_TRAFFIC_SUBSCRIBER_CHECK_INTERVAL:
+            pipeline = self.redis.pipeline(transaction=False)
+            pipeline.zremrangebyscore(ALL_TRAFFIC_SUBSCRIBERS_KEY, "-inf", now)
+            pipeline.zcard(ALL_TRAFFIC_SUBSCRIBERS_KEY)
+            self.all_traffic_subscribed = pipeline.execute()[1] > 0
+            self.last_subscriber_check = now
+        return self.all_traffic_subscribed
+
+    def clear(self):
+        self.redis.delete(REDIS_GLOBAL_POSITIONS_KEY, GLOBAL_POSITION_TIMES_KEY, GLOBAL_POSITION_LOCATIONS_KEY)
@@ -1,5 +1,6 @@
 import datetime
 import logging
+from typing import Dict, Optional
 
 import django
 from django.core.exceptions import ObjectDoesNotExist
@@ -50,19 +51,11 @@ def live_position_transmitter_process(queue):
             contestant_cache[person_or_contestant] = contestant
         return contestant
 
-    while True:
-        (
-            data_type,
-            person_or_contestant,
-            position_data,
-            device_time,
-            is_simulator,
-        ) = queue.get()
-        if (datetime.datetime.now() - last_reset).total_seconds() > LIVE_POSITION_TRANSMITTER_CACHE_RESET_INTERVAL:
-            person_cache = {}
-            contestant_cache = {}
-            last_reset = datetime.datetime.now()
-
+    def transmit_position(data_type, person_or_contestant, position_data, device_time, is_simulator) -> Optional[Dict]:
+        """
+        Transmit the position to the air sports feed, and return the global position data for the position if it
+        should be transmitted to the global map
+        """
         navigation_task_id = None
         global_tracking_name = None
         person_data = None
@@ -111,17 +104,36 @@ def live_position_transmitter_process(queue):
             and not is_simulator
             and now < device_time + datetime.timedelta(seconds=PURGE_GLOBAL_MAP_INTERVAL)
         ):
+            websocket_facade.transmit_airsports_position_data(
+                global_tracking_name,
+                position_data,
+                device_time,
+                navigation_task_id,
+            )
             if push_global:
-                websocket_facade.transmit_global_position_data(
+                return websocket_facade.internal_global_position_data(
                     global_tracking_name,
                     person_data,
                     position_data,
                     device_time,
                     navigation_task_id,
                 )
-            websocket_facade.transmit_airsports_position_data(
-                global_tracking_name,
-                position_data,
-                device_time,
-                navigation_task_id,
+        return None
+
+    while True:
+        # Positions are received in batches, one batch for each websocket frame received from Traccar
+        batch = queue.get()
+        if (datetime.datetime.now() - last_reset).total_seconds() > LIVE_POSITION_TRANSMITTER_CACHE_RESET_INTERVAL:
+            person_cache.clear()
+            contestant_cache.clear()
+            last_reset = datetime.datetime.now()
+        global_positions = []
+        for data_type, person_or_contestant, position_data, device_time, is_simulator in batch:
+            global_position = transmit_position(
+                data_type, person_or_contestant, position_data, device_time, is_simulator
             )
+            if global_position is not None:
+                global_positions.append(global_position)
+        # The global positions of the whole batch are stored with one pipeline
+        if len(global_positions) > 0:
+            websocket_facade.transmit_internal_global_positions(global_positions)
@@ -83,6 +83,11 @@ REDIS_GLOBAL_POSITIONS_KEY = "global_positions"
 
 PURGE_GLOBAL_MAP_INTERVAL = 60
 LIVE_POSITION_TRANSMITTER_CACHE_RESET_INTERVAL = 300
+# Number of initial processor processes in the position processor. Positions are routed to a worker based on the device
+POSITION_PROCESSOR_WORKERS = int(os.environ.get("POSITION_PROCESSOR_WORKERS", 1))
+# Either "list" or "stream". Streams retain the positions so that a restarted calculator can replay them.
+CALCULATOR_POSITION_QUEUE_BACKEND = os.environ.get("CALCULATOR_POSITION_QUEUE_BACKEND", "list")
+CALCULATOR_POSITION_STREAM_MAXLEN = 100000
 
 # Application definition
 
@@ -6,7 +6,6 @@ import os
 import asyncio
 
 # import sentry_sdk
-from redis import StrictRedis
 
 
 # sentry_sdk.init(
@@ -24,7 +23,6 @@ if __name__ == "__main__":
 
     django.setup()
 
-from live_tracking_map.settings import REDIS_GLOBAL_POSITIONS_KEY, REDIS_HOST, REDIS_PASSWORD, REDIS_PORT
 from websocket_channels import WebsocketFacade
 
 logging.basicConfig(level=logging.INFO,
@@ -73,6 +71,21 @@ FLARM_AIRCRAFT_TYPES = {
 
 message_count = 0
 count_timestamp = 0
+# Beacons are transmitted in batches of up to BEACON_BATCH_SIZE beacons, or at least every BEACON_BATCH_INTERVAL seconds
+BEACON_BATCH_SIZE = 200
+BEACON_BATCH_INTERVAL = 1
+pending_positions = []
+last_batch_timestamp = 0
+
+
+def transmit_pending_positions(now: float):
+    global pending_positions, last_batch_timestamp
+    if len(pending_positions) >= BEACON_BATCH_SIZE or now > last_batch_timestamp + BEACON_BATCH_INTERVAL:
+        positions = pending_positions
+        pending_positions = []
+        last_batch_timestamp = now
+        if len(positions) > 0:
+            asyncio.run(ws.transmit_external_global_positions(positions))
 
 
 def process_beacon(raw_message):
@@ -85,6 +98,8 @@ def process_beacon(raw_message):
         count_timestamp = now
     if raw_message[0] == '#':
         # logger.info('Server Status: {}'.format(raw_message))
+        # The server sends status lines regularly, so pending positions are also sent when no beacons are received
+        transmit_pending_positions(now)
         return
 
     try:
@@ -99,26 +114,32 @@ def process_beacon(raw_message):
             if altitude_feet < 10000 and beacon.get("address"):
                 beacon["timestamp"] = beacon["timestamp"].replace(tzinfo=datetime.timezone.utc)
                 address = beacon.get("address").lower()
-                asyncio.run(
-                    ws.transmit_external_global_position_data(address, beacon["name"],
-                                                              beacon["timestamp"],
-                                                              beacon["latitude"], beacon["longitude"],
-                                                              beacon["altitude"],
-                                                              beacon["altitude"], beacon["ground_speed"]/1.852,  # is km/h
-                                                              beacon["track"],
-                                                              "ogn", raw_data=None,
-                                                              aircraft_type=beacon["aircraft_type"]))
+                pending_positions.append(
+                    ws.external_global_position_data(
+                        address,
+                        beacon["name"],
+                        beacon["timestamp"],
+                        beacon["latitude"],
+                        beacon["longitude"],
+                        beacon["altitude"],
+                        beacon["altitude"],
+                        beacon["ground_speed"] / 1.852,  # is km/h
+                        beacon["track"],
+                        "ogn",
+                        raw_data=None,
+                        aircraft_type=beacon["aircraft_type"],
+                    )
+                )
         # print('Received {aprs_type}: {raw_message}'.format(**beacon))
         # print('Received {beacon_type} from {name}'.format(**beacon))
     except (ParseError, AttributeError) as e:
         logger.exception("Parse error")
+    transmit_pending_positions(now)
 
 
 if __name__ == "__main__":
     logger.info("OGN consumer starting")
-    redis = StrictRedis(REDIS_HOST, REDIS_PORT)#, password=REDIS_PASSWORD)
-    # redis = StrictRedis(unix_socket_path="/tmp/docker/redis.sock")
-    redis.delete(REDIS_GLOBAL_POSITIONS_KEY)
+    ws.global_position_store.clear()
     client = AprsClient(aprs_user='N0CALL')
     client.connect()
     logger.info("OGN consumer connected client")
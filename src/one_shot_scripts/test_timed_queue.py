@@ -3,6 +3,7 @@ from unittest import TestCase
 import datetime
 
 import threading
+import time
 
 from utilities.timed_queue import TimedQueue, TimedOut
 
@@ -76,3 +77,39 @@ class TestTimedQueue(TestCase):
         self.assertEqual("Test2", data2)
         self.assertGreaterEqual(time_difference, 0)
         self.assertLessEqual(time_difference, 0.1)
+
+    def test_same_stamp_keeps_insertion_order(self):
+        start = now() - datetime.timedelta(seconds=1)
+        tq = TimedQueue()
+        for index in range(10):
+            tq.put(index, start)
+        self.assertEqual(list(range(10)), [tq.get() for _ in range(10)])
+
+    def test_put_many_and_last_release_time(self):
+        start = now() - datetime.timedelta(seconds=10)
+        tq = TimedQueue()
+        self.assertIsNone(tq.last_release_time())
+        tq.put("Last", start + datetime.timedelta(seconds=5))
+        tq.put_many([("Second", start + datetime.timedelta(seconds=2)), ("First", start)])
+        self.assertEqual(start + datetime.timedelta(seconds=5), tq.last_release_time())
+        self.assertEqual("First", tq.peek())
+        self.assertEqual(["First", "Second", "Last"], [tq.get() for _ in range(3)])
+        self.assertIsNone(tq.last_release_time())
+
+    def test_load_50k_positions(self):
+        """
+        Micro benchmark simulating a calculator that starts late and loads a long historic track out of order
+        """
+        start = now() - datetime.timedelta(days=1)
+        positions = [({"id": index}, start + datetime.timedelta(seconds=index)) for index in range(50000)]
+        # Historic positions are loaded first, then live positions arrive one at a time
+        historic, live = positions[:25000], positions[25000:]
+        tq = TimedQueue()
+        load_start = time.perf_counter()
+        tq.put_many(reversed(historic))
+        for item in live:
+            tq.put(*item)
+        received = [tq.get()["id"] for _ in range(len(positions))]
+        duration = time.perf_counter() - load_start
+        self.assertEqual(list(range(50000)), received)
+        self.assertLess(duration, 5, f"Loaded and released {len(positions)} positions in {duration:.3f} seconds")
@@ -107,20 +107,31 @@ class AircraftDatabase:
 
 
 async def transmit_states(states):
+    """
+    Transmit all the states of an OpenSky response as one batch
+    """
+    positions = []
     for state in states:
         if state.time_position and state.latitude and state.longitude and state.velocity and state.geo_altitude:
             altitude_feet = state.geo_altitude * 3.281
             if altitude_feet < 10000:
                 timestamp = datetime.datetime.fromtimestamp(state.time_position, datetime.timezone.utc)
-                await websocket_facade.transmit_external_global_position_data(state.icao24.lower(),
-                                                                              state.callsign or "", timestamp,
-                                                                              state.latitude, state.longitude,
-                                                                              state.geo_altitude,
-                                                                              state.baro_altitude,
-                                                                              state.velocity * 1.944,
-                                                                              state.heading, "opensky",
-                                                                              aircraft_type=aircraft_database.get_aircraft_type(
-                                                                                  state.icao24.lower()))
+                positions.append(
+                    websocket_facade.external_global_position_data(
+                        state.icao24.lower(),
+                        state.callsign or "",
+                        timestamp,
+                        state.latitude,
+                        state.longitude,
+                        state.geo_altitude,
+                        state.baro_altitude,
+                        state.velocity * 1.944,
+                        state.heading,
+                        "opensky",
+                        aircraft_type=aircraft_database.get_aircraft_type(state.icao24.lower()),
+                    )
+                )
+    await websocket_facade.transmit_external_global_positions(positions)
 
 if __name__ == "__main__":
     aircraft_database = AircraftDatabase()
@@ -6,7 +6,7 @@ import logging
 import requests
 import gpxpy
 
-from display.calculators.contestant_processor import ContestantProcessor
+from display.calculators.batch_contestant_processor import BatchContestantProcessor
 from display.utilities.calculator_termination_utilities import cancel_termination_request
 from display.utilities.coordinate_utilities import calculate_speed_between_points, calculate_bearing
 
@@ -15,7 +15,6 @@ from display.models import Contestant, ContestantUploadedTrack
 import os
 
 from display.utilities.tracking_definitions import TrackingService
-from redis_queue import RedisQueue
 
 TRACCAR_HOST = os.environ.get("TRACCAR_HOST", "traccar")
 server = f"{TRACCAR_HOST}:5055"
@@ -102,7 +101,7 @@ def recalculate_live_contestant(contestant: "Contestant"):
         logger.debug("Deleted existing uploaded track")
     except:
         pass
-    contestant.contestantreceivedposition_set.all().delete()
+    contestant.delete_track()
     contestant.track_version += 1
     contestant.save(update_fields=["track_version"])
     now = datetime.datetime.now(datetime.timezone.utc)
@@ -113,19 +112,9 @@ def recalculate_live_contestant(contestant: "Contestant"):
         track = contestant.get_traccar_track()
     elif contestant.tracking_service == TrackingService.FLY_MASTER:
         track = contestant.get_flymaster_track()
-    queue_name = f"override_{contestant.pk}"
-    q = RedisQueue(queue_name)
-    while not q.empty():
-        q.pop()
-    for i in track:
-        q.append(i)
-    q.append(None)
     logger.debug(f"Loaded {len(track)} positions")
     cancel_termination_request(contestant.pk)
-    contestant_processor = ContestantProcessor(contestant, live_processing=False, queue_name_override=queue_name)
-    contestant_processor.run()
-    while not q.empty():
-        q.pop()
+    BatchContestantProcessor(contestant).run(track)
 
 
 class InvalidGpxTimeFormatException(Exception): ...
@@ -197,20 +186,10 @@ def insert_gpx_file(contestant_object: "Contestant", file):
         logger.debug("Deleted existing uploaded track")
     except:
         pass
-    contestant_object.contestantreceivedposition_set.all().delete()
+    contestant_object.delete_track()
     contestant_object.track_version += 1
     contestant_object.save(update_fields=["track_version"])
     ContestantUploadedTrack.objects.create(contestant=contestant_object, track=positions)
     logger.debug("Created new uploaded track with {} positions".format(len(positions)))
-    queue_name = f"override_{contestant_object.pk}"
-    q = RedisQueue(queue_name)
-    while not q.empty():
-        q.pop()
-    for i in positions:
-        q.append(i)
-    q.append(None)
     cancel_termination_request(contestant_object.pk)
-    contestant_processor = ContestantProcessor(contestant_object, live_processing=False, queue_name_override=queue_name)
-    contestant_processor.run()
-    while not q.empty():
-        q.pop()
+    BatchContestantProcessor(contestant_object).run(positions)
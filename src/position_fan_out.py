@@ -0,0 +1,29 @@
+import logging
+import time
+
+from websocket_channels import WebsocketFacade, POSITION_FAN_OUT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+DEBUG_INTERVAL = 60
+
+
+def position_fan_out_process():
+    """
+    Sends the positions that the calculators have buffered in redis to the tracking consumers, one message per
+    navigation task every POSITION_FAN_OUT_INTERVAL seconds (see WebsocketFacade.transmit_navigation_task_position_data)
+    """
+    websocket_facade = WebsocketFacade()
+    last_debug = time.time()
+    transmitted_blocks = 0
+    while True:
+        start = time.time()
+        try:
+            transmitted_blocks += websocket_facade.transmit_buffered_navigation_task_position_data()
+        except Exception:
+            logger.exception("Failed transmitting buffered navigation task positions")
+        if start - last_debug > DEBUG_INTERVAL:
+            logger.debug(f"Transmitted {transmitted_blocks} position blocks last {start - last_debug:.1f} seconds")
+            transmitted_blocks = 0
+            last_debug = start
+        time.sleep(max(0.0, POSITION_FAN_OUT_INTERVAL - (time.time() - start)))
@@ -1,10 +1,13 @@
+import asyncio
+import datetime
 import json
 import logging
 from logging.config import dictConfig
 import os
-import threading
 import time
 from multiprocessing import Process, Queue
+from queue import Full
+from typing import Dict, List, Optional
 
 import log_configuration
 import probes
@@ -15,14 +18,16 @@ if __name__ == "__main__":
 
     django.setup()
 
-from traccar_facade import Traccar
+from traccar_facade import Traccar, parse_traccar_time
 from django.core.cache import cache
 from django.db import connections
 
-from position_processor_process import initial_processor, LAST_DEBUG_KEY
+from position_processor_process import initial_processor, LAST_DEBUG_KEY, worker_for_device
 from live_position_transmitter import live_position_transmitter_process
+from position_fan_out import position_fan_out_process
+from live_tracking_map.settings import POSITION_PROCESSOR_WORKERS
 
-import websocket
+import websockets
 
 dictConfig(log_configuration.LOG_CONFIGURATION)
 
@@ -31,89 +36,276 @@ logger = logging.getLogger(__name__)
 
 FAILED_TRACCAR_CONNECTION_COUNT_LIMIT = 10
 DEBUG_INTERVAL = 60
-global_map_queue = Queue()
-processing_queue = Queue()
-
-received_messages = 0
-failed_traccar_connection_count = 0
-
-disconnected_time = None
-
-
-def print_messages_debug():
-    global received_messages
-    logger.debug(
-        f"Received {received_messages} messages last {DEBUG_INTERVAL:1f} seconds ({(received_messages / DEBUG_INTERVAL):.2f} m/s)"
-    )
-    received_messages = 0
-    threading.Timer(DEBUG_INTERVAL, print_messages_debug).start()
-
-
-def on_message(ws, message):
-    global received_messages, failed_traccar_connection_count
-    failed_traccar_connection_count = 0
-    data = json.loads(message)
-    received_messages += 1
-    # for item in data.get("positions", []):
-    #     logger.debug(f"Received position ID {item['id']} for device ID {item['deviceId']}")
-    processing_queue.put(data)
-
-
-def on_error(ws, error):
-    logger.error(f"Websocket error: {error}")
-
-
-def on_close(ws, *args, **kwargs):
-    global disconnected_time
-    disconnected_time = time.time()
-    print(f"### closed {disconnected_time=} ###")
-
-
-def on_open(ws):
-    global disconnected_time
-    disconnected_time = None
-    logger.info(f"Websocket connected, {disconnected_time=}")
-
-
 CONNECTION_CHECK_INTERVAL = 30
+# Maximum number of websocket frames waiting to be dispatched to the initial processors. If the initial processors
+# cannot keep up, the oldest frames are dropped.
+MAXIMUM_PENDING_FRAMES = 1000
+# Maximum number of frames waiting in the queue of each initial processor
+MAXIMUM_PROCESSOR_QUEUE_SIZE = 1000
+# Devices that have sent positions this long before a disconnect are included when fetching the gap
+GAP_DEVICE_ACTIVITY_WINDOW = datetime.timedelta(minutes=10)
+# Never fetch gaps longer than this
+MAXIMUM_GAP = datetime.timedelta(hours=1)
+# Maximum number of concurrent requests to traccar when fetching the gap after a reconnect
+GAP_FETCH_CONCURRENCY = 8
+# Fetched gap positions are dispatched in frames of this size
+GAP_FRAME_SIZE = 1000
+RECONNECT_DELAY = 5
+MAXIMUM_RECONNECT_DELAY = 60
+POSITION_PROCESSOR_METRICS_KEY = "position_processor_metrics"
+
+headers = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/51.0.2704.103 Safari/537.36"
+}
 
 
-def check_connection():
+class PositionProcessorFrontEnd:
     """
-    Used in the main process
+    Receives position frames from the traccar websocket and dispatches them to the initial processors. Frames are
+    buffered in a bounded queue so that the behaviour under overload is defined: if the initial processors cannot keep
+    up, the oldest frames are dropped and counted. The lag between traccar receiving a position and the position being
+    dispatched, and the depth of the queues, are logged and stored in the cache at every DEBUG_INTERVAL.
+
+    When the websocket is reconnected, the positions sent by recently active devices while disconnected are fetched
+    from traccar in a single concurrent pass and dispatched before any new frames (see fetch_gap).
     """
-    last_debug = cache.get(LAST_DEBUG_KEY)
-    if (
-        (disconnected_time and time.time() - disconnected_time > 300)
-        or not last_debug
-        or (time.time() - last_debug > 300)
-    ):
-        logger.debug("Something is fishy")
-        if disconnected_time and time.time() - disconnected_time > 300:
-            logger.error(
-                f"Websocket has not been connected for 5 minutes, setting liveness probe to false to force a restart. {disconnected_time=}"
-            )
-        if not last_debug:
-            logger.error(f"Last debug time is not in the cache, setting liveness to false")
-        elif time.time() - last_debug > 300:
-            logger.error(f"Last debug time is {time.time()-last_debug} seconds old, setting liveness to false")
-        probes.liveness(False)
-    else:
-        probes.liveness(True)
-    threading.Timer(CONNECTION_CHECK_INTERVAL, check_connection).start()
 
+    def __init__(self, processing_queues: List[Queue]):
+        self.processing_queues = processing_queues
+        self.pending_frames: Optional[asyncio.Queue] = None
+        self.traccar: Optional[Traccar] = None
+        self.connected_time = None
+        self.disconnected_time = time.time()
+        self.device_last_seen: Dict[int, datetime.datetime] = {}
+        self.received_messages = 0
+        self.dispatched_positions = 0
+        self.dropped_frames = 0
+        self.latest_lag = 0.0
+        self.maximum_lag = 0.0
+
+    async def run(self):
+        self.pending_frames = asyncio.Queue(maxsize=MAXIMUM_PENDING_FRAMES)
+        await asyncio.gather(self.receiver(), self.dispatcher(), self.print_messages_debug(), self.check_connection())
+
+    async def connect_traccar(self) -> Traccar:
+        failed_connecting_count = 0
+        while True:
+            try:
+                traccar = await asyncio.to_thread(Traccar.create_from_configuration)
+                # Ensure that we have an authenticated session before building the cookie
+                await asyncio.to_thread(lambda: traccar.session)
+                return traccar
+            except Exception:
+                logger.exception("Connection error connecting to traccar")
+                failed_connecting_count += 1
+                if failed_connecting_count >= FAILED_TRACCAR_CONNECTION_COUNT_LIMIT:
+                    logger.error("Failed connecting to traccar %d consecutive times", failed_connecting_count)
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    async def receiver(self):
+        failed_traccar_connection_count = 0
+        while True:
+            self.traccar = await self.connect_traccar()
+            cookies = self.traccar.session.cookies.get_dict()
+            logger.info("Initiating session and getting cookie")
+            try:
+                async with websockets.connect(
+                    "ws://{}/api/socket".format(self.traccar.address),
+                    extra_headers={
+                        **headers,
+                        "Cookie": "; ".join(["%s=%s" % (i, j) for i, j in cookies.items()]),
+                    },
+                    ping_interval=55,
+                    max_size=None,
+                ) as ws:
+                    logger.info(f"Websocket connected, disconnected_time={self.disconnected_time}")
+                    connected = datetime.datetime.now(datetime.timezone.utc)
+                    try:
+                        await self.fetch_gap(connected)
+                    except Exception:
+                        # The calculators fetch missing positions from traccar when they detect a gap
+                        logger.exception("Failed fetching the positions received while disconnected")
+                    self.connected_time = time.time()
+                    self.disconnected_time = None
+                    failed_traccar_connection_count = 0
+                    async for message in ws:
+                        self.received_messages += 1
+                        self.enqueue_frame(message)
+            except (websockets.WebSocketException, OSError) as e:
+                logger.error(f"Websocket error: {e}")
+            if self.disconnected_time is None:
+                self.disconnected_time = time.time()
+            failed_traccar_connection_count += 1
+            logger.warning(f"Websocket terminated for {failed_traccar_connection_count} consecutive time, restarting")
+            await asyncio.sleep(min(RECONNECT_DELAY * failed_traccar_connection_count, MAXIMUM_RECONNECT_DELAY))
+
+    def enqueue_frame(self, frame):
+        try:
+            self.pending_frames.put_nowait(frame)
+        except asyncio.QueueFull:
+            # Drop the oldest frame. Calculators fetch missing positions from traccar when they detect a gap.
+            self.pending_frames.get_nowait()
+            self.pending_frames.put_nowait(frame)
+            self.dropped_frames += 1
+
+    def prune_device_last_seen(self):
+        """
+        Forget devices that have not sent positions within GAP_DEVICE_ACTIVITY_WINDOW of the disconnect (or of now, if
+        the websocket is connected), they are not included when fetching the gap anyway.
+        """
+        if self.disconnected_time is not None:
+            reference = datetime.datetime.fromtimestamp(self.disconnected_time, datetime.timezone.utc)
+        else:
+            reference = datetime.datetime.now(datetime.timezone.utc)
+        limit = reference - GAP_DEVICE_ACTIVITY_WINDOW
+        self.device_last_seen = {
+            device_id: last_seen for device_id, last_seen in self.device_last_seen.items() if last_seen > limit
+        }
+
+    async def fetch_gap(self, connected: datetime.datetime):
+        """
+        Fetch positions for all devices that were active before the websocket was disconnected and dispatch them before
+        any new frames are received. The devices are fetched concurrently through the pooled traccar session, bounded
+        by GAP_FETCH_CONCURRENCY, so that the gap is filled in one coordinated pass instead of every calculator
+        fetching its own gap from traccar when it receives the next live position. The gap ends at the time the
+        websocket was connected, positions after that are received on the websocket.
+        """
+        if self.disconnected_time is None:
+            return
+        self.prune_device_last_seen()
+        if len(self.device_last_seen) == 0:
+            return
+        disconnected = datetime.datetime.fromtimestamp(self.disconnected_time, datetime.timezone.utc)
+        start = max(disconnected, connected - MAXIMUM_GAP)
+        active_devices = list(self.device_last_seen.keys())
+        fetch_start = time.time()
+        device_positions = await asyncio.to_thread(
+            self.traccar.get_positions_for_devices, active_devices, start, connected, GAP_FETCH_CONCURRENCY
+        )
+        positions = [position for positions in device_positions.values() for position in positions]
+        # Traccar uses the same time format for all positions, so the strings sort chronologically
+        positions.sort(key=lambda item: item["deviceTime"])
+        logger.info(
+            f"Fetched {len(positions)} positions for {len(active_devices)} devices after reconnecting in {time.time() - fetch_start:.1f} seconds"
+        )
+        for index in range(0, len(positions), GAP_FRAME_SIZE):
+            # Wait for space instead of dropping frames, the gap is always dispatched in full
+            await self.pending_frames.put({"positions": positions[index : index + GAP_FRAME_SIZE]})
+
+    async def dispatcher(self):
+        while True:
+            frame = await self.pending_frames.get()
+            try:
+                await self.dispatch_frame(frame)
+            except Exception:
+                # A bad frame must not stop the dispatching of the following frames
+                logger.exception(f"Failed dispatching frame {frame!r:.200}")
+
+    async def dispatch_frame(self, frame):
+        data = json.loads(frame) if isinstance(frame, (str, bytes)) else frame
+        positions = data.get("positions", [])
+        if len(positions) == 0:
+            return
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for item in positions:
+            try:
+                self.device_last_seen[item["deviceId"]] = now
+            except KeyError:
+                pass
+        try:
+            self.latest_lag = (now - parse_traccar_time(positions[-1]["serverTime"])).total_seconds()
+            self.maximum_lag = max(self.maximum_lag, self.latest_lag)
+        except (KeyError, ValueError):
+            pass
+        self.dispatched_positions += len(positions)
+        if len(self.processing_queues) == 1:
+            await self.put_processing_queue(0, data)
+            return
+        worker_positions = {}
+        for item in positions:
+            worker_positions.setdefault(worker_for_device(item["deviceId"], len(self.processing_queues)), []).append(
+                item
+            )
+        for worker, worker_position_list in worker_positions.items():
+            await self.put_processing_queue(worker, {"positions": worker_position_list})
 
-headers = {
-    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/51.0.2704.103 Safari/537.36"
-}
+    async def put_processing_queue(self, worker: int, data: Dict):
+        try:
+            self.processing_queues[worker].put_nowait(data)
+        except Full:
+            # Apply back pressure. The pending frames queue will fill up and drop frames if this persists.
+            await asyncio.to_thread(self.processing_queues[worker].put, data)
+
+    def processing_queue_depths(self) -> List[int]:
+        depths = []
+        for queue in self.processing_queues:
+            try:
+                depths.append(queue.qsize())
+            except NotImplementedError:
+                depths.append(-1)
+        return depths
+
+    async def print_messages_debug(self):
+        while True:
+            await asyncio.sleep(DEBUG_INTERVAL)
+            self.prune_device_last_seen()
+            metrics = {
+                "received_messages": self.received_messages,
+                "messages_per_second": self.received_messages / DEBUG_INTERVAL,
+                "dispatched_positions": self.dispatched_positions,
+                "dropped_frames": self.dropped_frames,
+                "pending_frames": self.pending_frames.qsize(),
+                "processing_queue_depths": self.processing_queue_depths(),
+                "latest_lag": self.latest_lag,
+                "maximum_lag": self.maximum_lag,
+            }
+            logger.debug(
+                f"Received {self.received_messages} messages last {DEBUG_INTERVAL:1f} seconds ({metrics['messages_per_second']:.2f} m/s), "
+                f"{self.dispatched_positions} positions, {self.dropped_frames} dropped frames, "
+                f"{metrics['pending_frames']} pending frames, processing queues {metrics['processing_queue_depths']}, "
+                f"lag {self.latest_lag:.1f} s (max {self.maximum_lag:.1f} s)"
+            )
+            await asyncio.to_thread(cache.set, POSITION_PROCESSOR_METRICS_KEY, metrics, 10 * DEBUG_INTERVAL)
+            self.received_messages = 0
+            self.dispatched_positions = 0
+            self.dropped_frames = 0
+            self.maximum_lag = 0.0
+
+    async def check_connection(self):
+        while True:
+            await asyncio.to_thread(self.check_connection_once)
+            await asyncio.sleep(CONNECTION_CHECK_INTERVAL)
+
+    def check_connection_once(self):
+        last_debug = cache.get(LAST_DEBUG_KEY)
+        disconnected_time = self.disconnected_time
+        if (
+            (disconnected_time and time.time() - disconnected_time > 300)
+            or not last_debug
+            or (time.time() - last_debug > 300)
+        ):
+            logger.debug("Something is fishy")
+            if disconnected_time and time.time() - disconnected_time > 300:
+                logger.error(
+                    f"Websocket has not been connected for 5 minutes, setting liveness probe to false to force a restart. {disconnected_time=}"
+                )
+            if not last_debug:
+                logger.error(f"Last debug time is not in the cache, setting liveness to false")
+            elif time.time() - last_debug > 300:
+                logger.error(f"Last debug time is {time.time()-last_debug} seconds old, setting liveness to false")
+            probes.liveness(False)
+        else:
+            probes.liveness(True)
 
-headers["Upgrade"] = "websocket"
 
 if __name__ == "__main__":
     """
     Incoming positions are first sent to the initial processor. The person or contestant is then forwarded  to the live
-    position transmitter process  to appear on the global map and on the air sports data feed.
+    position transmitter process  to appear on the global map and on the air sports data feed. The positions processed
+    by the calculators are sent to the tracking maps by the position fan out process.
     """
+    global_map_queue = Queue()
+    processing_queues = [Queue(maxsize=MAXIMUM_PROCESSOR_QUEUE_SIZE) for _ in range(POSITION_PROCESSOR_WORKERS)]
     django.db.connections.close_all()
     cache.clear()
     Process(
@@ -122,44 +314,16 @@ if __name__ == "__main__":
         daemon=True,
         name="live_position_transmitter",
     ).start()
+    Process(target=position_fan_out_process, daemon=True, name="position_fan_out").start()
 
-    logger.info(f"Creating initial processor")
-    Process(
-        target=initial_processor,
-        args=(processing_queue, global_map_queue),
-        daemon=False,
-        name="initial_processor",
-    ).start()
+    logger.info(f"Creating {len(processing_queues)} initial processors")
+    for index, processing_queue in enumerate(processing_queues):
+        Process(
+            target=initial_processor,
+            args=(processing_queue, global_map_queue),
+            daemon=False,
+            name=f"initial_processor_{index}",
+        ).start()
 
     probes.readiness(True)
-    check_connection()
-    print_messages_debug()
-    failed_connecting_count = 0
-    while True:
-        disconnected_time = time.time()
-        try:
-            traccar = Traccar.create_from_configuration()
-            cookies = traccar.session.cookies.get_dict()
-        except Exception:
-            logger.exception("Connection error connecting to traccar")
-            failed_connecting_count += 1
-            if failed_connecting_count >= FAILED_TRACCAR_CONNECTION_COUNT_LIMIT:
-                logger.error("Failed connecting to traccar %d consecutive times", failed_connecting_count)
-            time.sleep(5)
-            continue
-        field_connecting_count = 0
-        websocket.enableTrace(False)
-        logger.info("Initiating session and getting cookie")
-        ws = websocket.WebSocketApp(
-            "ws://{}/api/socket".format(traccar.address),
-            on_message=on_message,
-            on_error=on_error,
-            on_close=on_close,
-            on_open=on_open,
-            header=headers,
-            cookie="; ".join(["%s=%s" % (i, j) for i, j in cookies.items()]),
-        )
-        ws.run_forever(ping_interval=55)
-        failed_traccar_connection_count += 1
-        logger.warning(f"Websocket terminated for {failed_traccar_connection_count} consecutive time, restarting")
-        time.sleep(5)
+    asyncio.run(PositionProcessorFrontEnd(processing_queues).run())
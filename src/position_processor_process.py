@@ -8,21 +8,21 @@ from typing import List, Dict, Tuple, Optional
 
 import logging
 
-import multiprocessing
-
 import datetime
-import dateutil
 
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.mail import send_mail
 from urllib3.exceptions import ProtocolError
 
-from display.utilities.calculator_running_utilities import is_calculator_running, calculator_is_alive
+from display.utilities.calculator_running_utilities import (
+    is_calculator_running,
+    calculator_is_alive,
+    calculator_start_lock,
+)
 from display.utilities.calculator_termination_utilities import is_termination_requested
 from display.kubernetes_calculator.job_creator import JobCreator, AlreadyExists
-from display.utilities.tracking_definitions import TrackingService
 from live_tracking_map import settings
-from redis_queue import RedisQueue
+from redis_queue import create_position_queue
 
 if __name__ == "__main__":
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", "live_tracking_map.settings")
@@ -35,14 +35,16 @@ from django.db import connections, OperationalError, connection
 from display.calculators.contestant_processor import ContestantProcessor
 
 from display.models import Contestant
-from traccar_facade import Traccar
+from display.utilities.device_contestant_index import DeviceContestantIndex
+from traccar_facade import Traccar, parse_traccar_time
 
+device_contestant_index = DeviceContestantIndex()
+# The last seen time of the crew member that is tracked by a device is updated at most once every CACHE_TTL seconds
 CACHE_TTL = 60
-contestant_cache = {}
+crew_member_last_seen_updates: Dict[str, datetime.datetime] = {}
 
 logger = logging.getLogger(__name__)
 processes = {}
-calculator_lock = multiprocessing.Lock()
 CONTESTANT_TYPE = 0
 PERSON_TYPE = 1
 
@@ -65,39 +67,38 @@ def print_contestant_positions_debug():
         cache.set(LAST_DEBUG_KEY, last_debug, 10 * DEBUG_INTERVAL)
 
 
+def update_crew_member_last_seen(device_name: str, device_time: datetime.datetime):
+    last_update = crew_member_last_seen_updates.get(device_name)
+    if last_update is not None and device_time < last_update + datetime.timedelta(seconds=CACHE_TTL):
+        return
+    crew_member_last_seen_updates[device_name] = device_time
+    person = device_contestant_index.lookup_crew_member(device_name, device_time)
+    if person is not None:
+        person.last_seen = device_time
+        person.save(update_fields=["last_seen"])
+
+
 def cached_find_contestant(device_name: str, device_time: datetime.datetime) -> Tuple[Optional[Contestant], bool]:
-    try:
-        contestant, is_simulator, valid_to = contestant_cache[device_name]
-        if valid_to < device_time:
-            raise KeyError
-    except KeyError:
-        contestant, is_simulator = Contestant.get_contestant_for_device_at_time(
-            TrackingService.TRACCAR, device_name, device_time
-        )
-        if contestant:
-            logger.info(f"Found contestant for incoming position {contestant}{' (simulator)' if is_simulator else ''}")
-            if is_simulator and not contestant.has_been_tracked_by_simulator:
-                contestant.has_been_tracked_by_simulator = True
-                contestant.save(update_fields=("has_been_tracked_by_simulator",))
-
-        contestant_cache[device_name] = (
-            contestant,
-            is_simulator,
-            device_time
-            + min(
-                datetime.timedelta(seconds=CACHE_TTL),
-                (
-                    contestant.finished_by_time - device_time
-                    if contestant is not None
-                    else datetime.timedelta(seconds=CACHE_TTL)
-                ),
-            ),
-        )
-    if contestant and contestant.is_currently_tracked_by_device(device_name):
-        return contestant, is_simulator
+    contestant, is_simulator = device_contestant_index.lookup(device_name, device_time)
+    if contestant:
+        update_crew_member_last_seen(device_name, device_time)
+        if is_simulator and not contestant.has_been_tracked_by_simulator:
+            logger.info(f"Found contestant for incoming position {contestant} (simulator)")
+            contestant.has_been_tracked_by_simulator = True
+            contestant.save(update_fields=("has_been_tracked_by_simulator",))
+        if contestant.is_currently_tracked_by_device(device_name):
+            return contestant, is_simulator
     return None, is_simulator
 
 
+def worker_for_device(device_id: int, number_of_workers: int) -> int:
+    """
+    Select which initial processor worker handles positions from the device. All positions from a device are handled
+    by the same worker so that the ordering of the positions is preserved.
+    """
+    return device_id % number_of_workers
+
+
 def clean_db_positions():
     for c in connections.all():
         c.close_if_unusable_or_obsolete()
@@ -116,6 +117,7 @@ def initial_processor(queue: Queue, global_map_queue: Queue):
             time.sleep(5)
     while True:
         clean_db_positions()
+        device_contestant_index.refresh_if_necessary()
         try:
             data = queue.get(timeout=DEBUG_INTERVAL)
             build_and_push_position_data(data, traccar, global_map_queue)
@@ -184,125 +186,155 @@ def retry(func, args, kwargs, ex_types=(Exception,), limit=0, wait_ms=100, wait_
             wait_ms *= wait_increase_ratio
 
 
-def add_positions_to_calculator(contestant: Contestant, positions: List):
-    global processes
+def start_calculator_if_necessary(contestant: Contestant):
+    """
+    Start a calculator for the contestant unless it is already running, or get a handle to the queue of a calculator
+    that has been started elsewhere. Must be called while holding the calculator start lock.
+    """
     key = contestant.pk
+    if key not in processes and is_calculator_running(key):
+        # The calculator has been started by another initial processor worker (or a celery task), so we only need
+        # a handle to its queue.
+        processes[key] = (create_position_queue(str(key)), None)
+    if key not in processes or not is_calculator_running(key):
+
+        def start_internal_calculator():
+            p = Process(target=calculator_process, args=(contestant.pk,), daemon=True)
+            calculator_is_alive(contestant.pk, 30)
+            p.start()
+            processes[key] = (q, p)
+
+        def start_kubernetes_job():
+            return retry(
+                creator.spawn_calculator_job,
+                (contestant.pk,),
+                {},
+                ex_types=(ProtocolError, RemoteDisconnected),
+                limit=5,
+                wait_ms=500,
+            )
 
-    with calculator_lock:
-        if key not in processes or not is_calculator_running(key):
-
-            def start_internal_calculator():
-                p = Process(target=calculator_process, args=(contestant.pk,), daemon=True)
-                calculator_is_alive(contestant.pk, 30)
-                p.start()
-                processes[key] = (q, p)
-
-            def start_kubernetes_job():
-                return retry(
-                    creator.spawn_calculator_job,
-                    (contestant.pk,),
-                    {},
-                    ex_types=(ProtocolError, RemoteDisconnected),
-                    limit=5,
-                    wait_ms=500,
-                )
+        def delete_kubernetes_job():
+            return retry(
+                creator.delete_calculator,
+                (contestant.pk,),
+                {},
+                ex_types=(ProtocolError, RemoteDisconnected),
+                limit=5,
+                wait_ms=500,
+            )
 
-            def delete_kubernetes_job():
-                return retry(
-                    creator.delete_calculator,
-                    (contestant.pk,),
-                    {},
-                    ex_types=(ProtocolError, RemoteDisconnected),
-                    limit=5,
-                    wait_ms=500,
+        q = create_position_queue(str(contestant.pk))
+        if settings.PRODUCTION:
+            # Create kubernetes job for the calculator
+            creator = JobCreator()
+            processes[key] = (q, None)
+            try:
+                response = start_kubernetes_job()
+                calculator_is_alive(contestant.pk, 300)  # Give it five minutes to spin up the kubernetes job
+                logger.info(f"Successfully created calculator job for {contestant}")
+            except AlreadyExists:
+                logger.warning(
+                    f"Tried to start existing calculator job for contestant {contestant}. Attempting to restart."
                 )
-
-            q = RedisQueue(str(contestant.pk))
-            if settings.PRODUCTION:
-                # Create kubernetes job for the calculator
-                creator = JobCreator()
-                processes[key] = (q, None)
+                try:
+                    delete_kubernetes_job()
+                except:
+                    logger.error(f"Failed the deleting calculator job for contestant {contestant}")
                 try:
                     response = start_kubernetes_job()
-                    calculator_is_alive(contestant.pk, 300)  # Give it five minutes to spin up the kubernetes job
+                    calculator_is_alive(contestant.pk, 300)
                     logger.info(f"Successfully created calculator job for {contestant}")
                 except AlreadyExists:
-                    logger.warning(
-                        f"Tried to start existing calculator job for contestant {contestant}. Attempting to restart."
+                    logger.warning(f"Tried to start existing calculator job for contestant {contestant}. Ignoring.")
+            except Exception as ex:
+                logger.exception(f"Failed starting kubernetes calculator job for {contestant}")
+                try:
+                    send_mail(
+                        "Failed starting kubernetes calculator job",
+                        f"Failed starting job for contestant {contestant}. Falling back to internal calculator.\n{ex}",
+                        None,
+                        ["frankose@ifi.uio.no"],
                     )
-                    try:
-                        delete_kubernetes_job()
-                    except:
-                        logger.error(f"Failed the deleting calculator job for contestant {contestant}")
-                    try:
-                        response = start_kubernetes_job()
-                        calculator_is_alive(contestant.pk, 300)
-                        logger.info(f"Successfully created calculator job for {contestant}")
-                    except AlreadyExists:
-                        logger.warning(f"Tried to start existing calculator job for contestant {contestant}. Ignoring.")
-                except Exception as ex:
-                    logger.exception(f"Failed starting kubernetes calculator job for {contestant}")
-                    try:
-                        send_mail(
-                            "Failed starting kubernetes calculator job",
-                            f"Failed starting job for contestant {contestant}. Falling back to internal calculator.\n{ex}",
-                            None,
-                            ["frankose@ifi.uio.no"],
-                        )
-                    except:
-                        logger.exception("Failed sending error email")
-                    # Create an internal process for the calculator
-                    connections.close_all()
-                    start_internal_calculator()
-            else:
+                except:
+                    logger.exception("Failed sending error email")
+                # Create an internal process for the calculator
+                connections.close_all()
                 start_internal_calculator()
+        else:
+            start_internal_calculator()
+
+
+def add_positions_to_calculator(contestant: Contestant, positions: List):
+    key = contestant.pk
+    # The start lock is only needed when the calculator may have to be started, not for every batch of positions
+    if key not in processes or not is_calculator_running(key):
+        with calculator_start_lock(key):
+            start_calculator_if_necessary(contestant)
     redis_queue = processes[key][0]
-    for position in positions:
-        # logger.debug(f"Adding position ID {position['id']} for device ID {position['deviceId']} to calculator")
-        redis_queue.append(position)
+    # logger.debug(f"Adding {len(positions)} positions to calculator for {contestant}")
+    redis_queue.append_many(positions)
 
 
 def cleanup_calculators():
     for key, (queue, process) in dict(processes).items():
-        if process and not process.is_alive():
+        # Calculators without a process are running elsewhere (another worker or a kubernetes job)
+        if (process and not process.is_alive()) or (process is None and not is_calculator_running(key)):
             processes.pop(key)
 
 
+def last_seen_key(device_id: int) -> str:
+    return f"last_seen_{device_id}"
+
+
 def map_positions_to_contestants(traccar: Traccar, positions: List, global_map_queue) -> Dict[Contestant, List[Dict]]:
     """
     Determine which contestant the position data belongs to. Forward the position with the associated person or
     contestant to the global queue.
+
+    The positions of a single websocket frame are handled as a batch. The last seen cache is read with a single
+    get_many and updated with a single set_many, and all the positions are forwarded to the global map queue as one
+    list instead of one queue item per position.
     """
     if len(positions) == 0:
         return {}
     # logger.info("Received {} positions".format(len(positions)))
-    received_tracks = {}
+    now = datetime.datetime.now(datetime.timezone.utc)
+    old_limit = now - datetime.timedelta(seconds=30)
+    too_old_limit = now - datetime.timedelta(hours=14)
+    candidates = []
     for position_data in positions:
         # logger.info("Incoming position: {}".format(position_data))
-        try:
-            device_name = traccar.device_map[position_data["deviceId"]]
-        except KeyError:
-            traccar.get_device_map()
-            try:
-                device_name = traccar.device_map[position_data["deviceId"]]
-            except KeyError:
-                logger.error("Could not find device {}.".format(position_data["deviceId"]))
-                continue
-        device_time = dateutil.parser.parse(position_data["deviceTime"])
+        device_name = traccar.get_device_name(position_data["deviceId"])
+        if device_name is None:
+            logger.error("Could not find device {}.".format(position_data["deviceId"]))
+            continue
         # Store this so that we do not have to parse the datetime string again
-        position_data["device_time"] = device_time
-        position_data["server_time"] = dateutil.parser.parse(position_data["serverTime"])
-        position_data["processor_received_time"] = datetime.datetime.now(datetime.timezone.utc)
-        now = datetime.datetime.now(datetime.timezone.utc)
-        last_seen_key = f"last_seen_{position_data['deviceId']}"
-        if (now - device_time).total_seconds() > 30:
-            # Only check the cache if the position is old
-            last_seen = cache.get(last_seen_key)
-            if last_seen == device_time or device_time < now - datetime.timedelta(hours=14):
-                # If we have seen it or it is really old, ignore it
-                logger.debug(f"Received repeated position, disregarding: {device_name} {device_time}")
-                continue
-        cache.set(last_seen_key, device_time)
+        position_data["device_time"] = parse_traccar_time(position_data["deviceTime"])
+        position_data["server_time"] = parse_traccar_time(position_data["serverTime"])
+        position_data["processor_received_time"] = now
+        candidates.append((device_name, position_data))
+    # Only check the cache for positions that are old
+    last_seen = cache.get_many(
+        {
+            last_seen_key(position_data["deviceId"])
+            for _, position_data in candidates
+            if position_data["device_time"] < old_limit
+        }
+    )
+    updated_last_seen = {}
+    received_tracks = {}
+    global_map_batch = []
+    for device_name, position_data in candidates:
+        device_time = position_data["device_time"]
+        key = last_seen_key(position_data["deviceId"])
+        if device_time < old_limit and (
+            updated_last_seen.get(key, last_seen.get(key)) == device_time or device_time < too_old_limit
+        ):
+            # If we have seen it or it is really old, ignore it
+            logger.debug(f"Received repeated position, disregarding: {device_name} {device_time}")
+            continue
+        updated_last_seen[key] = device_time
         # print(device_time)
         try:
             contestant, is_simulator = cached_find_contestant(device_name, device_time)
@@ -316,7 +348,7 @@ def map_positions_to_contestants(traccar: Traccar, positions: List, global_map_q
                 received_tracks[contestant].append(position_data)
             except KeyError:
                 received_tracks[contestant] = [position_data]
-            global_map_queue.put(
+            global_map_batch.append(
                 (
                     CONTESTANT_TYPE,
                     contestant.pk,
@@ -326,5 +358,9 @@ def map_positions_to_contestants(traccar: Traccar, positions: List, global_map_q
                 )
             )
         else:
-            global_map_queue.put((PERSON_TYPE, device_name, position_data, device_time, is_simulator))
+            global_map_batch.append((PERSON_TYPE, device_name, position_data, device_time, is_simulator))
+    if len(updated_last_seen) > 0:
+        cache.set_many(updated_last_seen)
+    if len(global_map_batch) > 0:
+        global_map_queue.put(global_map_batch)
     return received_tracks
@@ -0,0 +1,117 @@
+"""
+Compact binary encoding of traccar position dictionaries used on the calculator position queues.
+
+A position is encoded as a fixed struct of epoch millisecond times, float64 latitude and longitude, float32 altitude,
+speed, course and battery level, and an int64 position ID, followed by the device ID. The first byte is the format
+version so that the format can be changed without breaking calculators that are still running.
+"""
+import datetime
+import math
+import struct
+from typing import Dict, Optional
+
+END_OF_STREAM_VERSION = 0
+POSITION_FORMAT_VERSION = 1
+
+# version, device_time, server_time, processor_received_time, latitude, longitude, altitude, speed, course,
+# battery_level, id, device id type
+_POSITION_V1 = struct.Struct("<BqqqddffffqB")
+_INTEGER_DEVICE_ID = struct.Struct("<q")
+_INTEGER_DEVICE_ID_TYPE = 0
+_STRING_DEVICE_ID_TYPE = 1
+_NO_TIME = -(2**63)
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class UnknownPositionFormat(Exception):
+    pass
+
+
+def _encode_time(stamp: Optional[datetime.datetime]) -> int:
+    if stamp is None:
+        return _NO_TIME
+    return (stamp - _EPOCH) // datetime.timedelta(milliseconds=1)
+
+
+def _decode_time(milliseconds: int) -> Optional[datetime.datetime]:
+    if milliseconds == _NO_TIME:
+        return None
+    return _EPOCH + datetime.timedelta(milliseconds=milliseconds)
+
+
+def encode_position(position: Optional[Dict]) -> bytes:
+    """
+    Encode a position dictionary as produced by the position processor (or None, which signals the end of the
+    position stream to the calculator).
+    """
+    if position is None:
+        return bytes([END_OF_STREAM_VERSION])
+    device_id = position["deviceId"]
+    if isinstance(device_id, int):
+        device_id_type = _INTEGER_DEVICE_ID_TYPE
+        encoded_device_id = _INTEGER_DEVICE_ID.pack(device_id)
+    else:
+        device_id_type = _STRING_DEVICE_ID_TYPE
+        encoded_device_id = str(device_id).encode("utf-8")
+    battery_level = (position.get("attributes") or {}).get("batteryLevel")
+    return (
+        _POSITION_V1.pack(
+            POSITION_FORMAT_VERSION,
+            _encode_time(position["device_time"]),
+            _encode_time(position.get("server_time")),
+            _encode_time(position.get("processor_received_time")),
+            float(position["latitude"]),
+            float(position["longitude"]),
+            float(position["altitude"]),
+            float(position["speed"]),
+            float(position["course"]),
+            float(battery_level) if battery_level is not None else math.nan,
+            int(position["id"] or 0),
+            device_id_type,
+        )
+        + encoded_device_id
+    )
+
+
+def decode_position(data: bytes) -> Optional[Dict]:
+    """
+    Decode a position encoded with encode_position. Only the keys that are used by the calculator are restored.
+    """
+    version = data[0]
+    if version == END_OF_STREAM_VERSION:
+        return None
+    if version != POSITION_FORMAT_VERSION:
+        raise UnknownPositionFormat(f"Unknown position format version {version}")
+    (
+        _,
+        device_time,
+        server_time,
+        processor_received_time,
+        latitude,
+        longitude,
+        altitude,
+        speed,
+        course,
+        battery_level,
+        position_id,
+        device_id_type,
+    ) = _POSITION_V1.unpack_from(data)
+    encoded_device_id = data[_POSITION_V1.size :]
+    if device_id_type == _INTEGER_DEVICE_ID_TYPE:
+        device_id = _INTEGER_DEVICE_ID.unpack(encoded_device_id)[0]
+    else:
+        device_id = encoded_device_id.decode("utf-8")
+    return {
+        "id": position_id,
+        "deviceId": device_id,
+        "device_time": _decode_time(device_time),
+        "server_time": _decode_time(server_time),
+        "processor_received_time": _decode_time(processor_received_time),
+        "latitude": latitude,
+        "longitude": longitude,
+        "altitude": altitude,
+        "speed": speed,
+        "course": course,
+        "attributes": {"batteryLevel": battery_level} if not math.isnan(battery_level) else {},
+    }
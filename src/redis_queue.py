@@ -1,10 +1,17 @@
 import logging
 import pickle
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Tuple, Callable, Iterable, Container
 
 import redis
 
-from live_tracking_map.settings import REDIS_HOST, REDIS_PORT, REDIS_PASSWORD
+from live_tracking_map.settings import (
+    REDIS_HOST,
+    REDIS_PORT,
+    REDIS_PASSWORD,
+    CALCULATOR_POSITION_QUEUE_BACKEND,
+    CALCULATOR_POSITION_STREAM_MAXLEN,
+)
+from position_wire_format import encode_position, decode_position
 
 logger = logging.getLogger(__name__)
 
@@ -14,8 +21,17 @@ class RedisEmpty(Exception):
 
 
 class RedisQueue:
-    def __init__(self, queue_name: str, namespace: str = "contestant_processor_queue", subscribe: Dict = None):
+    def __init__(
+        self,
+        queue_name: str,
+        namespace: str = "contestant_processor_queue",
+        subscribe: Dict = None,
+        encoder: Callable[[Any], bytes] = pickle.dumps,
+        decoder: Callable[[bytes], Any] = pickle.loads,
+    ):
         self.queue_name = f"{namespace}:{queue_name}"
+        self.encoder = encoder
+        self.decoder = decoder
         try:
             logger.debug("Attempting to connect to {}:{}".format(REDIS_HOST, REDIS_PORT))
             self.redis_handle = redis.StrictRedis(REDIS_HOST, REDIS_PORT)#, password=REDIS_PASSWORD)
@@ -35,16 +51,28 @@ class RedisQueue:
 
     def append(self, item: Any):
         if self.redis_handle:
-            self.redis_handle.rpush(self.queue_name, pickle.dumps(item))
+            self.redis_handle.rpush(self.queue_name, self.encoder(item))
+
+    def append_many(self, items: Iterable[Any]):
+        """
+        Append all the items to the queue with a single RPUSH
+        """
+        encoded = [self.encoder(item) for item in items]
+        if self.redis_handle and len(encoded) > 0:
+            self.redis_handle.rpush(self.queue_name, *encoded)
 
     def push(self, item: Any):
         if self.redis_handle:
-            self.redis_handle.lpush(self.queue_name, pickle.dumps(item))
+            self.redis_handle.lpush(self.queue_name, self.encoder(item))
 
     @property
     def size(self)->int:
         return self.redis_handle.llen(self.queue_name)
 
+    def clear(self):
+        if self.redis_handle:
+            self.redis_handle.delete(self.queue_name)
+
     def pop(self, blocking=False, timeout: float = 10) -> Any:
         if self.redis_handle:
             if not blocking:
@@ -57,11 +85,36 @@ class RedisQueue:
                     raise RedisEmpty
                 q, item = item
             try:
-                return pickle.loads(item)
+                return self.decoder(item)
             except:
                 logger.exception("Failed decoding queued item pop")
         return None
 
+    def pop_many(self, count: int, blocking=False, timeout: float = 10) -> List[Any]:
+        """
+        Pop up to count items from the queue with a single LPOP. If blocking, wait up to timeout seconds for the first
+        item to arrive. Items that cannot be decoded are discarded.
+        """
+        if not self.redis_handle:
+            return []
+        items = self.redis_handle.lpop(self.queue_name, count)
+        if items is None:
+            if not blocking:
+                raise RedisEmpty
+            item = self.redis_handle.blpop([self.queue_name], timeout=timeout)
+            if item is None:
+                raise RedisEmpty
+            items = [item[1]]
+            if count > 1:
+                items.extend(self.redis_handle.lpop(self.queue_name, count - 1) or [])
+        decoded = []
+        for item in items:
+            try:
+                decoded.append(self.decoder(item))
+            except:
+                logger.exception("Failed decoding queued item pop")
+        return decoded
+
     def peek(self) -> Any:
         # logger.debug("Peak {}".format(self.queue_name))
         if self.redis_handle:
@@ -70,7 +123,7 @@ class RedisQueue:
             if item is None:
                 raise RedisEmpty
             try:
-                return pickle.loads(item)
+                return self.decoder(item)
             except:
                 logger.exception("Failed decoding queued item peek")
         return None
@@ -81,3 +134,202 @@ class RedisQueue:
             return False
         except RedisEmpty:
             return True
+
+    def replay_history(self) -> List[Any]:
+        """
+        Return items that have already been consumed from the queue. Items are removed from a list when they are
+        popped, so there is never any history.
+        """
+        return []
+
+    def append_history(self, items: Iterable[Any]):
+        """
+        Record items that the consumer received from somewhere else than the queue. A list has no history, so nothing
+        is stored.
+        """
+        pass
+
+    def acknowledge(self, items: Iterable[Any]):
+        """
+        Acknowledge that popped items have been processed. Items are removed from a list when they are popped, so
+        there is nothing to acknowledge.
+        """
+        pass
+
+
+class PositionQueue(RedisQueue):
+    """
+    Queue of traccar positions for a calculator. Positions are stored in the compact format from position_wire_format
+    instead of being pickled.
+    """
+
+    def __init__(self, queue_name: str, namespace: str = "contestant_processor_queue"):
+        super().__init__(queue_name, namespace, encoder=encode_position, decoder=decode_position)
+
+
+class PositionStream:
+    """
+    Calculator position queue built on a redis stream. It has the same interface as PositionQueue, but items are not
+    removed from the stream when they are read. The stream is consumed through a consumer group, so a calculator that
+    is restarted can replay everything that was read by the previous instance (see replay_history) and then continue
+    reading after the last item that was delivered. Items stay pending in the group until the calculator has scored
+    them and calls acknowledge.
+
+    Positions that the calculator fetches from traccar (at start-up and when filling gaps) are recorded in a separate
+    history stream with append_history, so that the replay holds the complete track. Both streams are capped to
+    approximately maxlen items.
+    """
+
+    GROUP_NAME = "calculator"
+    CONSUMER_NAME = "calculator"
+    FIELD = b"p"
+    STREAM_ID_KEY = "stream_id"
+
+    def __init__(
+        self,
+        queue_name: str,
+        namespace: str = "contestant_processor_stream",
+        maxlen: int = CALCULATOR_POSITION_STREAM_MAXLEN,
+    ):
+        self.queue_name = f"{namespace}:{queue_name}"
+        self.history_name = f"{self.queue_name}:history"
+        self.maxlen = maxlen
+        self.redis_handle = redis.StrictRedis(REDIS_HOST, REDIS_PORT)  # , password=REDIS_PASSWORD)
+        self.group_created = False
+        logger.info(
+            "Connected PositionStream to {}:{} with the stream {}".format(REDIS_HOST, REDIS_PORT, self.queue_name)
+        )
+
+    def _ensure_group(self):
+        if self.group_created:
+            return
+        try:
+            # Start at the beginning of the stream so that positions added before the calculator started are read
+            self.redis_handle.xgroup_create(self.queue_name, self.GROUP_NAME, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self.group_created = True
+
+    def _decode(self, entries: List[Tuple[bytes, Dict]], unacknowledged: Container[bytes] = ()) -> List[Any]:
+        """
+        Decode the stream entries. Positions from the entries in unacknowledged are given the stream ID of the entry,
+        so that they can be acknowledged when they have been processed.
+        """
+        decoded = []
+        for entry_id, fields in entries:
+            try:
+                position = decode_position(fields[self.FIELD])
+            except:
+                logger.exception("Failed decoding stream item")
+                continue
+            if position is not None and entry_id in unacknowledged:
+                position[self.STREAM_ID_KEY] = entry_id
+            decoded.append(position)
+        return decoded
+
+    def _read_range(self, stream_name: str, end: Any) -> List[Tuple[bytes, Dict]]:
+        entries = []
+        start = "-"
+        while batch := self.redis_handle.xrange(stream_name, start, end, count=1000):
+            entries.extend(batch)
+            start = b"(" + batch[-1][0]
+        return entries
+
+    def append(self, item: Any):
+        self.redis_handle.xadd(
+            self.queue_name, {self.FIELD: encode_position(item)}, maxlen=self.maxlen, approximate=True
+        )
+
+    def append_many(self, items: Iterable[Any]):
+        pipeline = self.redis_handle.pipeline(transaction=False)
+        for item in items:
+            pipeline.xadd(self.queue_name, {self.FIELD: encode_position(item)}, maxlen=self.maxlen, approximate=True)
+        pipeline.execute()
+
+    def append_history(self, items: Iterable[Any]):
+        """
+        Record positions that the calculator has fetched from traccar, so that they are part of the replay if the
+        calculator is restarted. The positions are not delivered through pop_many.
+        """
+        pipeline = self.redis_handle.pipeline(transaction=False)
+        for item in items:
+            pipeline.xadd(
+                self.history_name, {self.FIELD: encode_position(item)}, maxlen=self.maxlen, approximate=True
+            )
+        pipeline.execute()
+
+    @property
+    def size(self) -> int:
+        return self.redis_handle.xlen(self.queue_name)
+
+    def clear(self):
+        self.redis_handle.delete(self.queue_name, self.history_name)
+        self.group_created = False
+
+    def pop_many(self, count: int, blocking=False, timeout: float = 10) -> List[Any]:
+        """
+        Read up to count items that have not yet been delivered to the calculator. The items stay pending until they
+        are passed to acknowledge.
+        """
+        self._ensure_group()
+        response = self.redis_handle.xreadgroup(
+            self.GROUP_NAME,
+            self.CONSUMER_NAME,
+            {self.queue_name: ">"},
+            count=count,
+            block=int(timeout * 1000) if blocking else None,
+        )
+        if not response or len(response[0][1]) == 0:
+            raise RedisEmpty
+        entries = response[0][1]
+        return self._decode(entries, {entry_id for entry_id, _ in entries})
+
+    def pop(self, blocking=False, timeout: float = 10) -> Any:
+        items = self.pop_many(1, blocking, timeout)
+        if len(items) == 0:
+            # The item could not be decoded
+            raise RedisEmpty
+        return items[0]
+
+    def acknowledge(self, items: Iterable[Any]):
+        """
+        Acknowledge positions returned by pop_many or replay_history when the calculator has scored them. Positions
+        that have no pending stream entry are ignored.
+        """
+        entry_ids = [item[self.STREAM_ID_KEY] for item in items if item is not None and self.STREAM_ID_KEY in item]
+        if len(entry_ids) > 0:
+            self.redis_handle.xack(self.queue_name, self.GROUP_NAME, *entry_ids)
+
+    def replay_history(self) -> List[Any]:
+        """
+        Return all the positions that have been delivered to a previous instance of the calculator, together with the
+        positions it recorded with append_history, so that a restarted calculator can rebuild its state without
+        fetching the track from traccar. Positions that were delivered but never acknowledged keep their stream ID and
+        must be acknowledged when they have been scored.
+        """
+        self._ensure_group()
+        last_delivered = None
+        for group in self.redis_handle.xinfo_groups(self.queue_name):
+            if group["name"] in (self.GROUP_NAME, self.GROUP_NAME.encode()):
+                last_delivered = group["last-delivered-id"]
+        if last_delivered in (None, b"0-0", "0-0"):
+            return []
+        unacknowledged = set()
+        start = "-"
+        while pending := self.redis_handle.xpending_range(self.queue_name, self.GROUP_NAME, start, "+", 1000):
+            unacknowledged.update(item["message_id"] for item in pending)
+            start = b"(" + pending[-1]["message_id"]
+        history = self._decode(self._read_range(self.queue_name, last_delivered), unacknowledged)
+        history.extend(self._decode(self._read_range(self.history_name, "+")))
+        # The end of stream marker has no meaning when replaying
+        return [item for item in history if item is not None]
+
+
+def create_position_queue(queue_name: str):
+    """
+    Create the position queue for a calculator using the backend given by CALCULATOR_POSITION_QUEUE_BACKEND
+    """
+    if CALCULATOR_POSITION_QUEUE_BACKEND == "stream":
+        return PositionStream(queue_name)
+    return PositionQueue(queue_name)
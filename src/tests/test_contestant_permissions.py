@@ -672,3 +672,70 @@ class TestAccessNavigationTask(APITestCase):
         result = self.client.get(url)
         print(result)
         self.assertEqual(result.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_navigation_task_snapshot_as_creator(self, *args):
+        self.client.force_login(user=self.user_owner)
+        url = reverse(
+            "navigationtasks-snapshot", kwargs={"contest_pk": self.contest_id, "pk": self.navigation_task.id}
+        )
+        result = self.client.get(url)
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        contestants = result.json()["contestants"]
+        self.assertEqual(1, len(contestants))
+        self.assertEqual(self.contestant.pk, contestants[0]["contestant_id"])
+        self.assertListEqual([], contestants[0]["track"])
+
+    def test_navigation_task_snapshot_shows_score_changes_after_finishing(self, *args):
+        self.contestant.contestanttrack.set_calculator_finished()
+        self.client.force_login(user=self.user_owner)
+        url = reverse(
+            "navigationtasks-snapshot", kwargs={"contest_pk": self.contest_id, "pk": self.navigation_task.id}
+        )
+        self.client.get(url)
+        self.contestant.contestanttrack.update_score(17)
+        result = self.client.get(url)
+        self.assertEqual(17, result.json()["contestants"][0]["contestant_track"]["score"])
+
+    def test_navigation_task_snapshot_as_someone_else(self, *args):
+        self.client.force_login(user=self.user_someone_else)
+        url = reverse(
+            "navigationtasks-snapshot", kwargs={"contest_pk": self.contest_id, "pk": self.navigation_task.id}
+        )
+        result = self.client.get(url)
+        self.assertEqual(result.status_code, status.HTTP_404_NOT_FOUND)
+
+    def binary_track_url(self) -> str:
+        return reverse(
+            "contestants-track-binary",
+            kwargs={
+                "contest_pk": self.contest_id,
+                "navigationtask_pk": self.navigation_task.id,
+                "pk": self.contestant.pk,
+            },
+        )
+
+    def test_contestant_binary_track_as_creator(self, *args):
+        self.client.force_login(user=self.user_owner)
+        result = self.client.get(self.binary_track_url())
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"ATRK", result.content[:4])
+
+    def test_contestant_binary_track_as_someone_else(self, *args):
+        self.client.force_login(user=self.user_someone_else)
+        result = self.client.get(self.binary_track_url())
+        self.assertEqual(result.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_contestant_binary_track_finished_is_only_cached_privately(self, *args):
+        self.contestant.contestanttrack.set_calculator_finished()
+        self.client.force_login(user=self.user_owner)
+        result = self.client.get(self.binary_track_url(), {"track_version": self.contestant.track_version})
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertIn("private", result["Cache-Control"])
+        self.assertNotIn("public", result["Cache-Control"])
+        etag = result["ETag"]
+        result = self.client.get(self.binary_track_url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(result.status_code, status.HTTP_304_NOT_MODIFIED)
+        # A decimated track is a different representation
+        result = self.client.get(self.binary_track_url(), {"max_points": 10}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(etag, result["ETag"])
@@ -0,0 +1,200 @@
+import math
+import time
+from unittest import TestCase
+
+from global_position_store import (
+    ALL_TRAFFIC_SUBSCRIBERS_KEY,
+    GLOBAL_POSITION_LOCATIONS_KEY,
+    GLOBAL_POSITION_TIMES_KEY,
+    MAXIMUM_GEO_LATITUDE,
+    GlobalPositionStore,
+    StoredPosition,
+)
+from live_tracking_map.settings import PURGE_GLOBAL_MAP_INTERVAL, REDIS_GLOBAL_POSITIONS_KEY
+
+
+def to_bytes(value) -> bytes:
+    return value if isinstance(value, bytes) else str(value).encode("utf-8")
+
+
+class FakePipeline:
+    def __init__(self, redis: "FakeRedis"):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return command
+
+    def execute(self):
+        results = [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+        self.commands = []
+        self.redis.round_trips += 1
+        return results
+
+
+class FakeRedis:
+    """
+    The subset of the redis commands used by GlobalPositionStore, with the same return types as redis-py
+    """
+
+    def __init__(self):
+        self.hashes = {}
+        self.sorted_sets = {}
+        self.locations = {}
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def hset(self, name, mapping):
+        self.hashes.setdefault(name, {}).update({to_bytes(key): to_bytes(value) for key, value in mapping.items()})
+
+    def hmget(self, name, keys):
+        return [self.hashes.get(name, {}).get(to_bytes(key)) for key in keys]
+
+    def hdel(self, name, *keys):
+        for key in keys:
+            self.hashes.get(name, {}).pop(to_bytes(key), None)
+
+    def zadd(self, name, mapping):
+        self.sorted_sets.setdefault(name, {}).update({to_bytes(key): float(value) for key, value in mapping.items()})
+
+    def zscore(self, name, key):
+        return self.sorted_sets.get(name, {}).get(to_bytes(key))
+
+    def zmscore(self, name, keys):
+        return [self.zscore(name, key) for key in keys]
+
+    def zcard(self, name):
+        return len(self.sorted_sets.get(name, {}))
+
+    def zrangebyscore(self, name, minimum, maximum):
+        minimum = -math.inf if minimum == "-inf" else minimum
+        return [key for key, score in self.sorted_sets.get(name, {}).items() if minimum <= score <= maximum]
+
+    def zremrangebyscore(self, name, minimum, maximum):
+        for key in self.zrangebyscore(name, minimum, maximum):
+            del self.sorted_sets[name][key]
+
+    def zrem(self, name, *keys):
+        locations = self.locations if name == GLOBAL_POSITION_LOCATIONS_KEY else self.sorted_sets.get(name, {})
+        for key in keys:
+            locations.pop(to_bytes(key), None)
+
+    def geoadd(self, name, values):
+        for index in range(0, len(values), 3):
+            longitude, latitude, member = values[index : index + 3]
+            if abs(latitude) > MAXIMUM_GEO_LATITUDE:
+                raise ValueError("invalid longitude,latitude pair")
+            self.locations[to_bytes(member)] = (latitude, longitude)
+
+    def geosearch(self, name, longitude, latitude, radius, unit):
+        def distance(position):
+            # Equirectangular approximation, good enough for short distances
+            x = math.radians(position[1] - longitude) * math.cos(math.radians((position[0] + latitude) / 2))
+            y = math.radians(position[0] - latitude)
+            return 6372797.560856 * math.hypot(x, y)
+
+        return [member for member, position in self.locations.items() if distance(position) <= radius]
+
+    def delete(self, *names):
+        for name in names:
+            self.hashes.pop(name, None)
+            self.sorted_sets.pop(name, None)
+            if name == GLOBAL_POSITION_LOCATIONS_KEY:
+                self.locations = {}
+
+
+def stored_position(device_id, time_stamp, latitude=60.0, longitude=11.0) -> StoredPosition:
+    return StoredPosition(device_id, time_stamp, latitude, longitude, f'{{"id": "{device_id}", "t": {time_stamp}}}')
+
+
+class TestGlobalPositionStore(TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.store = GlobalPositionStore(self.redis)
+        # Do not purge while storing unless a test asks for it
+        self.store.last_purge = time.time()
+        self.now = time.time()
+
+    def test_store_and_find_positions(self):
+        stored = self.store.store_positions(
+            [stored_position(1, self.now), stored_position("abc", self.now, 60.01, 11.01)]
+        )
+        self.assertEqual(2, len(stored))
+        self.assertEqual(2, self.redis.round_trips)
+        found = dict(self.store.positions_in_radius(60, 11, 5000))
+        self.assertSetEqual({"1", "abc"}, set(found.keys()))
+        self.assertEqual(stored_position("abc", self.now).data, found["abc"])
+
+    def test_only_newer_positions_are_stored(self):
+        self.store.store_positions([stored_position(1, self.now)])
+        stored = self.store.store_positions([stored_position(1, self.now - 10), stored_position(2, self.now - 10)])
+        self.assertListEqual([stored_position(2, self.now - 10)], stored)
+        self.assertEqual(self.now, self.redis.zscore(GLOBAL_POSITION_TIMES_KEY, "1"))
+
+    def test_older_positions_are_stored_when_requested(self):
+        self.store.store_positions([stored_position(1, self.now)])
+        stored = self.store.store_positions([stored_position(1, self.now - 10)], only_newer=False)
+        self.assertEqual(1, len(stored))
+        self.assertEqual(self.now - 10, self.redis.zscore(GLOBAL_POSITION_TIMES_KEY, "1"))
+
+    def test_last_position_in_batch_is_kept(self):
+        stored = self.store.store_positions([stored_position(1, self.now - 1), stored_position(1, self.now)])
+        self.assertListEqual([stored_position(1, self.now)], stored)
+
+    def test_empty_batch(self):
+        self.assertListEqual([], self.store.store_positions([]))
+        self.assertEqual(0, self.redis.round_trips)
+
+    def test_polar_latitude_is_clamped_in_geo_index(self):
+        self.store.store_positions([stored_position(1, self.now, 89.5, 11)])
+        self.assertAlmostEqual(MAXIMUM_GEO_LATITUDE, self.redis.locations[b"1"][0])
+        # The stored position itself is not changed
+        self.assertIn(b"1", self.redis.hashes[REDIS_GLOBAL_POSITIONS_KEY])
+
+    def test_purge_removes_stale_positions(self):
+        self.store.store_positions(
+            [stored_position(1, self.now - PURGE_GLOBAL_MAP_INTERVAL - 10), stored_position(2, self.now)]
+        )
+        self.assertEqual(1, self.store.purge())
+        self.assertNotIn(b"1", self.redis.hashes[REDIS_GLOBAL_POSITIONS_KEY])
+        self.assertNotIn(b"1", self.redis.locations)
+        self.assertIsNone(self.redis.zscore(GLOBAL_POSITION_TIMES_KEY, "1"))
+        self.assertListEqual(["2"], [device_id for device_id, _ in self.store.positions_in_radius(60, 11, 1000)])
+
+    def test_positions_in_radius_skips_stale_and_distant_positions(self):
+        self.store.store_positions(
+            [
+                stored_position(1, self.now),
+                stored_position(2, self.now - PURGE_GLOBAL_MAP_INTERVAL - 10),
+                stored_position(3, self.now, 61, 11),
+            ]
+        )
+        self.assertListEqual(["1"], [device_id for device_id, _ in self.store.positions_in_radius(60, 11, 50000)])
+        self.assertListEqual([], self.store.positions_in_radius(-60, 11, 50000))
+
+    def test_clear(self):
+        self.store.store_positions([stored_position(1, self.now)])
+        self.store.clear()
+        self.assertListEqual([], self.store.positions_in_radius(60, 11, 1000))
+
+    def test_all_traffic_subscribers(self):
+        self.assertFalse(self.store.has_all_traffic_subscribers())
+        self.store.subscribe_all_traffic("channel")
+        # The answer is cached
+        self.assertFalse(self.store.has_all_traffic_subscribers())
+        self.store.last_subscriber_check = 0
+        self.assertTrue(self.store.has_all_traffic_subscribers())
+        self.store.unsubscribe_all_traffic("channel")
+        self.store.last_subscriber_check = 0
+        self.assertFalse(self.store.has_all_traffic_subscribers())
+
+    def test_expired_all_traffic_subscriptions_are_removed(self):
+        self.redis.zadd(ALL_TRAFFIC_SUBSCRIBERS_KEY, {"channel": time.time() - 1})
+        self.assertFalse(self.store.has_all_traffic_subscribers())
+        self.assertEqual(0, self.redis.zcard(ALL_TRAFFIC_SUBSCRIBERS_KEY))
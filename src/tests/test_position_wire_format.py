@@ -0,0 +1,67 @@
+import datetime
+from unittest import TestCase
+
+from position_wire_format import encode_position, decode_position, UnknownPositionFormat
+
+POSITION = {
+    "id": 4565767,
+    "attributes": {"batteryLevel": 53.0, "distance": 80.05, "totalDistance": 355900.28, "motion": True},
+    "deviceId": 11942,
+    "protocol": "osmand",
+    "serverTime": "2021-09-17T10:56:54.000+00:00",
+    "deviceTime": "2021-09-17T10:55:03.000+00:00",
+    "latitude": 52.82202,
+    "longitude": 8.7318365,
+    "altitude": 455.001,
+    "speed": 77.2231,
+    "course": 214.099,
+    "device_time": datetime.datetime(2021, 9, 17, 10, 55, 3, 123000, tzinfo=datetime.timezone.utc),
+    "server_time": datetime.datetime(2021, 9, 17, 10, 56, 54, tzinfo=datetime.timezone.utc),
+    "processor_received_time": datetime.datetime(2021, 9, 17, 10, 56, 54, 500000, tzinfo=datetime.timezone.utc),
+}
+
+
+class TestPositionWireFormat(TestCase):
+    def test_round_trip(self):
+        decoded = decode_position(encode_position(POSITION))
+        self.assertEqual(POSITION["id"], decoded["id"])
+        self.assertEqual(POSITION["deviceId"], decoded["deviceId"])
+        self.assertEqual(POSITION["device_time"], decoded["device_time"])
+        self.assertEqual(POSITION["server_time"], decoded["server_time"])
+        self.assertEqual(POSITION["processor_received_time"], decoded["processor_received_time"])
+        self.assertEqual(POSITION["latitude"], decoded["latitude"])
+        self.assertEqual(POSITION["longitude"], decoded["longitude"])
+        self.assertAlmostEqual(POSITION["altitude"], decoded["altitude"], places=3)
+        self.assertAlmostEqual(POSITION["speed"], decoded["speed"], places=4)
+        self.assertAlmostEqual(POSITION["course"], decoded["course"], places=4)
+        self.assertEqual({"batteryLevel": 53.0}, decoded["attributes"])
+
+    def test_string_device_id_and_missing_values(self):
+        position = {
+            "id": 0,
+            "deviceId": "Test contestant",
+            "latitude": 60,
+            "longitude": 11,
+            "altitude": 0,
+            "speed": 0,
+            "course": 0,
+            "attributes": {},
+            "device_time": POSITION["device_time"],
+        }
+        decoded = decode_position(encode_position(position))
+        self.assertEqual("Test contestant", decoded["deviceId"])
+        self.assertIsNone(decoded["server_time"])
+        self.assertIsNone(decoded["processor_received_time"])
+        self.assertEqual({}, decoded["attributes"])
+
+    def test_end_of_stream(self):
+        self.assertIsNone(decode_position(encode_position(None)))
+
+    def test_unknown_version(self):
+        with self.assertRaises(UnknownPositionFormat):
+            decode_position(bytes([255]) + encode_position(POSITION)[1:])
+
+    def test_smaller_than_pickle(self):
+        import pickle
+
+        self.assertLess(len(encode_position(POSITION)) * 4, len(pickle.dumps(POSITION)))
@@ -0,0 +1,106 @@
+import datetime
+import time
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from traccar_facade import parse_traccar_time, Traccar, UNKNOWN_DEVICE_TTL, FAILED_DEVICE_LOOKUP_TTL
+
+
+class TestParseTraccarTime(TestCase):
+    def test_parse_traccar_format(self):
+        self.assertEqual(
+            datetime.datetime(2021, 9, 17, 10, 55, 3, tzinfo=datetime.timezone.utc),
+            parse_traccar_time("2021-09-17T10:55:03.000+00:00"),
+        )
+
+    def test_parse_zulu_format(self):
+        self.assertEqual(
+            datetime.datetime(2021, 9, 17, 10, 55, 3, 500000, tzinfo=datetime.timezone.utc),
+            parse_traccar_time("2021-09-17T10:55:03.5Z"),
+        )
+
+    def test_parse_offset(self):
+        self.assertEqual(
+            datetime.datetime(2021, 9, 17, 8, 55, 3, tzinfo=datetime.timezone.utc),
+            parse_traccar_time("2021-09-17T10:55:03.000+02:00"),
+        )
+
+
+class TestGetPositionsForDevices(TestCase):
+    def setUp(self):
+        self.traccar = Traccar("http", "traccar:8082", "user", "password")
+        self.traccar._session = Mock()
+        self.traccar.last_session_time = time.time()
+        self.start = datetime.datetime(2021, 9, 17, 10, tzinfo=datetime.timezone.utc)
+        self.finish = datetime.datetime(2021, 9, 17, 11, tzinfo=datetime.timezone.utc)
+
+    def test_positions_for_each_device(self):
+        with patch.object(
+            self.traccar, "get_positions_for_device_id", side_effect=lambda device_id, start, finish: [{"deviceId": device_id}]
+        ) as get_positions:
+            positions = self.traccar.get_positions_for_devices([1, 2, 3, 2], self.start, self.finish)
+        self.assertDictEqual({1: [{"deviceId": 1}], 2: [{"deviceId": 2}], 3: [{"deviceId": 3}]}, positions)
+        self.assertEqual(3, get_positions.call_count)
+
+    def test_failed_device_is_empty(self):
+        def get_positions(device_id, start, finish):
+            if device_id == 2:
+                raise ConnectionError
+            return [{"deviceId": device_id}]
+
+        with patch.object(self.traccar, "get_positions_for_device_id", side_effect=get_positions):
+            positions = self.traccar.get_positions_for_devices([1, 2], self.start, self.finish)
+        self.assertDictEqual({1: [{"deviceId": 1}], 2: []}, positions)
+
+    def test_no_devices(self):
+        self.assertDictEqual({}, self.traccar.get_positions_for_devices([], self.start, self.finish))
+
+    def test_shared_group_id_is_memoised(self):
+        with patch.object(self.traccar, "get_groups", return_value=[{"name": "GlobalDevices", "id": 7}]) as get_groups:
+            self.assertEqual(7, self.traccar.get_shared_group_id())
+            self.assertEqual(7, self.traccar.get_shared_group_id())
+        get_groups.assert_called_once()
+
+
+class TestDeviceLookup(TestCase):
+    def setUp(self):
+        self.traccar = Traccar("http", "traccar:8082", "user", "password")
+        self.traccar._session = Mock()
+        self.traccar.last_session_time = time.time()
+
+    def respond(self, devices):
+        self.traccar._session.get.return_value = Mock(status_code=200, json=Mock(return_value=devices))
+
+    def test_known_device_is_not_fetched(self):
+        self.traccar.device_map = {1: "abc"}
+        self.assertEqual("abc", self.traccar.get_device_name(1))
+        self.traccar._session.get.assert_not_called()
+
+    def test_unknown_device_is_patched_into_map(self):
+        self.respond([{"id": 2, "uniqueId": "def"}])
+        self.assertEqual("def", self.traccar.get_device_name(2))
+        self.traccar._session.get.assert_called_once_with("http://traccar:8082/api/devices", params={"id": 2})
+        self.assertEqual(2, self.traccar.get_device_id("def"))
+        self.traccar._session.get.assert_called_once()
+
+    def test_missing_device_is_negatively_cached(self):
+        self.respond([])
+        self.assertIsNone(self.traccar.get_device_name(3))
+        self.assertIsNone(self.traccar.get_device_name(3))
+        self.traccar._session.get.assert_called_once()
+
+    def test_failed_lookup_is_cached_briefly(self):
+        self.traccar._session.get.return_value = Mock(status_code=400, text="Bad request")
+        self.assertIsNone(self.traccar.get_device_id("jkl"))
+        self.assertIsNone(self.traccar.get_device_id("jkl"))
+        self.traccar._session.get.assert_called_once()
+        self.traccar._unknown_unique_ids["jkl"] -= FAILED_DEVICE_LOOKUP_TTL
+        self.respond([{"id": 5, "uniqueId": "jkl"}])
+        self.assertEqual(5, self.traccar.get_device_id("jkl"))
+
+    def test_negative_cache_expires(self):
+        self.respond([])
+        self.assertIsNone(self.traccar.get_device_id("ghi"))
+        self.traccar._unknown_unique_ids["ghi"] -= UNKNOWN_DEVICE_TTL
+        self.respond([{"id": 4, "uniqueId": "ghi"}])
+        self.assertEqual(4, self.traccar.get_device_id("ghi"))
@@ -1,11 +1,15 @@
 import datetime
 import logging
+import threading
 import time
-from typing import List, Dict, TYPE_CHECKING, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, TYPE_CHECKING, Optional, Tuple, Iterable
 
 import requests
 from requests import Session
+from requests.adapters import HTTPAdapter
 from dateutil import parser
+from urllib3.util import Retry
 
 from live_tracking_map.settings import (
     TRACCAR_PROTOCOL,
@@ -21,6 +25,17 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 SESSION_LIFETIME = 3600
+# Number of connections kept open to traccar, which bounds the number of concurrent requests through the session
+CONNECTION_POOL_SIZE = 16
+# Idempotent requests are retried with exponential backoff (0.5, 1, 2 seconds) on connection errors and gateway errors
+REQUEST_RETRIES = 3
+REQUEST_BACKOFF_FACTOR = 0.5
+# Device IDs and unique IDs that are not known to traccar are not looked up again for this many seconds
+UNKNOWN_DEVICE_TTL = 60
+# Device lookups that failed (e.g. traccar errors) are not retried for this many seconds
+FAILED_DEVICE_LOOKUP_TTL = 10
+SHARED_GROUP_TTL = 3600
+SHARED_GROUP_NAME = "GlobalDevices"
 
 
 class Traccar:
@@ -32,8 +47,16 @@ class Traccar:
         self.base = "{}://{}".format(self.protocol, self.address)
         self.last_session_time = None
         self._session = None
+        self._session_lock = threading.Lock()
         self.device_map = {}
         self.unique_id_map = {}
+        # Single flight lock for device lookups, so that concurrent lookups of the same unknown device result in a
+        # single request to traccar
+        self._device_map_lock = threading.Lock()
+        self._unknown_device_ids: Dict[int, float] = {}
+        self._unknown_unique_ids: Dict[str, float] = {}
+        self._shared_group_id = None
+        self._shared_group_time = None
 
     @classmethod
     def create_from_configuration(cls) -> "Traccar":
@@ -46,17 +69,29 @@ class Traccar:
 
     @property
     def session(self) -> Session:
-        if not self._session or time.time() - SESSION_LIFETIME > self.last_session_time:
-            if self._session:
-                try:
-                    self._session.close()
-                except:
-                    logger.exception(f"Failed closing traccar session {self._session}")
-            self._session = self.get_authenticated_session()
-        return self._session
+        # The session is shared by the threads in get_positions_for_devices, make sure only one of them authenticates
+        with self._session_lock:
+            if not self._session or time.time() - SESSION_LIFETIME > self.last_session_time:
+                if self._session:
+                    try:
+                        self._session.close()
+                    except:
+                        logger.exception(f"Failed closing traccar session {self._session}")
+                self._session = self.get_authenticated_session()
+            return self._session
 
     def get_authenticated_session(self) -> Session:
         session = requests.Session()
+        retry = Retry(
+            total=REQUEST_RETRIES,
+            backoff_factor=REQUEST_BACKOFF_FACTOR,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=("GET", "HEAD"),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=CONNECTION_POOL_SIZE, max_retries=retry)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
         response = session.post(
             self.base + "/api/session",
             data={"email": self.username, "password": self.password},
@@ -117,19 +152,94 @@ class Traccar:
             logger.error(f"Failed fetching positions for device {device_id}, {response.text}")
             return []
 
+    def get_positions_for_devices(
+        self,
+        device_ids: Iterable[int],
+        start_time: datetime.datetime,
+        finish_time: datetime.datetime,
+        concurrency: int = CONNECTION_POOL_SIZE,
+    ) -> Dict[int, List[Dict]]:
+        """
+        Fetch positions for all the devices in the interval concurrently through the pooled session. Returns a
+        dictionary from device ID to the list of positions for the device (see get_positions_for_device_id). Devices
+        that could not be fetched have an empty list.
+        """
+        device_ids = list(dict.fromkeys(device_ids))
+        if len(device_ids) == 0:
+            return {}
+
+        def fetch(device_id: int) -> List[Dict]:
+            try:
+                return self.get_positions_for_device_id(device_id, start_time, finish_time)
+            except Exception:
+                logger.exception(f"Failed fetching positions for device {device_id}")
+                return []
+
+        if len(device_ids) == 1:
+            return {device_ids[0]: fetch(device_ids[0])}
+        # Authenticate before starting the threads
+        self.session
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(device_ids))) as executor:
+            return dict(zip(device_ids, executor.map(fetch, device_ids)))
+
     def get_device_ids_for_contestant(self, contestant: "Contestant") -> List[int]:
         devices = []
         for name in contestant.get_tracker_ids() + contestant.get_simulator_tracker_ids():
-            try:
-                devices.append(self.unique_id_map[name])
-            except KeyError:
-                self.get_device_map()
-                try:
-                    devices.append(self.unique_id_map[name])
-                except KeyError:
-                    logger.error(f"Failed to find device ID for unique ID {name}")
+            if (device_id := self.get_device_id(name)) is not None:
+                devices.append(device_id)
+            else:
+                logger.error(f"Failed to find device ID for unique ID {name}")
         return devices
 
+    def _add_devices_to_map(self, devices: List[Dict]):
+        for device in devices:
+            self.device_map[device["id"]] = device["uniqueId"]
+            self.unique_id_map[device["uniqueId"]] = device["id"]
+            self._unknown_device_ids.pop(device["id"], None)
+            self._unknown_unique_ids.pop(device["uniqueId"], None)
+
+    def _lookup_device(self, key, device_map: Dict, unknown: Dict, parameter: str):
+        """
+        Look up key in device_map, falling back to fetching the single device from traccar with a targeted request and
+        patching the maps. Keys that are not found in traccar are remembered for UNKNOWN_DEVICE_TTL seconds, and keys
+        that could not be looked up because of an error response for FAILED_DEVICE_LOOKUP_TTL seconds. unknown maps
+        each key to the time when it can be looked up again.
+        """
+        try:
+            return device_map[key]
+        except KeyError:
+            pass
+        if unknown.get(key, 0) > time.time():
+            return None
+        with self._device_map_lock:
+            # Another thread may have looked up the device while we were waiting for the lock
+            if key in device_map:
+                return device_map[key]
+            if unknown.get(key, 0) > time.time():
+                return None
+            response = self.session.get(self.base + "/api/devices", params={parameter: key})
+            if response.status_code != 200:
+                logger.error(f"Failed fetching device {parameter}={key} {response.status_code}: {response.text}")
+                unknown[key] = time.time() + FAILED_DEVICE_LOOKUP_TTL
+                return None
+            self._add_devices_to_map(response.json())
+            if key not in device_map:
+                unknown[key] = time.time() + UNKNOWN_DEVICE_TTL
+                return None
+            return device_map[key]
+
+    def get_device_name(self, device_id: int) -> Optional[str]:
+        """
+        Return the unique ID of the traccar device, or None if the device does not exist.
+        """
+        return self._lookup_device(device_id, self.device_map, self._unknown_device_ids, "id")
+
+    def get_device_id(self, unique_id: str) -> Optional[int]:
+        """
+        Return the traccar device ID for the unique ID, or None if the device does not exist.
+        """
+        return self._lookup_device(unique_id, self.unique_id_map, self._unknown_unique_ids, "uniqueId")
+
     def update_and_get_devices(self) -> Optional[List]:
         response = self.session.get(self.base + "/api/devices")
         try:
@@ -155,11 +265,22 @@ class Traccar:
             return response.json()
 
     def get_shared_group_id(self):
-        groups = self.get_groups()
-        for group in groups:
-            if group["name"] == "GlobalDevices":
-                return group["id"]
-        return self.create_group("GlobalDevices")["id"]
+        """
+        Return the ID of the group that all devices are added to. The ID is memoised for SHARED_GROUP_TTL seconds so
+        that the groups are not fetched every time a device is created.
+        """
+        if self._shared_group_id is not None and time.time() - self._shared_group_time < SHARED_GROUP_TTL:
+            return self._shared_group_id
+        group_id = None
+        for group in self.get_groups():
+            if group["name"] == SHARED_GROUP_NAME:
+                group_id = group["id"]
+                break
+        if group_id is None:
+            group_id = self.create_group(SHARED_GROUP_NAME)["id"]
+        self._shared_group_id = group_id
+        self._shared_group_time = time.time()
+        return group_id
 
     def create_device(self, device_name, identifier):
         response = self.session.post(
@@ -223,14 +344,31 @@ class Traccar:
         return devices
 
     def get_device_map(self):
+        """
+        Fetch all devices from traccar and rebuild device_map and unique_id_map
+        """
         if dmap := self.update_and_get_devices():
-            self.device_map = {item["id"]: item["uniqueId"] for item in dmap}
-            self.unique_id_map = {value: key for key, value in self.device_map.items()}
+            with self._device_map_lock:
+                self.device_map = {item["id"]: item["uniqueId"] for item in dmap}
+                self.unique_id_map = {value: key for key, value in self.device_map.items()}
+                self._unknown_device_ids.clear()
+                self._unknown_unique_ids.clear()
+
+
+def parse_traccar_time(time_string: str) -> datetime.datetime:
+    """
+    Parse a Traccar time stamp (e.g. "2021-09-17T10:55:03.000+00:00"). Traccar always uses the same fixed ISO format,
+    so the fast C implementation in datetime is used, falling back to dateutil for anything unexpected.
+    """
+    try:
+        return datetime.datetime.fromisoformat(time_string)
+    except ValueError:
+        return parser.parse(time_string)
 
 
 def augment_positions_from_traccar(positions):
     """Helper function to convert dates and update the existing objects."""
     for item in positions:
-        item["device_time"] = parser.parse(item["deviceTime"])
-        item["server_time"] = parser.parse(item["serverTime"])
+        item["device_time"] = parse_traccar_time(item["deviceTime"])
+        item["server_time"] = parse_traccar_time(item["serverTime"])
         item["calculator_received_time"] = datetime.datetime.now(datetime.timezone.utc)
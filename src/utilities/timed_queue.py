@@ -1,6 +1,10 @@
+import heapq
+import itertools
 import threading
+import time
 
 import datetime
+from typing import Any, Iterable, Optional, Tuple
 
 
 class TimedOut(BaseException):
@@ -8,48 +12,90 @@ class TimedOut(BaseException):
 
 
 class TimedQueue:
+    """
+    Queue where each item is released at a given time stamp. Items are kept in a heap ordered by release time, with a
+    monotonic sequence number as a tiebreaker so that items with the same release time are released in the order they
+    were added.
+    """
+
     def __init__(self):
-        self._ready_event = threading.Event()
-        self._lock = threading.Lock()
+        self._condition = threading.Condition()
         self._queue = []
+        self._sequence = itertools.count()
+        self._latest_release_time = None
         self._closed = False
 
+    def __len__(self) -> int:
+        return len(self._queue)
+
     def close(self):
-        self._closed = True
-        self._ready_event.set()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
 
     def put(self, data, stamp: datetime.datetime):
-        with self._lock:
-            self._queue.append((data, stamp))
-            # Should we sort the queue?
-            self._queue.sort(key=lambda i: i[1])
-            self._ready_event.set()
+        with self._condition:
+            heapq.heappush(self._queue, (stamp, next(self._sequence), data))
+            if self._latest_release_time is None or stamp > self._latest_release_time:
+                self._latest_release_time = stamp
+            self._condition.notify_all()
+
+    def put_many(self, items: Iterable[Tuple[Any, datetime.datetime]]):
+        """
+        Add all the (data, stamp) pairs to the queue
+        """
+        with self._condition:
+            entries = [(stamp, next(self._sequence), data) for data, stamp in items]
+            if len(entries) == 0:
+                return
+            if len(entries) > len(self._queue):
+                self._queue.extend(entries)
+                heapq.heapify(self._queue)
+            else:
+                for entry in entries:
+                    heapq.heappush(self._queue, entry)
+            latest = max(entry[0] for entry in entries)
+            if self._latest_release_time is None or latest > self._latest_release_time:
+                self._latest_release_time = latest
+            self._condition.notify_all()
+
+    def last_release_time(self) -> Optional[datetime.datetime]:
+        """
+        The latest release time of the items currently in the queue, or None if the queue is empty
+        """
+        with self._condition:
+            return self._latest_release_time
 
     def peek(self):
-        try:
-            return self._queue[0][0]
-        except IndexError:
-            return None
+        with self._condition:
+            try:
+                return self._queue[0][2]
+            except IndexError:
+                return None
 
     def get(self, timeout: float = None):
-        start = datetime.datetime.now(datetime.timezone.utc)
-        now = datetime.datetime.now(datetime.timezone.utc)
-        while True:
-            with self._lock:
-                if len(self._queue) == 0 and self._closed:
-                    return None
-                internal_timeout = max(0, (self._queue[0][1] - now).total_seconds()) if len(self._queue) > 0 else 10
-            if timeout is not None:
-                remaining_external_timeout = timeout - (now - start).total_seconds()
-                internal_timeout = min(remaining_external_timeout, internal_timeout)
-            self._ready_event.wait(timeout=internal_timeout)
-            self._ready_event.clear()
-            now = datetime.datetime.now(datetime.timezone.utc)
-            with self._lock:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            while True:
+                now = datetime.datetime.now(datetime.timezone.utc)
                 if len(self._queue) > 0:
-                    data, stamp = self._queue[0]
+                    stamp, _, data = self._queue[0]
                     if stamp < now:
-                        self._queue.pop(0)
+                        heapq.heappop(self._queue)
+                        if len(self._queue) == 0:
+                            self._latest_release_time = None
                         return data
-            if timeout is not None and (now - start).total_seconds() >= timeout:
-                raise TimedOut
+                    internal_timeout = (stamp - now).total_seconds()
+                elif self._closed:
+                    return None
+                else:
+                    internal_timeout = None
+                if deadline is not None:
+                    remaining_external_timeout = deadline - time.monotonic()
+                    if remaining_external_timeout <= 0:
+                        raise TimedOut
+                    if internal_timeout is None:
+                        internal_timeout = remaining_external_timeout
+                    else:
+                        internal_timeout = min(remaining_external_timeout, internal_timeout)
+                self._condition.wait(timeout=internal_timeout)
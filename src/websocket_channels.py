@@ -1,15 +1,25 @@
 import datetime
 import json
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
-import pickle
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from redis import StrictRedis
 
-from display.models import Contestant, Task, TaskTest, MyUser, Team, ANOMALY
+from display.models import (
+    Contestant,
+    Task,
+    TaskTest,
+    MyUser,
+    Team,
+    ANOMALY,
+    TrackAnnotation,
+    ScoreLogEntry,
+    GateCumulativeScore,
+)
 from display.models.contestant_utility_models import ContestantReceivedPosition
+from display.utilities.global_map_cells import GLOBAL_TRAFFIC_GROUP, cell_group_for_position
 from display.serialisers import (
     ContestantTrackSerialiser,
     TaskSerialiser,
@@ -25,10 +35,34 @@ from display.serialisers import (
     DangerLevelSerialiser,
     ContestantNestedTeamSerialiser,
 )
-from live_tracking_map.settings import REDIS_GLOBAL_POSITIONS_KEY, REDIS_HOST, REDIS_PORT
+from global_position_store import GlobalPositionStore, StoredPosition
+from live_tracking_map.settings import REDIS_HOST, REDIS_PORT
 
 logger = logging.getLogger(__name__)
 
+# Score log entries, annotations and gate scores are pushed to the front end as deltas. Every delta for a contestant
+# has a sequence number that is one larger than the previous one, so that the receiver can detect missing deltas and
+# request the complete state instead.
+SCORE_SEQUENCE_KEY = "score_sequence_{}"
+SCORE_SEQUENCE_TIMEOUT = 7 * 24 * 3600
+SCORE_DELTA = "score_delta"
+SCORE_SEQUENCE = "score_sequence"
+APPEND = "append"
+UPDATE = "update"
+DELETE = "delete"
+ANNOTATIONS = "annotations"
+SCORE_LOG_ENTRIES = "score_log_entries"
+GATE_SCORES = "gate_scores"
+
+# Positions transmitted by the calculators are buffered per navigation task and sent to the tracking consumers by the
+# position fan out every POSITION_FAN_OUT_INTERVAL seconds, one message per navigation task instead of one message per
+# contestant and calculator step.
+NAVIGATION_TASK_POSITIONS_KEY = "navigation_task_positions_{}"
+PENDING_NAVIGATION_TASK_POSITIONS_KEY = "pending_navigation_task_positions"
+POSITION_FAN_OUT_INTERVAL = 1
+MAXIMUM_BUFFERED_POSITION_BLOCKS = 2000
+BUFFERED_POSITION_BLOCKS_TIMEOUT = 60
+
 
 class DateTimeEncoder(json.JSONEncoder):
     """
@@ -55,6 +89,7 @@ def generate_contestant_data_block(
     gate_times: Dict = None,
     gate_distance_and_estimate: Dict = None,
     danger_level: Dict = None,
+    score_delta: Dict = None,
 ):
     data = {"contestant_id": contestant.id}
     data["positions"] = positions or []
@@ -74,104 +109,177 @@ def generate_contestant_data_block(
         data["danger_level"] = danger_level
     if contestant_track_data is not None:
         data["contestant_track"] = contestant_track_data
+    if score_delta is not None:
+        data["score_delta"] = score_delta
     if latest_time:
         data["progress"] = contestant.calculate_progress(latest_time)
     return data
 
 
+def tracking_message(message_type: str, channel_data, **metadata) -> Dict:
+    """
+    Create a channel layer message for the tracking consumer. The websocket frame is encoded here, once, so that the
+    consumer forwards the text as is. The metadata is available to the consumer, but not sent to the client.
+    """
+    return {
+        "type": "tracking.data",
+        "message_type": message_type,
+        "text": json.dumps({"type": message_type, "data": channel_data}, cls=DateTimeEncoder),
+        **metadata,
+    }
+
+
 class WebsocketFacade:
     def __init__(self):
         self.channel_layer = get_channel_layer()
         self.redis = StrictRedis(REDIS_HOST, REDIS_PORT)  # , password=REDIS_PASSWORD)
+        self.global_position_store = GlobalPositionStore(self.redis)
 
-    def transmit_annotations(self, contestant: "Contestant"):
-        group_key = "tracking_{}".format(contestant.navigation_task.pk)
+    def send_tracking_message(self, navigation_task_pk: int, message: Dict):
+        group_key = "tracking_{}".format(navigation_task_pk)
+        async_to_sync(self.channel_layer.group_send)(group_key, message)
+
+    def next_score_sequence(self, contestant: "Contestant") -> int:
+        key = SCORE_SEQUENCE_KEY.format(contestant.pk)
+        pipeline = self.redis.pipeline()
+        pipeline.incr(key)
+        pipeline.expire(key, SCORE_SEQUENCE_TIMEOUT)
+        sequence, _ = pipeline.execute()
+        return sequence
+
+    def current_score_sequence(self, contestant: "Contestant") -> int:
+        return int(self.redis.get(SCORE_SEQUENCE_KEY.format(contestant.pk)) or 0)
+
+    def current_score_sequences(self, contestants: List["Contestant"]) -> List[int]:
+        """
+        The current score sequence of each of the contestants in a single round trip
+        """
+        if len(contestants) == 0:
+            return []
+        values = self.redis.mget([SCORE_SEQUENCE_KEY.format(contestant.pk) for contestant in contestants])
+        return [int(value or 0) for value in values]
+
+    def annotations_message(self, contestant: "Contestant", sequence: int) -> Dict:
         annotation_data = TrackAnnotationSerialiser(contestant.trackannotation_set.all(), many=True).data
         channel_data = generate_contestant_data_block(contestant, annotations=annotation_data)
-        async_to_sync(self.channel_layer.group_send)(
-            group_key,
-            {
-                "type": "tracking.data",
-                "data": {"type": "annotations", "data": json.dumps(channel_data, cls=DateTimeEncoder)},
-            },
-        )
+        return tracking_message("annotations", channel_data, contestant_id=contestant.pk, sequence=sequence)
 
-    def transmit_score_log_entry(self, contestant: "Contestant"):
-        group_key = "tracking_{}".format(contestant.navigation_task.pk)
+    def score_log_message(self, contestant: "Contestant", sequence: int) -> Dict:
         # Only push anomalous score logs to the GUI. Everything will be visible as annotations or on the contestant
         # table administration page.
         log_entries = ScoreLogEntrySerialiser(contestant.scorelogentry_set.filter(type=ANOMALY), many=True).data
         channel_data = generate_contestant_data_block(contestant, log_entries=log_entries)
-        async_to_sync(self.channel_layer.group_send)(
-            group_key,
-            {
-                "type": "tracking.data",
-                "data": {"type": "score_log", "data": json.dumps(channel_data, cls=DateTimeEncoder)},
-            },
-        )
+        return tracking_message("score_log", channel_data, contestant_id=contestant.pk, sequence=sequence)
 
-    def transmit_gate_score_entry(self, contestant: "Contestant"):
-        group_key = "tracking_{}".format(contestant.navigation_task.pk)
+    def gate_score_message(self, contestant: "Contestant", sequence: int) -> Dict:
         gate_scores = GateCumulativeScoreSerialiser(contestant.gatecumulativescore_set.all(), many=True).data
         channel_data = generate_contestant_data_block(contestant, gate_scores=gate_scores)
-        async_to_sync(self.channel_layer.group_send)(
-            group_key,
+        return tracking_message("gate_score", channel_data, contestant_id=contestant.pk, sequence=sequence)
+
+    def score_state_messages(self, contestant: "Contestant") -> Tuple[int, List[Dict]]:
+        """
+        Generate the messages holding the complete score state of the contestant, used to resynchronise a client that
+        has missed deltas. The sequence number is read before the state so that any delta with a higher sequence
+        number is applied on top of the state (applying a delta that is already included in the state is harmless).
+        """
+        sequence = self.current_score_sequence(contestant)
+        return sequence, [
+            self.annotations_message(contestant, sequence),
+            self.score_log_message(contestant, sequence),
+            self.gate_score_message(contestant, sequence),
+        ]
+
+    def transmit_score_delta(self, contestant: "Contestant", collection: str, operation: str, items: List[Dict]):
+        """
+        Push a change to one of the score collections (ANNOTATIONS, SCORE_LOG_ENTRIES or GATE_SCORES) of the
+        contestant. For APPEND and UPDATE the items are the serialised objects, for DELETE only the id is required.
+        """
+        sequence = self.next_score_sequence(contestant)
+        channel_data = generate_contestant_data_block(
+            contestant,
+            score_delta={"sequence": sequence, "collection": collection, "operation": operation, "items": items},
+        )
+        self.send_tracking_message(
+            contestant.navigation_task_id,
+            tracking_message(SCORE_DELTA, channel_data, contestant_id=contestant.pk, sequence=sequence),
+        )
+
+    def transmit_annotation_change(self, annotation: TrackAnnotation, operation: str = APPEND):
+        items = TrackAnnotationSerialiser([annotation], many=True).data
+        self.transmit_score_delta(annotation.contestant, ANNOTATIONS, operation, items)
+
+    def transmit_score_log_entry_change(self, entry: ScoreLogEntry, operation: str = APPEND):
+        # Only anomalous score logs are displayed by the GUI, see score_log_message
+        if entry.type != ANOMALY:
+            return
+        items = ScoreLogEntrySerialiser([entry], many=True).data
+        self.transmit_score_delta(entry.contestant, SCORE_LOG_ENTRIES, operation, items)
+
+    def transmit_gate_score_change(self, gate_score: GateCumulativeScore):
+        items = GateCumulativeScoreSerialiser([gate_score], many=True).data
+        self.transmit_score_delta(gate_score.contestant, GATE_SCORES, UPDATE, items)
+
+    def transmit_deleted_score_log_entry(
+        self, contestant: "Contestant", score_log_entry_id: int, annotation_ids: List[int]
+    ):
+        """
+        Push the deletion of a score log entry together with the annotations that were deleted with it
+        """
+        self.transmit_score_delta(contestant, SCORE_LOG_ENTRIES, DELETE, [{"id": score_log_entry_id}])
+        if len(annotation_ids) > 0:
+            self.transmit_score_delta(
+                contestant, ANNOTATIONS, DELETE, [{"id": annotation_id} for annotation_id in annotation_ids]
+            )
+
+    def transmit_score_sequence(self, contestant: "Contestant"):
+        """
+        Push the current sequence number so that receivers can detect that they have missed the latest deltas
+        """
+        self.send_tracking_message(
+            contestant.navigation_task_id,
             {
                 "type": "tracking.data",
-                "data": {"type": "gate_score", "data": json.dumps(channel_data, cls=DateTimeEncoder)},
+                "message_type": SCORE_SEQUENCE,
+                "contestant_id": contestant.pk,
+                "sequence": self.current_score_sequence(contestant),
             },
         )
 
+    def transmit_score_state_changed(self, contestant: "Contestant"):
+        """
+        Signal that the score state of the contestant has been replaced without pushing the individual deltas, so that
+        receivers resynchronise the complete score state
+        """
+        self.next_score_sequence(contestant)
+        self.transmit_score_sequence(contestant)
+
     def transmit_playing_cards(self, contestant: "Contestant"):
-        group_key = "tracking_{}".format(contestant.navigation_task.pk)
         playing_cards = PlayingCardSerialiser(contestant.playingcard_set.all(), many=True).data
         channel_data = generate_contestant_data_block(contestant, playing_cards=playing_cards)
-        async_to_sync(self.channel_layer.group_send)(
-            group_key,
-            {
-                "type": "tracking.data",
-                "data": {"type": "playing_cards", "data": json.dumps(channel_data, cls=DateTimeEncoder)},
-            },
-        )
+        self.send_tracking_message(contestant.navigation_task_id, tracking_message("playing_cards", channel_data))
 
     def transmit_basic_information(self, contestant: "Contestant"):
-        group_key = "tracking_{}".format(contestant.navigation_task.pk)
         channel_data = generate_contestant_data_block(
             contestant, contestant_track_data=ContestantTrackSerialiser(contestant.contestanttrack).data
         )
-        async_to_sync(self.channel_layer.group_send)(
-            group_key,
-            {
-                "type": "tracking.data",
-                "data": {"type": "basic_information", "data": json.dumps(channel_data, cls=DateTimeEncoder)},
-            },
-        )
+        self.send_tracking_message(contestant.navigation_task_id, tracking_message("basic_information", channel_data))
 
     def transmit_contestant(self, contestant: "Contestant"):
-        group_key = "tracking_{}".format(contestant.navigation_task.pk)
         channel_data = ContestantNestedTeamSerialiser(instance=contestant).data
-        async_to_sync(self.channel_layer.group_send)(
-            group_key,
-            {
-                "type": "tracking.data",
-                "data": {"type": "contestant", "data": json.dumps(channel_data, cls=DateTimeEncoder)},
-            },
-        )
+        self.send_tracking_message(contestant.navigation_task_id, tracking_message("contestant", channel_data))
 
     def transmit_delete_contestant(self, contestant: "Contestant"):
-        group_key = "tracking_{}".format(contestant.navigation_task.pk)
         channel_data = {"contestant_id": contestant.pk}
-        async_to_sync(self.channel_layer.group_send)(
-            group_key,
-            {
-                "type": "tracking.data",
-                "data": {"type": "contestant_delete", "data": json.dumps(channel_data, cls=DateTimeEncoder)},
-            },
-        )
+        self.send_tracking_message(contestant.navigation_task_id, tracking_message("contestant_delete", channel_data))
 
     def transmit_navigation_task_position_data(
         self, contestant: "Contestant", positions: List[ContestantReceivedPosition]
     ):
+        """
+        Buffer the positions for the position fan out (see position_fan_out.py), which sends the positions of all the
+        contestants of the navigation task in a single message every POSITION_FAN_OUT_INTERVAL. The contestant block
+        is encoded here, and the encoded blocks are joined into the frame without being encoded again.
+        """
         if len(positions) == 0:
             return
         position_data = PositionSerialiser(positions, many=True).data
@@ -180,17 +288,40 @@ class WebsocketFacade:
             positions=position_data,
             latest_time=positions[-1].time,
         )
-        group_key = "tracking_{}".format(contestant.navigation_task.pk)
-        # for position in positions:
-        #     logger.debug(f"Transmitting position ID {position.position_id} for device ID {position.device_id}")
+        key = NAVIGATION_TASK_POSITIONS_KEY.format(contestant.navigation_task_id)
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.rpush(key, json.dumps(channel_data, cls=DateTimeEncoder))
+        # Bound the buffer if the position fan out is not running
+        pipeline.ltrim(key, -MAXIMUM_BUFFERED_POSITION_BLOCKS, -1)
+        pipeline.expire(key, BUFFERED_POSITION_BLOCKS_TIMEOUT)
+        pipeline.sadd(PENDING_NAVIGATION_TASK_POSITIONS_KEY, contestant.navigation_task_id)
+        pipeline.execute()
 
-        async_to_sync(self.channel_layer.group_send)(
-            group_key,
-            {
-                "type": "tracking.data",
-                "data": {"type": "position_data", "data": json.dumps(channel_data, cls=DateTimeEncoder)},
-            },
-        )
+    def transmit_buffered_navigation_task_position_data(self) -> int:
+        """
+        Send the buffered positions of each navigation task as one message. Returns the number of contestant blocks
+        that were sent.
+        """
+        number_of_blocks = 0
+        for navigation_task_pk in self.redis.smembers(PENDING_NAVIGATION_TASK_POSITIONS_KEY):
+            navigation_task_pk = int(navigation_task_pk)
+            key = NAVIGATION_TASK_POSITIONS_KEY.format(navigation_task_pk)
+            # Atomically take all the blocks. Blocks that are added afterwards also add the navigation task to the
+            # pending set again, so they are sent in the next round.
+            pipeline = self.redis.pipeline()
+            pipeline.lrange(key, 0, -1)
+            pipeline.delete(key)
+            pipeline.srem(PENDING_NAVIGATION_TASK_POSITIONS_KEY, navigation_task_pk)
+            blocks, _, _ = pipeline.execute()
+            if len(blocks) == 0:
+                continue
+            number_of_blocks += len(blocks)
+            text = b'{"type": "position_data_batch", "data": [' + b", ".join(blocks) + b"]}"
+            self.send_tracking_message(
+                navigation_task_pk,
+                {"type": "tracking.data", "message_type": "position_data_batch", "text": text.decode("utf-8")},
+            )
+        return number_of_blocks
 
     def transmit_seconds_to_crossing_time_and_crossing_estimate(
         self,
@@ -215,14 +346,7 @@ class WebsocketFacade:
                 }
             ).data,
         )
-        group_key = "tracking_{}".format(contestant.navigation_task.pk)
-        async_to_sync(self.channel_layer.group_send)(
-            group_key,
-            {
-                "type": "tracking.data",
-                "data": {"type": "crossing_time", "data": json.dumps(channel_data, cls=DateTimeEncoder)},
-            },
-        )
+        self.send_tracking_message(contestant.navigation_task_id, tracking_message("crossing_time", channel_data))
 
     def transmit_danger_estimate_and_accumulated_penalty(
         self, contestant: "Contestant", danger_level: float, accumulated_score: 0
@@ -233,14 +357,7 @@ class WebsocketFacade:
                 {"danger_level": danger_level, "accumulated_score": accumulated_score}
             ).data,
         )
-        group_key = "tracking_{}".format(contestant.navigation_task.pk)
-        async_to_sync(self.channel_layer.group_send)(
-            group_key,
-            {
-                "type": "tracking.data",
-                "data": {"type": "danger_level", "data": json.dumps(channel_data, cls=DateTimeEncoder)},
-            },
-        )
+        self.send_tracking_message(contestant.navigation_task_id, tracking_message("danger_level", channel_data))
 
     def transmit_airsports_position_data(
         self,
@@ -267,15 +384,28 @@ class WebsocketFacade:
         }
         async_to_sync(self.channel_layer.group_send)("tracking_airsports", container)
 
-    def transmit_global_position_data(
-        self,
+    async def send_global_position(self, container: Dict, all_traffic: bool):
+        """
+        Send the position to the consumers subscribed to the grid cell of the position, and to the consumers that
+        receive all the traffic if all_traffic is set (see display.utilities.global_map_cells). Every group_send is a
+        round trip to redis, also when nobody is subscribed to the group, so the callers only set all_traffic when
+        GlobalPositionStore.has_all_traffic_subscribers() is true.
+        """
+        await self.channel_layer.group_send(
+            cell_group_for_position(container["latitude"], container["longitude"]), container
+        )
+        if all_traffic:
+            await self.channel_layer.group_send(GLOBAL_TRAFFIC_GROUP, container)
+
+    @staticmethod
+    def internal_global_position_data(
         global_tracking_name: str,
         person: Optional[Dict],
         position_data: Dict,
         device_time: datetime.datetime,
         navigation_task_id: Optional[int],
-    ):
-        data = {
+    ) -> Dict:
+        return {
             "name": global_tracking_name,
             "time": device_time,
             "person": person,
@@ -290,24 +420,39 @@ class WebsocketFacade:
             "navigation_task_id": navigation_task_id,
             "traffic_source": "internal",
         }
-        s = json.dumps(data, cls=DateTimeEncoder)
-        container = {
-            "type": "tracking.data",
-            "data": s,
-            "latitude": float(position_data["latitude"]),
-            "longitude": float(position_data["longitude"]),
-        }
-        device_id = data["deviceId"]
-        # existing = self.redis.hget(REDIS_GLOBAL_POSITIONS_KEY, device_id)
-        # if existing:
-        #     existing = pickle.loads(existing)
-        #     if existing["time"] >= data["time"]:
-        #         return
-        self.redis.hset(REDIS_GLOBAL_POSITIONS_KEY, key=device_id, value=pickle.dumps(data))
-        async_to_sync(self.channel_layer.group_send)("tracking_global", container)
 
-    async def transmit_external_global_position_data(
+    def transmit_global_position_data(
         self,
+        global_tracking_name: str,
+        person: Optional[Dict],
+        position_data: Dict,
+        device_time: datetime.datetime,
+        navigation_task_id: Optional[int],
+    ):
+        self.transmit_internal_global_positions(
+            [
+                self.internal_global_position_data(
+                    global_tracking_name, person, position_data, device_time, navigation_task_id
+                )
+            ]
+        )
+
+    def transmit_internal_global_positions(self, positions: List[Dict]):
+        """
+        Store a batch of positions created by internal_global_position_data (typically one traccar websocket frame)
+        with a single pipeline, and transmit them.
+        """
+        stored = self.global_position_store.store_positions(
+            [self.stored_global_position(data) for data in positions],
+            # Positions from traccar are transmitted in order, so there is no need to look up the stored position
+            only_newer=False,
+        )
+        all_traffic = self.global_position_store.has_all_traffic_subscribers()
+        for position in stored:
+            async_to_sync(self.send_global_position)(self.global_position_container(position), all_traffic)
+
+    @staticmethod
+    def external_global_position_data(
         device_id: str,
         name: str,
         time_stamp: datetime,
@@ -320,8 +465,8 @@ class WebsocketFacade:
         traffic_source: str,
         raw_data: Optional[Dict] = None,
         aircraft_type: int = 9,
-    ):
-        data = {
+    ) -> Dict:
+        return {
             "name": name,
             "time": time_stamp,
             "person": None,
@@ -338,15 +483,71 @@ class WebsocketFacade:
             "raw_data": raw_data,
             "aircraft_type": aircraft_type,
         }
-        s = json.dumps(data, cls=DateTimeEncoder)
-        container = {"type": "tracking.data", "data": s, "latitude": latitude, "longitude": longitude}
-        existing = self.redis.hget(REDIS_GLOBAL_POSITIONS_KEY, device_id)
-        if existing:
-            existing = pickle.loads(existing)
-            if existing["time"] >= data["time"]:
-                return
-        self.redis.hset(REDIS_GLOBAL_POSITIONS_KEY, key=device_id, value=pickle.dumps(data))
-        await self.channel_layer.group_send("tracking_global", container)
+
+    async def transmit_external_global_position_data(
+        self,
+        device_id: str,
+        name: str,
+        time_stamp: datetime,
+        latitude,
+        longitude,
+        altitude,
+        baro_altitude,
+        speed,
+        course,
+        traffic_source: str,
+        raw_data: Optional[Dict] = None,
+        aircraft_type: int = 9,
+    ):
+        await self.transmit_external_global_positions(
+            [
+                self.external_global_position_data(
+                    device_id,
+                    name,
+                    time_stamp,
+                    latitude,
+                    longitude,
+                    altitude,
+                    baro_altitude,
+                    speed,
+                    course,
+                    traffic_source,
+                    raw_data=raw_data,
+                    aircraft_type=aircraft_type,
+                )
+            ]
+        )
+
+    async def transmit_external_global_positions(self, positions: List[Dict]):
+        """
+        Store a batch of positions created by external_global_position_data (e.g. a complete OpenSky response or a
+        burst of OGN beacons) with a single pipeline, and transmit the positions that are newer than the stored
+        positions of the same aircraft.
+        """
+        stored = self.global_position_store.store_positions([self.stored_global_position(data) for data in positions])
+        all_traffic = self.global_position_store.has_all_traffic_subscribers()
+        for position in stored:
+            await self.send_global_position(self.global_position_container(position), all_traffic)
+
+    @staticmethod
+    def stored_global_position(data: Dict) -> StoredPosition:
+        return StoredPosition(
+            data["deviceId"],
+            data["time"].timestamp(),
+            data["latitude"],
+            data["longitude"],
+            json.dumps(data, cls=DateTimeEncoder),
+        )
+
+    @staticmethod
+    def global_position_container(position: StoredPosition) -> Dict:
+        return {
+            "type": "tracking.data",
+            "data": position.data,
+            "device_id": position.device_id,
+            "latitude": position.latitude,
+            "longitude": position.longitude,
+        }
 
     def contest_results_channel_name(self, contest: "Contest") -> str:
         return "contestresults_{}".format(contest.pk)